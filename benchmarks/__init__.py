@@ -0,0 +1 @@
+# -*- coding: UTF-8 -*-
\ No newline at end of file
@@ -0,0 +1,243 @@
+# -*- coding: UTF-8 -*-
+import collections
+import math
+import random
+
+from pyspatialopt import version
+
+
+class Instance(object):
+    """
+    A seeded synthetic instance: demand points/polygons, facility locations and service areas
+    All coordinates are in a square extent, demand polygons are the cells of a regular grid and
+    service areas are regular polygons approximating a circle around each facility
+    """
+
+    def __init__(self, num_demand, num_facilities=None, coverage_per_demand=3.0, extent=10000.0,
+                 service_area_vertices=32, seed=0):
+        """
+        :param num_demand: (int) The number of demand units
+        :param num_facilities: (int) The number of facilities (defaults to 1 for every 100 demand units, at least 10)
+        :param coverage_per_demand: (float) The average number of service areas that reach a demand unit
+        :param extent: (float) The width (and height) of the study area
+        :param service_area_vertices: (int) The number of vertices of each service area polygon
+        :param seed: (int) The random seed
+        """
+        self.num_demand = num_demand
+        self.num_facilities = num_facilities or max(10, num_demand // 100)
+        self.extent = extent
+        self.seed = seed
+        rand = random.Random(seed)
+        # Demand polygons are grid cells, the points are their centroids
+        self.columns = int(math.ceil(math.sqrt(num_demand)))
+        self.cell_size = extent / self.columns
+        self.demand = collections.OrderedDict()
+        for i in range(num_demand):
+            row, column = divmod(i, self.columns)
+            self.demand[str(i)] = {
+                "x": (column + 0.5) * self.cell_size,
+                "y": (row + 0.5) * self.cell_size,
+                "demand": float(rand.randint(1, 1000))
+            }
+        self.facilities = collections.OrderedDict()
+        for j in range(self.num_facilities):
+            self.facilities[str(j)] = (rand.uniform(0, extent), rand.uniform(0, extent))
+        # Radius so on average each demand unit is reached by coverage_per_demand service areas
+        self.radius = math.sqrt(coverage_per_demand * extent * extent / (math.pi * self.num_facilities))
+        self.service_area_vertices = service_area_vertices
+
+    def demand_point(self, demand_id):
+        return self.demand[demand_id]["x"], self.demand[demand_id]["y"]
+
+    def demand_polygon(self, demand_id):
+        """
+        :param demand_id: (string) The id of the demand unit
+        :return: (list) The ring (closed list of x, y tuples) of the demand polygon
+        """
+        x, y = self.demand_point(demand_id)
+        half = self.cell_size / 2.0
+        return [(x - half, y - half), (x + half, y - half), (x + half, y + half), (x - half, y + half),
+                (x - half, y - half)]
+
+    def service_area(self, facility_id):
+        """
+        :param facility_id: (string) The id of the facility
+        :return: (list) The ring (closed list of x, y tuples) of the facility service area
+        """
+        fx, fy = self.facilities[facility_id]
+        ring = [(fx + self.radius * math.cos(2 * math.pi * k / self.service_area_vertices),
+                 fy + self.radius * math.sin(2 * math.pi * k / self.service_area_vertices))
+                for k in range(self.service_area_vertices)]
+        ring.append(ring[0])
+        return ring
+
+    def _near(self, x, y, distance):
+        """
+        Finds the demand units with a centroid within a distance of a location using the grid (no full scan)
+        :return: (generator) The ids and distances of the demand units
+        """
+        first_column = max(0, int((x - distance) / self.cell_size))
+        last_column = min(self.columns - 1, int((x + distance) / self.cell_size))
+        first_row = max(0, int((y - distance) / self.cell_size))
+        last_row = int((y + distance) / self.cell_size)
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                i = row * self.columns + column
+                if i >= self.num_demand:
+                    return
+                dx = (column + 0.5) * self.cell_size - x
+                dy = (row + 0.5) * self.cell_size - y
+                d = math.sqrt(dx * dx + dy * dy)
+                if d <= distance:
+                    yield str(i), d
+
+    def distance_matrix(self, max_distance=None):
+        """
+        Generates an OD matrix in the format read by binary_mclp_distance_matrix (only pairs within max_distance)
+        :param max_distance: (float) The largest distance to include (defaults to twice the service radius)
+        :return: (list) The rows as dictionaries of strings, like csv.DictReader
+        """
+        if max_distance is None:
+            max_distance = 2 * self.radius
+        rows = []
+        for facility_id, (fx, fy) in self.facilities.items():
+            for demand_id, d in self._near(fx, fy, max_distance):
+                rows.append({
+                    "facility_id": facility_id,
+                    "demand_id": demand_id,
+                    "distance": repr(d),
+                    "demand": repr(self.demand[demand_id]["demand"])
+                })
+        return rows
+
+    def _empty_coverage(self, coverage_type, facility_types):
+        output = {
+            "version": version.__version__,
+            "type": {
+                "mode": "coverage",
+                "type": coverage_type,
+            },
+            "demand": {},
+            "totalDemand": 0.0,
+            "totalServiceableDemand": 0.0,
+            "facilities": facility_types
+        }
+        return output
+
+    def binary_coverage(self, fl_variable_name="facility"):
+        """
+        :param fl_variable_name: (string) The name to use to represent the facility variable
+        :return: (dictionary) The binary coverage of demand points by the service areas
+        """
+        output = self._empty_coverage("binary", {fl_variable_name: list(self.facilities.keys())})
+        for demand_id, demand_obj in self.demand.items():
+            output["demand"][demand_id] = {
+                "area": round(self.cell_size * self.cell_size),
+                "demand": demand_obj["demand"],
+                "serviceableDemand": 0.0,
+                "coverage": {fl_variable_name: {}}
+            }
+        for facility_id, (fx, fy) in self.facilities.items():
+            for demand_id, _ in self._near(fx, fy, self.radius):
+                output["demand"][demand_id]["coverage"][fl_variable_name][facility_id] = 1
+                output["demand"][demand_id]["serviceableDemand"] = output["demand"][demand_id]["demand"]
+        _add_totals(output)
+        return output
+
+    def partial_coverage(self, fl_variable_name="facility", samples=4):
+        """
+        Area weighted coverage of the demand polygons by the (circular) service areas estimated on a
+        samples x samples grid of points in each demand polygon
+        :param fl_variable_name: (string) The name to use to represent the facility variable
+        :param samples: (int) The number of sample points along each side of a demand polygon
+        :return: (dictionary) The partial coverage of demand polygons by the service areas
+        """
+        output = self._empty_coverage("partial", {fl_variable_name: list(self.facilities.keys())})
+        covered_samples = {}
+        for demand_id, demand_obj in self.demand.items():
+            output["demand"][demand_id] = {
+                "area": round(self.cell_size * self.cell_size),
+                "demand": demand_obj["demand"],
+                "serviceableDemand": 0.0,
+                "coverage": {fl_variable_name: {}}
+            }
+        offsets = [(k + 0.5) / samples - 0.5 for k in range(samples)]
+        half_diagonal = self.cell_size * math.sqrt(2) / 2
+        radius2 = self.radius * self.radius
+        for facility_id, (fx, fy) in self.facilities.items():
+            for demand_id, _ in self._near(fx, fy, self.radius + half_diagonal):
+                x, y = self.demand_point(demand_id)
+                inside = set()
+                for a, ox in enumerate(offsets):
+                    for b, oy in enumerate(offsets):
+                        px = x + ox * self.cell_size - fx
+                        py = y + oy * self.cell_size - fy
+                        if px * px + py * py <= radius2:
+                            inside.add(a * samples + b)
+                if inside:
+                    demand = output["demand"][demand_id]["demand"]
+                    output["demand"][demand_id]["coverage"][fl_variable_name][facility_id] = \
+                        math.ceil(demand * len(inside) / float(samples * samples))
+                    covered_samples.setdefault(demand_id, set()).update(inside)
+        for demand_id, inside in covered_samples.items():
+            demand = output["demand"][demand_id]["demand"]
+            output["demand"][demand_id]["serviceableDemand"] = min(
+                demand, math.ceil(demand * len(inside) / float(samples * samples)))
+        _add_totals(output)
+        return output
+
+    def serviceable_demand(self, coverage):
+        """
+        :param coverage: (dictionary) A coverage generated by this instance
+        :return: (dictionary) The serviceable demand in the format used by covering.update_serviceable_demand
+        """
+        return {
+            "version": version.__version__,
+            "demand": {demand_id: {"serviceableDemand": demand_obj["serviceableDemand"]}
+                       for demand_id, demand_obj in coverage["demand"].items()},
+            "type": {"mode": "serviceableDemand", "type": coverage["type"]["type"]}
+        }
+
+    def traumah_coverage(self, num_ad=4, num_tc=None, air_distance_threshold=None):
+        """
+        :param num_ad: (int) The number of air depots (placed randomly)
+        :param num_tc: (int) The number of trauma centers (the first facilities, defaults to at most 10)
+        :param air_distance_threshold: (float) The maximum total distance a helicopter can fly
+            (defaults to a quarter of the extent)
+        :return: (dictionary) The coverage for the TRAUMAH model
+        """
+        rand = random.Random(self.seed + 1)
+        num_tc = num_tc or min(10, self.num_facilities)
+        trauma_centers = list(self.facilities.items())[:num_tc]
+        air_depots = [(str(k), (rand.uniform(0, self.extent), rand.uniform(0, self.extent))) for k in range(num_ad)]
+        if air_distance_threshold is None:
+            air_distance_threshold = self.extent / 4.0
+        output = self._empty_coverage("traumah", {"AirDepot": [k for k, _ in air_depots],
+                                                  "TraumaCenter": [k for k, _ in trauma_centers]})
+        for demand_id, demand_obj in self.demand.items():
+            output["demand"][demand_id] = {
+                "area": 0,
+                "demand": demand_obj["demand"],
+                "serviceableDemand": 0.0,
+                "coverage": {"TraumaCenter": [], "ADTCPair": []}
+            }
+        for tc_id, (tx, ty) in trauma_centers:
+            for demand_id, tc_distance in self._near(tx, ty, air_distance_threshold):
+                coverage = output["demand"][demand_id]["coverage"]
+                if tc_distance <= self.radius:
+                    coverage["TraumaCenter"].append({"TraumaCenter": tc_id})
+                x, y = self.demand_point(demand_id)
+                for ad_id, (ax, ay) in air_depots:
+                    if math.hypot(ax - x, ay - y) + tc_distance <= air_distance_threshold:
+                        coverage["ADTCPair"].append({"TraumaCenter": tc_id, "AirDepot": ad_id})
+        for demand_obj in output["demand"].values():
+            if demand_obj["coverage"]["TraumaCenter"] or demand_obj["coverage"]["ADTCPair"]:
+                demand_obj["serviceableDemand"] = demand_obj["demand"]
+        _add_totals(output)
+        return output
+
+
+def _add_totals(output):
+    for demand_obj in output["demand"].values():
+        output["totalDemand"] += demand_obj["demand"]
+        output["totalServiceableDemand"] += demand_obj["serviceableDemand"]
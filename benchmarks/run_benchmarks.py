@@ -0,0 +1,219 @@
+# -*- coding: UTF-8 -*-
+"""
+Times coverage generation, model building, writing and solving on synthetic instances of increasing size
+
+    python -m benchmarks.run_benchmarks --sizes 100 1000 10000 --output baseline.json
+    python -m benchmarks.run_benchmarks --sizes 100 1000 10000 --baseline baseline.json --output current.json
+
+With --baseline the results are compared and the exit code is 1 if anything got slower (or used more memory)
+than the tolerance allows
+"""
+import argparse
+import datetime
+import gc
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pulp
+
+from benchmarks.instances import Instance
+from pyspatialopt import version
+from pyspatialopt.models import binary_mclp_distance_matrix
+from pyspatialopt.models import covering
+from pyspatialopt.models import solving
+
+DEFAULT_SIZES = [100, 1000, 10000]
+
+
+def measure(func, repeat=1, memory=True):
+    """
+    Times a function and records its peak (python) memory allocation
+    :param func: (function) The function to call (without arguments)
+    :param repeat: (int) The number of timed calls, the fastest is reported
+    :param memory: (bool) Should an extra call be made with tracemalloc to get the peak memory
+    :return: (tuple) The result of the last call and a dictionary with the time (seconds) and peak memory (bytes)
+    """
+    times = []
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    measurement = {"time": min(times)}
+    if memory:
+        result = None
+        gc.collect()
+        tracemalloc.start()
+        try:
+            result = func()
+            measurement["peak_memory"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, measurement
+
+
+def _write_lp(problem):
+    handle, lp_file = tempfile.mkstemp(suffix=".lp")
+    os.close(handle)
+    try:
+        problem.writeLP(lp_file)
+    finally:
+        os.remove(lp_file)
+
+
+def benchmark_size(num_demand, seed=0, repeat=1, memory=True, solver=None, time_limit=60):
+    """
+    Runs the benchmarks for a single instance size
+    :param num_demand: (int) The number of demand units of the instance
+    :param seed: (int) The random seed of the instance
+    :param repeat: (int) The number of timed calls for each benchmark
+    :param memory: (bool) Should the peak memory be recorded
+    :param solver: (string) The solver to use to solve the MCLP, None to skip solving
+    :param time_limit: (float) The time limit (seconds) for solving
+    :return: (dictionary) The measurements keyed on benchmark name
+    """
+    results = {}
+    start = time.perf_counter()
+    instance = Instance(num_demand, seed=seed)
+    distance_matrix = instance.distance_matrix()
+    binary = instance.binary_coverage()
+    partial = instance.partial_coverage()
+    traumah = instance.traumah_coverage()
+    logging.getLogger().info("Generated instance with {} demand units and {} facilities in {:.2f} seconds".format(
+        num_demand, instance.num_facilities, time.perf_counter() - start))
+    num_fac = {"total": max(1, instance.num_facilities // 10)}
+
+    benchmarks = [
+        ("generate_binary_coverage_from_dist_matrix",
+         lambda: binary_mclp_distance_matrix.generate_binary_coverage_from_dist_matrix(distance_matrix,
+                                                                                         instance.radius)),
+        ("create_mclp_model", lambda: covering.create_mclp_model(binary, num_fac)),
+        ("create_mclp_cc_model", lambda: covering.create_mclp_cc_model(partial, num_fac)),
+        ("create_threshold_model", lambda: covering.create_threshold_model(binary, 50)),
+        ("create_cc_threshold_model", lambda: covering.create_cc_threshold_model(partial, 50)),
+        ("create_backup_model", lambda: covering.create_backup_model(binary, num_fac)),
+        ("create_lscp_model", lambda: covering.create_lscp_model(binary)),
+        ("create_traumah_model", lambda: covering.create_traumah_model(traumah, 2, 5)),
+        ("create_bclpcc_model", lambda: covering.create_bclpcc_model(partial, num_fac, 0.5)),
+    ]
+    for name, func in benchmarks:
+        _, results[name] = measure(func, repeat, memory)
+        logging.getLogger().info("{} ({}): {:.3f} seconds".format(name, num_demand, results[name]["time"]))
+    mclp = covering.create_mclp_model(binary, num_fac)
+    results["writeLP"] = measure(lambda: _write_lp(mclp), repeat, memory)[1]
+    logging.getLogger().info("writeLP ({}): {:.3f} seconds".format(num_demand, results["writeLP"]["time"]))
+    if solver:
+        # Solved once, solving again would start from the previous solution
+        solve_result, results["solve"] = measure(lambda: solving.solve_model(mclp, solver, time_limit=time_limit),
+                                                 memory=False)
+        results["solve"]["objective"] = solve_result["objective"]
+        results["solve"]["timed_out"] = solve_result["timed_out"]
+        logging.getLogger().info("solve ({}): {:.3f} seconds".format(num_demand, results["solve"]["time"]))
+    return results
+
+
+def run_benchmarks(sizes=None, seed=0, repeat=1, memory=True, solver=None, time_limit=60, max_solve_size=10000):
+    """
+    Runs the benchmarks for all instance sizes
+    :param sizes: (list) The numbers of demand units of the instances (10^2 to 10^6)
+    :param seed: (int) The random seed of the instances
+    :param repeat: (int) The number of timed calls for each benchmark
+    :param memory: (bool) Should the peak memory be recorded
+    :param solver: (string) The solver to use to solve the MCLP, None to skip solving
+    :param time_limit: (float) The time limit (seconds) for solving
+    :param max_solve_size: (int) The largest instance to solve
+    :return: (dictionary) The results with metadata, suitable to save as a baseline
+    """
+    if sizes is None:
+        sizes = DEFAULT_SIZES
+    output = {
+        "meta": {
+            "pyspatialopt": version.__version__,
+            "pulp": getattr(pulp, "__version__", None),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "date": datetime.datetime.now().isoformat(),
+            "seed": seed,
+            "repeat": repeat,
+            "solver": solver
+        },
+        "results": {}
+    }
+    for size in sizes:
+        output["results"][str(size)] = benchmark_size(size, seed, repeat, memory,
+                                                      solver if size <= max_solve_size else None, time_limit)
+    return output
+
+
+def compare(baseline, current, tolerance=0.25):
+    """
+    Compares benchmark results with a baseline
+    :param baseline: (dictionary) The baseline results (from run_benchmarks)
+    :param current: (dictionary) The current results (from run_benchmarks)
+    :param tolerance: (float) The allowed relative increase (0.25 = 25% slower)
+    :return: (list) The comparisons as dictionaries (size, name, metric, baseline, current, ratio, regression)
+    """
+    comparisons = []
+    for size, benchmarks in current["results"].items():
+        for name, measurement in benchmarks.items():
+            old = baseline["results"].get(size, {}).get(name)
+            if old is None:
+                continue
+            for metric in ["time", "peak_memory"]:
+                if metric not in measurement or not old.get(metric):
+                    continue
+                ratio = measurement[metric] / float(old[metric])
+                comparisons.append({
+                    "size": int(size),
+                    "name": name,
+                    "metric": metric,
+                    "baseline": old[metric],
+                    "current": measurement[metric],
+                    "ratio": ratio,
+                    "regression": ratio > 1 + tolerance
+                })
+    return comparisons
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks pyspatialopt on synthetic instances")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="The numbers of demand units (10^2 to 10^6)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="The number of timed runs, the fastest is kept")
+    parser.add_argument("--no-memory", action="store_true", help="Do not record the peak memory")
+    parser.add_argument("--solver", choices=solving.SOLVERS, default=None, help="Also solve the MCLP")
+    parser.add_argument("--time-limit", type=float, default=60)
+    parser.add_argument("--max-solve-size", type=int, default=10000)
+    parser.add_argument("--output", help="The json file to write the results to")
+    parser.add_argument("--baseline", help="A json file of previous results to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    results = run_benchmarks(args.sizes, args.seed, args.repeat, not args.no_memory, args.solver, args.time_limit,
+                             args.max_solve_size)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if not args.baseline:
+        return 0
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    regressions = 0
+    for comparison in compare(baseline, results, args.tolerance):
+        print("{:>8} {:<45} {:<12} {:>14.4g} {:>14.4g} {:>7.2f}x{}".format(
+            comparison["size"], comparison["name"], comparison["metric"], comparison["baseline"],
+            comparison["current"], comparison["ratio"], " REGRESSION" if comparison["regression"] else ""))
+        regressions += comparison["regression"]
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
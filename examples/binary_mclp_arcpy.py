@@ -44,11 +44,12 @@ if __name__ == "__main__":
     # Get the unique ids of the 5 facilities chosen
     logger.info("Extracting results")
     ids = utilities.get_ids(mclp, "facility_service_areas")
-    # Generate a query that could be used as a definition query or selection in arcpy
-    select_query = arcpy_analysis.generate_query(ids, unique_field_name="ORIG_ID")
-    logger.info("Output query to use to generate maps is: {}".format(select_query))
-    # Determine how much demand is covered by the results
-    facility_service_areas_fl.definitionQuery = select_query
-    total_coverage = arcpy_analysis.get_covered_demand(demand_polygon_fl, "Population", "binary",
-                                                       facility_service_areas_fl)
-    logger.info("{0:.2f}% of demand is covered".format((100 * total_coverage) / binary_coverage_polygon["totalDemand"]))
+    # Determine how much demand is covered by the results from the coverage
+    covered_demand = utilities.get_covered_demand(binary_coverage_polygon, {"facility_service_areas": ids})
+    logger.info("{0:.2f}% of demand is covered".format(
+        (100 * covered_demand["total"]) / binary_coverage_polygon["totalDemand"]))
+    # Write the results to in memory copies of the layers that can be used to generate maps
+    facility_results = arcpy.CopyFeatures_management(facility_service_areas_fl, "in_memory/facility_results")
+    arcpy_analysis.write_selected_facilities(facility_results, "ORIG_ID", ids)
+    demand_results = arcpy.CopyFeatures_management(demand_polygon_fl, "in_memory/demand_results")
+    arcpy_analysis.write_covered_demand(demand_results, "GEOID10", covered_demand)
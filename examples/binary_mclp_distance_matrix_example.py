@@ -9,6 +9,7 @@ import os
 from pyspatialopt.analysis import arcpy_analysis
 from pyspatialopt.models import utilities
 from pyspatialopt.models import covering
+from pyspatialopt.models import solving
 from pyspatialopt.models import binary_mclp_distance_matrix
 
 if __name__ == "__main__":
@@ -59,9 +60,10 @@ if __name__ == "__main__":
     logger.info("Creating MCLP model...")
     mclp = covering.create_mclp_model(dict_coverage, {"total": num_facility})
 
-    # solve
+    # solve, stopping after 60 seconds or within 1% of optimal (the best solution found is kept)
     logger.info("Solving MCLP...")
-    mclp.solve(pulp.GLPK())
+    solve_result = solving.solve_model(mclp, "glpk", time_limit=60, gap=0.01)
+    logger.info("Solve status: {} gap: {}".format(solve_result["status"], solve_result["gap"]))
 
     # Get the unique ids of the facilities chosen
     logger.info("Extracting results")
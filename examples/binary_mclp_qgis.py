@@ -51,11 +51,8 @@ if __name__ == "__main__":
     # Get the unique ids of the 5 facilities chosen
     logger.info("Extracting results")
     ids = utilities.get_ids(mclp, "facility_service_areas")
-    # Generate a query that could be used as a definition query or selection in arcpy
-    select_query = pyqgis_analysis.generate_query(ids, unique_field_name="ORIG_ID")
-    logger.info("Output query to use to generate maps is: {}".format(select_query))
-    # Determine how much demand is covered by the results
-    facility_service_areas_fl.setSubsetString(select_query)
-    total_coverage = pyqgis_analysis.get_covered_demand(demand_polygon_fl, "Population", "binary",
-                                                        facility_service_areas_fl)
-    logger.info("{0:.2f}% of demand is covered".format((100 * total_coverage) / binary_coverage_polygon["totalDemand"]))
+    # Determine how much demand is covered by the results from the coverage
+    # (pyqgis_analysis.write_selected_facilities and write_covered_demand can write the results to layers)
+    covered_demand = utilities.get_covered_demand(binary_coverage_polygon, {"facility_service_areas": ids})
+    logger.info("{0:.2f}% of demand is covered".format(
+        (100 * covered_demand["total"]) / binary_coverage_polygon["totalDemand"]))
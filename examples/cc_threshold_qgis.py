@@ -41,10 +41,7 @@ if __name__ == "__main__":
     # Extract the ids
     logger.info("Extracting results")
     ids = utilities.get_ids(ccthreshold, "facility2_service_areas")
-    select_query = pyqgis_analysis.generate_query(ids, unique_field_name="ORIG_ID")
-    logger.info("Output query to use to generate maps is: {}".format(select_query))
-    # Determine how much demand is covered by the results
-    facility2_service_areas_fl.setSubsetString(select_query)
-    total_coverage = pyqgis_analysis.get_covered_demand(demand_polygon_fl, "Population", "partial",
-                                                        facility2_service_areas_fl)
-    logger.info("{0:.2f}% of demand is covered".format((100 * total_coverage) / partial_coverage2["totalDemand"]))
+    # Determine how much demand is covered by the results from the coverage
+    covered_demand = utilities.get_covered_demand(partial_coverage2, {"facility2_service_areas": ids})
+    logger.info("{0:.2f}% of demand is covered".format(
+        (100 * covered_demand["total"]) / partial_coverage2["totalDemand"]))
@@ -1 +1,14 @@
-# -*- coding: UTF-8 -*-
\ No newline at end of file
+# -*- coding: UTF-8 -*-
+import importlib
+
+# The backends (arcpy, qgis, numpy and scipy) are slow to import so they are only loaded when a function that needs
+# them is called
+_SUBMODULES = ["arcpy_analysis", "checkpointing", "distance_analysis", "geometry_processing", "network_analysis",
+               "pyqgis_analysis", "raster_analysis"]
+
+
+def __getattr__(name):
+    # Loads the submodules on first access (pyspatialopt.analysis.arcpy_analysis) rather than on package import
+    if name in _SUBMODULES:
+        return importlib.import_module("{}.{}".format(__name__, name))
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
@@ -1,11 +1,11 @@
 # -*- coding: UTF-8 -*-
+import collections
 import logging
 import math
 import os
 
-import arcpy
-
 from pyspatialopt import version
+from pyspatialopt.analysis import checkpointing, distance_analysis, geometry_processing, raster_analysis
 
 
 def generate_query(unique_ids, unique_field_name, wrap_values_in_quotes=False):
@@ -15,6 +15,7 @@ def generate_query(unique_ids, unique_field_name, wrap_values_in_quotes=False):
     :param unique_field_name: (string) The name of field that the ids correspond to
     :param wrap_values_in_quotes: (bool) Should the ids be wrapped in quotes (if unique_field_name is string)
     :return: (string) A query string that can be applied to a layer
+    For large selections use write_selected_facilities instead, long queries are slow to evaluate
     """
     if unique_ids:
         if wrap_values_in_quotes:
@@ -32,42 +33,270 @@ def reset_layers(*args):
     :param args: (Feature Layers) The feature layers to reset
     :return:
     """
+    import arcpy
+
     for layer in args:
+        # Tables built in memory (see preprocess_polygons) have no layer
+        if layer is None:
+            continue
         arcpy.SelectLayerByAttribute_management(layer, "CLEAR_SELECTION")
         layer.definitionQuery = ""
 
 
+class LayerTable(object):
+    """
+    The attributes and geometries of a layer read in a single pass so the generators do not go back to the data source
+    The Describe metadata is read once when the table is created. The object ids, attributes and geometries are read
+    with one arcpy.da.SearchCursor and stored as columns (lists) keyed on field name, the geometries as one list in
+    the same (row) order. A table can be passed to the generators instead of the layer, so several coverages can be
+    generated from one read. The selection/definition query of the layer at the time of the read is honored, the
+    table is read again (all of the fields and the geometries) if they have changed since
+    """
+
+    def __init__(self, layer):
+        """
+        :param layer: (Feature Layer) The layer to read
+        """
+        import arcpy
+
+        desc = arcpy.Describe(layer)
+        self.layer = layer
+        self.name = desc.name
+        self.source = desc.catalogPath
+        self.shape_type = desc.shapeType
+        self.field_names = [f.name for f in desc.fields]
+        self.columns = {}
+        self.geometries = None
+        self.oids = None
+        self._state = None
+
+    @classmethod
+    def from_columns(cls, name, shape_type, columns, geometries):
+        """
+        Creates a table that isn't backed by a layer (all of the fields and geometries must be provided)
+        :param name: (string) The name of the table
+        :param shape_type: (string) The shape type of the geometries (Polygon, Point...)
+        :param columns: (dictionary) The values of each field keyed on field name
+        :param geometries: (list) The geometries
+        :return: (LayerTable) The table
+        """
+        table = cls.__new__(cls)
+        table.layer = None
+        table.name = name
+        table.source = name
+        table.shape_type = shape_type
+        table.field_names = list(columns.keys())
+        table.columns = dict(columns)
+        table.geometries = list(geometries)
+        table.oids = None
+        table._state = None
+        return table
+
+    def _get_state(self):
+        """
+        :return: (tuple) The definition query and selected object ids of the layer
+        """
+        import arcpy
+
+        return getattr(self.layer, "definitionQuery", None), arcpy.Describe(self.layer).FIDSet
+
+    def read(self, fields, geometry=True):
+        """
+        Reads the fields (and the geometries) if they have not been read yet. Everything is read again in the same
+        pass when anything is missing or the selection/definition query of the layer has changed, so the columns and
+        geometries always come from the same read
+        :param fields: (list) The names of the fields (or tokens like SHAPE@AREA) to read
+        :param geometry: (bool) Should the geometries be read
+        :return: (LayerTable) The table
+        """
+        import arcpy
+
+        if self.layer is None:
+            missing = [field for field in fields if field not in self.columns]
+            if missing:
+                raise ValueError("'{}' not found in table {}".format(missing[0], self.name))
+            return self
+        state = self._get_state()
+        if state != self._state:
+            self.columns = {}
+            self.geometries = None
+        missing = [field for field in fields if field not in self.columns]
+        if not missing and (self.geometries is not None or not geometry):
+            return self
+        fields = list(self.columns.keys()) + missing
+        geometry = geometry or self.geometries is not None
+        columns = {field: [] for field in fields}
+        geometries = [] if geometry else None
+        oids = []
+        # A cursor (rather than FeatureClassToNumPyArray) so null values are read as None
+        with arcpy.da.SearchCursor(self.layer, ["OID@"] + fields + (["SHAPE@"] if geometry else [])) as cursor:
+            for row in cursor:
+                oids.append(row[0])
+                for i, field in enumerate(fields):
+                    columns[field].append(row[i + 1])
+                if geometry:
+                    geometries.append(row[-1])
+        self.columns = columns
+        self.geometries = geometries
+        self.oids = oids
+        self._state = state
+        return self
+
+    def ids(self, field):
+        """
+        :param field: (string) The name of the unique id field (must be read)
+        :return: (list) The ids as strings
+        """
+        return [str(value) for value in self.columns[field]]
+
+
+def get_layer_table(layer):
+    """
+    :param layer: (Feature Layer or LayerTable) The layer (or an already read table)
+    :return: (LayerTable) The table for the layer
+    """
+    if isinstance(layer, LayerTable):
+        return layer
+    return LayerTable(layer)
+
+
+def _dissolve(tables):
+    """
+    Unions all of the geometries of the tables
+    :param tables: (list) The LayerTables (geometries must be read)
+    :return: (Geometry) The dissolved geometry
+    """
+    dissovled_geom = None
+    for table in tables:
+        for geometry in table.geometries:
+            if dissovled_geom is None:
+                dissovled_geom = geometry
+            dissovled_geom = dissovled_geom.union(geometry)
+    return dissovled_geom
+
+
+def _get_bounds(geometry):
+    extent = geometry.extent
+    return extent.XMin, extent.YMin, extent.XMax, extent.YMax
+
+
+def _get_covered_part(geometry, bounds, service_area, service_area_bounds, relations):
+    """
+    Classifies a demand area against a service area with the envelopes and then the contains/disjoint predicates,
+    only the pairs that cross the boundary of the service area are intersected
+    :param geometry: (Polygon) The demand area
+    :param bounds: (tuple) The envelope of the demand area (see _get_bounds)
+    :param service_area: (Polygon) The service area
+    :param service_area_bounds: (tuple) The envelope of the service area
+    :param relations: (Counter) The number of pairs of each relation (updated)
+    :return: (Polygon) The part of the demand area that is in the service area (the demand area if it is inside,
+        None if it is disjoint)
+    """
+    relation = geometry_processing.classify_bounds(bounds, service_area_bounds)
+    if relation == geometry_processing.INSIDE and not service_area.contains(geometry):
+        relation = geometry_processing.BOUNDARY
+    if relation == geometry_processing.BOUNDARY and service_area.disjoint(geometry):
+        relation = geometry_processing.DISJOINT
+    relations[relation] += 1
+    if relation == geometry_processing.DISJOINT:
+        return None
+    if relation == geometry_processing.INSIDE:
+        return geometry
+    return service_area.intersect(geometry, 4)
+
+
+def _get_union_area(geometry, parts):
+    """
+    :param geometry: (Polygon) The demand area
+    :param parts: (list) The parts of the demand area in each service area (see _get_covered_part)
+    :return: (float) The area of the demand area that is in any of the service areas
+    """
+    if not parts:
+        return 0.0
+    if any(part is geometry for part in parts):
+        return geometry.area
+    union = parts[0]
+    for part in parts[1:]:
+        union = union.union(part)
+    return union.area
+
+
+def preprocess_polygons(layer, id_field, area_tolerance=None, precision=None, max_vertices=None):
+    """
+    Simplifies, snaps and subdivides the polygons of a (service area) layer so the overlays in
+    generate_partial_coverage and generate_serviceable_demand run on smaller geometries (see
+    geometry_processing.preprocess_polygons). The pieces of a polygon keep its id. Subdivided polygons should not be
+    used for binary coverage of demand polygons, as a demand polygon may not be completely within any single piece
+    :param layer: (Feature Layer or LayerTable) The polygon layer
+    :param id_field: (string) The name of the unique identifying field on the layer
+    :param area_tolerance: (float) The maximum area change of each ring when simplifying (not simplified if None)
+    :param precision: (float) The spacing of the grid to snap to (not snapped if None)
+    :param max_vertices: (int) The maximum number of vertices of a piece (not subdivided if None)
+    :return: (LayerTable) A table of the pieces with the id field
+    """
+    import arcpy
+
+    table = get_layer_table(layer)
+    if table.shape_type != "Polygon":
+        raise TypeError("Layer must have polygon geometry")
+    if id_field not in table.field_names:
+        raise ValueError("'{}' field not found in layer".format(id_field))
+    reset_layers(table.layer)
+    table.read([id_field])
+    spatial_reference = table.geometries[0].spatialReference if table.geometries else None
+    piece_ids, pieces = geometry_processing.preprocess_polygons(
+        table.columns[id_field], [_get_rings(geometry) for geometry in table.geometries], area_tolerance, precision,
+        max_vertices)
+    geometries = []
+    for rings in pieces:
+        parts = arcpy.Array()
+        for part in geometry_processing.get_polygon_parts(rings):
+            points = arcpy.Array()
+            for i, ring in enumerate(part):
+                # Interior rings follow the exterior ring separated by None (as read by _get_rings)
+                if i > 0:
+                    points.add(None)
+                for x, y in ring + ring[:1]:
+                    points.add(arcpy.Point(x, y))
+            parts.add(points)
+        geometries.append(arcpy.Polygon(parts, spatial_reference))
+    reset_layers(table.layer)
+    return LayerTable.from_columns(table.name, "Polygon", {id_field: piece_ids}, geometries)
+
+
 def generate_serviceable_demand(dl, dl_demand_field, dl_id_field, *args):
     """
     Finds to total serviceable coverage when 2 facility layers are used
     Merges polygons & dissolves them to form one big area of total coverage
     Then intersects with demand layer. Only used for partial coverages
-    :param dl: (Feature Layer) The demand polygon or point layer
+    :param dl: (Feature Layer or LayerTable) The demand polygon or point layer
     :param dl_demand_field: (string) The field representing demand
     :param dl_id_field: (string) The name of the unique field for the demand layer
-    :param args: (Feature Layer) The facility layers to use
+    :param args: (Feature Layer or LayerTable) The facility layers to use
     :return: (dictionary) A dictionary of similar format to the coverage format
     """
-    # Reset DF
     # Check parameters so we get useful exceptions and messages
-    reset_layers(dl)
-    reset_layers(*args)
-    if arcpy.Describe(dl).shapeType not in ["Polygon", "Point"]:
+    dl_table = get_layer_table(dl)
+    fl_tables = [get_layer_table(fl) for fl in args]
+    if dl_table.shape_type not in ["Polygon", "Point"]:
         raise TypeError("Demand layer must have polygon geometry")
-    dl_field_names = [f.name for f in arcpy.Describe(dl).fields]
-    if dl_demand_field not in dl_field_names:
+    if dl_demand_field not in dl_table.field_names:
         raise ValueError("'{}' field not found in demand layer".format(dl_demand_field))
-    if dl_id_field not in dl_field_names:
+    if dl_id_field not in dl_table.field_names:
         raise ValueError("'{}' field not found in demand layer".format(dl_id_field))
     # Check that all facility layers are polygon
-    for fl in args:
-        if arcpy.Describe(fl).shapeType != "Polygon":
-            raise TypeError("{} is not a polygon layer".format(fl.desc.name))
-    if fl is None:
+    for fl_table in fl_tables:
+        if fl_table.shape_type != "Polygon":
+            raise TypeError("{} is not a polygon layer".format(fl_table.name))
+    if not fl_tables:
         raise ValueError("No facility service area feature layers specified")
-    dl_desc = arcpy.Describe(dl)
+    # Reset DF
+    reset_layers(dl_table.layer, *[fl_table.layer for fl_table in fl_tables])
+    dl_table.read([dl_id_field, dl_demand_field])
+    for fl_table in fl_tables:
+        fl_table.read([])
     logging.getLogger().info("Initializing output...")
-    if dl_desc.shapeType == "Polygon":
+    if dl_table.shape_type == "Polygon":
         output = {
             "version": version.__version__,
             "demand": {},
@@ -75,7 +304,7 @@ def generate_serviceable_demand(dl, dl_demand_field, dl_id_field, *args):
                 "mode": "serviceableDemand",
                 "type": "partial"}
         }
-    elif dl_desc.shapeType == "Point":
+    else:
         output = {
             "version": version.__version__,
             "demand": {},
@@ -83,53 +312,44 @@ def generate_serviceable_demand(dl, dl_demand_field, dl_id_field, *args):
                 "mode": "serviceableDemand",
                 "type": "binary"}
         }
-    else:
-        raise TypeError("Demand layer must be point or polygon")
     logging.getLogger().info("Combining facilities...")
-    dissovled_geom = None
-    for layer in args:
-        with arcpy.da.SearchCursor(layer, ['SHAPE@']) as fcursor:
-            for f in fcursor:
-                if dissovled_geom is None:
-                    dissovled_geom = f[0]
-                dissovled_geom = dissovled_geom.union(f[0])
+    dissovled_geom = _dissolve(fl_tables)
     logging.getLogger().info("Determining possible service coverage for each demand unit...")
-    with arcpy.da.SearchCursor(dl, [dl_id_field, dl_demand_field, "SHAPE@"]) as dcursor:
-        if arcpy.Describe(dl).shapeType == "Polygon":
-            for d in dcursor:
-                if not dissovled_geom.disjoint(d[2]):
-                    intersected = dissovled_geom.intersect(d[2], 4)
-                    if intersected.area > 0:
-                        serviceable_demand = math.ceil(
-                            float(intersected.area / d[2].area) * d[1])
-                    else:
-                        serviceable_demand = 0.0
-                else:
-                    serviceable_demand = 0.0
-                # Make sure serviceable is less than or equal to demand, floating point issues
-                if serviceable_demand < d[1]:
-                    output["demand"][str(d[0])] = {"serviceableDemand": serviceable_demand}
-                else:
-                    output["demand"][str(d[0])] = {"serviceableDemand": d[1]}
-        else:  # Point
-            for d in dcursor:
-                intersected = dissovled_geom.intersect(d[2], 1)
-                if intersected.centroid:  # check if valid
-                    serviceable_demand = d[1]
-                else:
-                    serviceable_demand = 0.0
-                output["demand"][str(d[0])] = {"serviceableDemand": serviceable_demand}
+    demand_rows = zip(dl_table.ids(dl_id_field), dl_table.columns[dl_demand_field], dl_table.geometries)
+    if dl_table.shape_type == "Polygon":
+        dissolved_bounds = _get_bounds(dissovled_geom)
+        relations = collections.Counter()
+        for demand_id, demand, geometry in demand_rows:
+            part = _get_covered_part(geometry, _get_bounds(geometry), dissovled_geom, dissolved_bounds, relations)
+            area = part.area if part is not None else 0.0
+            if area > 0:
+                serviceable_demand = math.ceil(float(area / geometry.area) * demand)
+            else:
+                serviceable_demand = 0.0
+            # Make sure serviceable is less than or equal to demand, floating point issues
+            if serviceable_demand < demand:
+                output["demand"][demand_id] = {"serviceableDemand": serviceable_demand}
+            else:
+                output["demand"][demand_id] = {"serviceableDemand": demand}
+        logging.getLogger().info("Demand units by relation to the service area: {}".format(dict(relations)))
+    else:  # Point
+        for demand_id, demand, geometry in demand_rows:
+            intersected = dissovled_geom.intersect(geometry, 1)
+            if intersected.centroid:  # check if valid
+                serviceable_demand = demand
+            else:
+                serviceable_demand = 0.0
+            output["demand"][demand_id] = {"serviceableDemand": serviceable_demand}
     logging.getLogger().info("Serviceable demand successfully created.")
-    reset_layers(dl)
-    reset_layers(*args)
+    reset_layers(dl_table.layer, *[fl_table.layer for fl_table in fl_tables])
     return output
 
 
 def generate_binary_coverage(dl, fl, dl_demand_field, dl_id_field, fl_id_field, fl_variable_name=None):
     """
     Generates a dictionary representing the binary coverage of a facility to demand points
-    :param dl: (Feature Layer) The demand polygon or point layer
-    :param fl: (Feature Layer) The facility service area polygon layer
+    :param dl: (Feature Layer or LayerTable) The demand polygon or point layer
+    :param fl: (Feature Layer or LayerTable) The facility service area polygon layer
     :param dl_demand_field: (string) The name of the field in the demand layer that describes the demand
     :param dl_id_field: (string) The name of the unique identifying field on the demand layer
     :param fl_id_field: (string) The name of the unique identifying field on the facility layer
@@ -137,21 +357,25 @@ def generate_binary_coverage(dl, fl, dl_demand_field, dl_id_field, fl_id_field,
     :return: (dictionary) A nested dictionary storing the coverage relationships
     """
     # Check parameters so we get useful exceptions and messages
-    if arcpy.Describe(dl).shapeType not in ["Polygon", "Point"]:
+    dl_table = get_layer_table(dl)
+    fl_table = get_layer_table(fl)
+    if dl_table.shape_type not in ["Polygon", "Point"]:
         raise TypeError("Demand layer must have polygon or point geometry")
-    if arcpy.Describe(fl).shapeType != "Polygon":
+    if fl_table.shape_type != "Polygon":
         raise TypeError("Facility service area layer must have polygon geometry")
-    dl_field_names = [f.name for f in arcpy.Describe(dl).fields]
-    if dl_demand_field not in dl_field_names:
+    if dl_demand_field not in dl_table.field_names:
         raise ValueError("'{}' field not found in demand layer".format(dl_demand_field))
-    if dl_id_field not in dl_field_names:
+    if dl_id_field not in dl_table.field_names:
         raise ValueError("'{}' field not found in demand layer".format(dl_id_field))
-    fl_field_names = [f.name for f in arcpy.Describe(fl).fields]
-    if fl_id_field not in fl_field_names:
+    if fl_id_field not in fl_table.field_names:
         raise ValueError("'{}' field not found in facility service area layer".format(fl_id_field))
-    reset_layers(dl, fl)
+    reset_layers(dl_table.layer, fl_table.layer)
     if fl_variable_name is None:
-        fl_variable_name = os.path.splitext(os.path.basename(arcpy.Describe(fl).name))[0]
+        fl_variable_name = os.path.splitext(os.path.basename(fl_table.name))[0]
+    dl_table.read([dl_id_field, dl_demand_field, "SHAPE@AREA"])
+    fl_table.read([fl_id_field])
+    dl_ids = dl_table.ids(dl_id_field)
+    fl_ids = fl_table.ids(fl_id_field)
     logging.getLogger().info("Initializing facilities in output...")
     output = {
         "version": version.__version__,
@@ -162,78 +386,148 @@ def generate_binary_coverage(dl, fl, dl_demand_field, dl_id_field, fl_id_field,
         "demand": {},
         "totalDemand": 0.0,
         "totalServiceableDemand": 0.0,
-        "facilities": {fl_variable_name: []}
+        "facilities": {fl_variable_name: list(collections.OrderedDict.fromkeys(fl_ids))}
     }
-    # List all of the facilities
-    with arcpy.da.SearchCursor(fl, [fl_id_field]) as cursor:
-        for row in cursor:
-            output["facilities"][fl_variable_name].append(str(row[0]))
     # Build empty data structure
-    with arcpy.da.SearchCursor(dl, [dl_id_field, dl_demand_field, "SHAPE@AREA"]) as cursor:
-        for row in cursor:
-            output["demand"][str(row[0])] = {
-                "area": round(row[2]),
-                "demand": round(row[1]),
-                "serviceableDemand": 0,
-                "coverage": {fl_variable_name: {}}
-            }
+    for demand_id, demand, area in zip(dl_ids, dl_table.columns[dl_demand_field], dl_table.columns["SHAPE@AREA"]):
+        output["demand"][demand_id] = {
+            "area": round(area),
+            "demand": round(demand),
+            "serviceableDemand": 0,
+            "coverage": {fl_variable_name: {}}
+        }
     logging.getLogger().info("Determining binary coverage for each demand unit...")
-    with arcpy.da.SearchCursor(fl, [fl_id_field, "SHAPE@"]) as fcursor:
-        if arcpy.Describe(dl).shapeType == "Point":
-            for f in fcursor:
-                with arcpy.da.SearchCursor(dl, [dl_id_field, "SHAPE@"]) as dcursor:
-                    for d in dcursor:
-                        if not f[1].disjoint(d[1]):
-                            output["demand"][str(d[0])]["serviceableDemand"] = \
-                                output["demand"][str(d[0])]["demand"]
-                            output["demand"][str(d[0])]["coverage"][fl_variable_name][str(f[0])] = 1
-        else:  # Polygon
-            for f in fcursor:
-                with arcpy.da.SearchCursor(dl, [dl_id_field, "SHAPE@"]) as dcursor:
-                    for d in dcursor:
-                        if not f[1].disjoint(d[1]):
-                            if f[1].contains(d[1]):
-                                output["demand"][str(d[0])]["serviceableDemand"] = \
-                                    output["demand"][str(d[0])]["demand"]
-                                output["demand"][str(d[0])]["coverage"][fl_variable_name][str(f[0])] = 1
-    with arcpy.da.SearchCursor(dl, [dl_id_field, dl_demand_field]) as cursor:
-        for row in cursor:
-            output["totalServiceableDemand"] += output["demand"][str(row[0])]["serviceableDemand"]
-            output["totalDemand"] += row[1]
+    is_point = dl_table.shape_type == "Point"
+    for facility_id, facility_geometry in zip(fl_ids, fl_table.geometries):
+        for demand_id, demand_geometry in zip(dl_ids, dl_table.geometries):
+            if not facility_geometry.disjoint(demand_geometry):
+                # Polygons must be completely within the service area
+                if is_point or facility_geometry.contains(demand_geometry):
+                    output["demand"][demand_id]["serviceableDemand"] = output["demand"][demand_id]["demand"]
+                    output["demand"][demand_id]["coverage"][fl_variable_name][facility_id] = 1
+    for demand_id, demand in zip(dl_ids, dl_table.columns[dl_demand_field]):
+        output["totalServiceableDemand"] += output["demand"][demand_id]["serviceableDemand"]
+        output["totalDemand"] += demand
     logging.getLogger().info("Binary coverage successfully generated.")
-    reset_layers(dl, fl)
+    reset_layers(dl_table.layer, fl_table.layer)
     return output
 
 
+def generate_radius_coverage(dl, fl, dl_demand_field, radius, dl_id_field="OBJECTID", fl_id_field="OBJECTID",
+                             fl_variable_name=None, geographic=False):
+    """
+    Generates a dictionary representing the binary coverage of facility points to demand within a straight line
+    distance, without buffering the facilities (see distance_analysis.generate_radius_coverage)
+    :param dl: (Feature Layer or LayerTable) The demand point or polygon (centroid is used) layer
+    :param fl: (Feature Layer or LayerTable) The facility point layer
+    :param dl_demand_field: (string) The name of the field in the demand layer that describes the demand
+    :param radius: (float or list) The service radius in the units of the layers (meters if geographic), or a list
+    :param dl_id_field: (string) The name of the unique identifying field on the demand layer
+    :param fl_id_field: (string) The name of the unique identifying field on the facility layer
+    :param fl_variable_name: (string) The name to use to represent the facility variable
+    :param geographic: (bool) Are the layers in a geographic coordinate system (great circle distances are used)
+    :return: (dictionary or list) A nested dictionary storing the coverage relationships (one for each radius if a
+        list of radii was given)
+    """
+    # Check parameters so we get useful exceptions and messages
+    dl_table = get_layer_table(dl)
+    fl_table = get_layer_table(fl)
+    if dl_table.shape_type not in ["Polygon", "Point"]:
+        raise TypeError("Demand layer must have polygon or point geometry")
+    if fl_table.shape_type != "Point":
+        raise TypeError("Facility layer must have point geometry")
+    if dl_demand_field not in dl_table.field_names:
+        raise ValueError("'{}' field not found in demand layer".format(dl_demand_field))
+    if dl_id_field not in dl_table.field_names:
+        raise ValueError("'{}' field not found in demand layer".format(dl_id_field))
+    if fl_id_field not in fl_table.field_names:
+        raise ValueError("'{}' field not found in facility layer".format(fl_id_field))
+    reset_layers(dl_table.layer, fl_table.layer)
+    if fl_variable_name is None:
+        fl_variable_name = os.path.splitext(os.path.basename(fl_table.name))[0]
+    dl_table.read([dl_id_field, dl_demand_field, "SHAPE@XY"], geometry=False)
+    fl_table.read([fl_id_field, "SHAPE@XY"], geometry=False)
+    output = distance_analysis.generate_radius_coverage(dl_table.ids(dl_id_field), dl_table.columns[dl_demand_field],
+                                                        dl_table.columns["SHAPE@XY"], fl_table.ids(fl_id_field),
+                                                        fl_table.columns["SHAPE@XY"], radius, fl_variable_name,
+                                                        geographic)
+    reset_layers(dl_table.layer, fl_table.layer)
+    return output
+
+
+def _get_rings(geometry):
+    """
+    :param geometry: (Polygon) The polygon geometry
+    :return: (list) The rings of all parts of the polygon, each a list of (x, y) tuples
+    """
+    rings = []
+    for part in geometry:
+        ring = []
+        # Interior rings follow the exterior ring of a part separated by None
+        for point in part:
+            if point is None:
+                rings.append(ring)
+                ring = []
+            else:
+                ring.append((point.X, point.Y))
+        rings.append(ring)
+    return [ring for ring in rings if ring]
+
+
 def generate_partial_coverage(dl, fl, dl_demand_field, dl_id_field="OBJECTID", fl_id_field="OBJECTID",
-                              fl_variable_name=None):
+                              fl_variable_name=None, resolution=None, min_area=None, min_share=None,
+                              min_demand=None, checkpoint=None, progress_callback=None):
     """
     Generates a dictionary representing the partial coverage (based on area) of a facility to demand areas
-    :param dl: (Feature Layer) The demand polygon layer
-    :param fl: (Feature Layer) The facility service area polygon layer
+    If a resolution is provided, the coverage is approximated by rasterizing the polygons (see
+    raster_analysis.generate_partial_coverage) rather than intersecting every demand area with every service area.
+    Slivers are dropped if any of the thresholds are set (see geometry_processing.SliverFilter), the demand discarded
+    is reported in the output as 'sliverFilter'. With a checkpoint file, the demand units are saved as they are
+    generated and the units already in the file (from a run that was stopped) are not generated again
+    :param dl: (Feature Layer or LayerTable) The demand polygon layer
+    :param fl: (Feature Layer or LayerTable) The facility service area polygon layer
     :param dl_demand_field: (string) The name of the field in the demand layer that describes the demand
     :param dl_id_field: (string) The name of the unique identifying field on the demand layer
     :param fl_id_field: (string) The name of the unique identifying field on the facility layer
     :param fl_variable_name: (string) The name to use to represent the facility variable
+    :param resolution: (float) The width of a raster cell in the units of the layers (exact intersection if None)
+    :param min_area: (float) The minimum covered area of a demand area by a facility (no minimum if None)
+    :param min_share: (float) The minimum share (0 - 1) of a demand area covered by a facility (no minimum if None)
+    :param min_demand: (float) The minimum demand covered by a facility (no minimum if None)
+    :param checkpoint: (string) The path of a file to save the demand units to as they are generated, and resume
+        from (see checkpointing.CoverageCheckpoint), not used with a resolution
+    :param progress_callback: (function) Called periodically with the progress, rate and eta (see
+        checkpointing.ProgressReporter), logged if not provided
     :return: (dictionary) A nested dictionary storing the coverage relationships
     """
-    # Reset DF
     # Check parameters so we get useful exceptions and messages
-    if arcpy.Describe(dl).shapeType != "Polygon":
+    dl_table = get_layer_table(dl)
+    fl_table = get_layer_table(fl)
+    if dl_table.shape_type != "Polygon":
         raise TypeError("Demand layer must have polygon geometry")
-    if arcpy.Describe(fl).shapeType != "Polygon":
+    if fl_table.shape_type != "Polygon":
         raise TypeError("Facility service area layer must have polygon geometry")
-    dl_field_names = [f.name for f in arcpy.Describe(dl).fields]
-    if dl_demand_field not in dl_field_names:
+    if dl_demand_field not in dl_table.field_names:
         raise ValueError("'{}' field not found in demand layer".format(dl_demand_field))
-    if dl_id_field not in dl_field_names:
+    if dl_id_field not in dl_table.field_names:
         raise ValueError("'{}' field not found in demand layer".format(dl_id_field))
-    fl_field_names = [f.name for f in arcpy.Describe(fl).fields]
-    if fl_id_field not in fl_field_names:
+    if fl_id_field not in fl_table.field_names:
         raise ValueError("'{}' field not found in facility service area layer".format(fl_id_field))
-    reset_layers(dl, fl)
+    # Reset DF
+    reset_layers(dl_table.layer, fl_table.layer)
     if fl_variable_name is None:
-        fl_variable_name = os.path.splitext(os.path.basename(arcpy.Describe(fl).name))[0]
+        fl_variable_name = os.path.splitext(os.path.basename(fl_table.name))[0]
+    dl_table.read([dl_id_field, dl_demand_field, "SHAPE@AREA"])
+    fl_table.read([fl_id_field])
+    dl_ids = dl_table.ids(dl_id_field)
+    fl_ids = fl_table.ids(fl_id_field)
+    if resolution is not None:
+        output = raster_analysis.generate_partial_coverage(
+            dl_ids, dl_table.columns[dl_demand_field], [_get_rings(geometry) for geometry in dl_table.geometries],
+            fl_ids, [_get_rings(geometry) for geometry in fl_table.geometries], resolution, fl_variable_name,
+            dl_table.columns["SHAPE@AREA"], min_area, min_share, min_demand)
+        reset_layers(dl_table.layer, fl_table.layer)
+        return output
     # Create the initial data structure
     logging.getLogger().info("Initializing facilities in output...")
     output = {
@@ -245,73 +539,186 @@ def generate_partial_coverage(dl, fl, dl_demand_field, dl_id_field="OBJECTID", f
         "demand": {},
         "totalDemand": 0.0,
         "totalServiceableDemand": 0.0,
-        "facilities": {fl_variable_name: []}
+        "facilities": {fl_variable_name: list(collections.OrderedDict.fromkeys(fl_ids))}
     }
-    # Populate the facility ids
-    with arcpy.da.SearchCursor(fl, [fl_id_field]) as cursor:
-        for row in cursor:
-            output["facilities"][fl_variable_name].append(str(row[0]))
     # populate the coverage dictionary with all demand areas (i)
     logging.getLogger().info("Initializing demand in output...")
-    with arcpy.da.SearchCursor(dl, [dl_id_field, dl_demand_field, "SHAPE@AREA"]) as cursor:
-        for row in cursor:
-            output["demand"][str(row[0])] = {
-                "area": round(row[2]),
-                "demand": round(row[1]),
-                "serviceableDemand": 0.0,
-                "coverage": {fl_variable_name: {}}
-            }
-    # Dissolve all facility service areas so we can find the total serviceable area
-    logging.getLogger().info("Combining facilities...")
-    dissovled_geom = None
-    with arcpy.da.SearchCursor(fl, ['SHAPE@']) as fcursor:
-        for f in fcursor:
-            if dissovled_geom is None:
-                dissovled_geom = f[0]
-            dissovled_geom = dissovled_geom.union(f[0])
+    for demand_id, demand, area in zip(dl_ids, dl_table.columns[dl_demand_field], dl_table.columns["SHAPE@AREA"]):
+        output["demand"][demand_id] = {
+            "area": round(area),
+            "demand": round(demand),
+            "serviceableDemand": 0.0,
+            "coverage": {fl_variable_name: {}}
+        }
+    fl_bounds = [_get_bounds(facility_geometry) for facility_geometry in fl_table.geometries]
+    relations = collections.Counter()
+    sliver_filter = geometry_processing.SliverFilter(min_area, min_share, min_demand)
+    completed = {}
+    if checkpoint is not None:
+        checkpoint = checkpointing.CoverageCheckpoint(checkpoint, {
+            "type": "partial", "demandSource": dl_table.source, "demandId": dl_id_field, "demand": dl_demand_field,
+            "facilitySource": fl_table.source, "facilities": fl_variable_name,
+            "facilityIds": checkpointing.get_ids_hash(fl_ids), "minArea": min_area, "minShare": min_share,
+            "minDemand": min_demand})
+        completed = checkpoint.load()
+    progress = checkpointing.ProgressReporter(len(dl_ids), progress_callback,
+                                              completed=len(set(completed).intersection(dl_ids)))
     logging.getLogger().info("Determining partial coverage for each demand unit...")
-    with arcpy.da.SearchCursor(dl, [dl_id_field, dl_demand_field, "SHAPE@"]) as dcursor:
-        for d in dcursor:
-            if not dissovled_geom.disjoint(d[2]):
-                intersected = dissovled_geom.intersect(d[2], 4)
-                if intersected.area > 0:
-                    serviceable_demand = math.ceil(
-                        float(intersected.area / d[2].area) * d[1])
-                else:
-                    serviceable_demand = 0.0
+    try:
+        for demand_id, demand, geometry in zip(dl_ids, dl_table.columns[dl_demand_field], dl_table.geometries):
+            if demand_id in completed:
+                output["demand"][demand_id] = completed[demand_id]
+                checkpointing.add_stats(checkpoint.stats.get(demand_id), sliver_filter, relations)
+                continue
+            demand_obj = output["demand"][demand_id]
+            start = checkpointing.get_stats(sliver_filter, relations)
+            bounds = _get_bounds(geometry)
+            # Each facility is intersected with the demand unit once, the area covered by each facility is summed over
+            # the pieces of subdivided service areas
+            parts = []
+            covered_areas = {}
+            for facility_id, facility_geometry, facility_bounds in zip(fl_ids, fl_table.geometries, fl_bounds):
+                part = _get_covered_part(geometry, bounds, facility_geometry, facility_bounds, relations)
+                if part is not None and part.area > 0:
+                    parts.append(part)
+                    covered_areas[facility_id] = covered_areas.get(facility_id, 0.0) + part.area
+            # The serviceable area is the union of the parts (already clipped to the demand unit), no need to dissolve
+            # all of the service areas
+            area = _get_union_area(geometry, parts)
+            if area > 0:
+                serviceable_demand = math.ceil(float(area / geometry.area) * demand)
             else:
                 serviceable_demand = 0.0
             # Make sure serviceable is less than or equal to demand, floating point issues
-            if serviceable_demand < output["demand"][str(d[0])]["demand"]:
-                output["demand"][str(d[0])]["serviceableDemand"] = serviceable_demand
+            if serviceable_demand < demand_obj["demand"]:
+                demand_obj["serviceableDemand"] = serviceable_demand
             else:
-                output["demand"][str(d[0])]["serviceableDemand"] = output["demand"][str(d[0])]["demand"]
-            with arcpy.da.SearchCursor(fl, [fl_id_field, "SHAPE@"]) as fcursor:
-                for f in fcursor:
-                    if not d[2].disjoint(f[1]):
-                        intersected_fd = d[2].intersect(f[1], 4)
-                        if intersected_fd.area > 0:
-                            demand = math.ceil(float(intersected_fd.area / d[2].area) * d[1])
-                            if demand < output["demand"][str(d[0])]["serviceableDemand"]:
-                                output["demand"][str(d[0])]["coverage"][fl_variable_name][str(f[0])] = demand
-                            else:
-                                output["demand"][str(d[0])]["coverage"][fl_variable_name][str(f[0])] = \
-                                    output["demand"][str(d[0])]["serviceableDemand"]
-    with arcpy.da.SearchCursor(dl, [dl_id_field, dl_demand_field, "SHAPE@AREA"]) as cursor:
-        for row in cursor:
-            output["totalServiceableDemand"] += output["demand"][str(row[0])]["serviceableDemand"]
-            output["totalDemand"] += row[1]
+                demand_obj["serviceableDemand"] = demand_obj["demand"]
+            for facility_id, covered_area in covered_areas.items():
+                covered_demand = math.ceil(float(covered_area / geometry.area) * demand)
+                if covered_demand > demand_obj["serviceableDemand"]:
+                    covered_demand = demand_obj["serviceableDemand"]
+                if not sliver_filter.is_sliver(covered_area, geometry.area, covered_demand):
+                    demand_obj["coverage"][fl_variable_name][facility_id] = covered_demand
+            if checkpoint is not None:
+                checkpoint.add(demand_id, demand_obj, checkpointing.get_stats(sliver_filter, relations, start))
+            progress.update()
+    finally:
+        # Save the demand units generated so far, even if the run is interrupted
+        if checkpoint is not None:
+            checkpoint.flush()
+    for demand_id, demand in zip(dl_ids, dl_table.columns[dl_demand_field]):
+        output["totalServiceableDemand"] += output["demand"][demand_id]["serviceableDemand"]
+        output["totalDemand"] += demand
+    logging.getLogger().info("Demand/facility pairs by relation: {}".format(dict(relations)))
+    if sliver_filter.is_active():
+        output["sliverFilter"] = sliver_filter.get_report()
+        logging.getLogger().info("Dropped {} slivers ({} demand).".format(sliver_filter.slivers,
+                                                                          sliver_filter.discarded_demand))
     logging.getLogger().info("Partial coverage successfully generated.")
-    reset_layers(dl, fl)
+    reset_layers(dl_table.layer, fl_table.layer)
     return output
 
+
+def _read_selection(layer, fields, keep=None):
+    """
+    Reads the selected features of a layer into a table that isn't backed by the layer, so the generators resetting
+    the layer don't read the whole layer
+    :param layer: (Feature Layer) The layer (with a selection)
+    :param fields: (list) The names of the fields to read
+    :param keep: (function) Called with the values of the fields of each feature, the features it returns False for
+        are dropped (optional)
+    :return: (LayerTable) The table
+    """
+    import arcpy
+
+    table = LayerTable(layer)
+    # An empty selection would read every feature
+    if not arcpy.Describe(layer).FIDSet:
+        return LayerTable.from_columns(table.name, table.shape_type, {field: [] for field in fields}, [])
+    table.read(fields)
+    rows = list(zip(*([table.columns[field] for field in fields] + [table.geometries])))
+    if keep is not None:
+        rows = [row for row in rows if keep(dict(zip(fields, row)))]
+    columns = {field: [row[i] for row in rows] for i, field in enumerate(fields)}
+    return LayerTable.from_columns(table.name, table.shape_type, columns, [row[-1] for row in rows])
+
+
+def generate_tiled_coverage(dl, fl, dl_demand_field, dl_id_field, fl_id_field, store, tile_size,
+                            coverage_type="binary", fl_variable_name=None, search_distance=None, **kwargs):
+    """
+    Generates a binary or partial coverage one spatial tile of the demand layer at a time and appends each tile to a
+    coverage store on disk, for demand layers too large to hold the coverage (or the features) in memory. The demand
+    units with their center in a tile are read with the facilities that intersect them (within the search distance),
+    so memory is bounded by the size of a tile. The coverage can then be loaded from the store lazily (by bounding
+    box or demand ids, see CoverageStore.iter_demand and CoverageStore.load_coverage)
+    :param dl: (Feature Layer) The demand polygon or point layer
+    :param fl: (Feature Layer) The facility service area polygon layer
+    :param dl_demand_field: (string) The name of the field in the demand layer that describes the demand
+    :param dl_id_field: (string) The name of the unique identifying field on the demand layer
+    :param fl_id_field: (string) The name of the unique identifying field on the facility layer
+    :param store: (CoverageStore) The store to write the coverage to (any coverage already stored is replaced)
+    :param tile_size: (float) The width (and height) of a tile in the units of the demand layer
+    :param coverage_type: (string) ['binary', 'partial'] The type of coverage to generate
+    :param fl_variable_name: (string) The name to use to represent the facility variable
+    :param search_distance: (string) The distance (linear unit) around the demand of a tile that facilities are read
+        from (optional)
+    :param kwargs: Keyword arguments for generate_partial_coverage (resolution, min_area...), the facilities read
+        differ between tiles so a checkpoint path is used as the prefix of one checkpoint file per tile
+        ('<checkpoint>.<tile>')
+    :return: (CoverageStore) The store
+    """
+    import arcpy
+
+    generators = {"binary": generate_binary_coverage, "partial": generate_partial_coverage}
+    if coverage_type not in generators:
+        raise ValueError("Expected types: '{}' got type '{}'".format(sorted(generators), coverage_type))
+    reset_layers(dl, fl)
+    dl_desc = arcpy.Describe(dl)
+    if fl_variable_name is None:
+        fl_variable_name = os.path.splitext(os.path.basename(arcpy.Describe(fl).name))[0]
+    extent = dl_desc.extent
+    grid = raster_analysis.RasterGrid((extent.XMin, extent.YMin, extent.XMax, extent.YMax), tile_size)
+    store.clear()
+    # List all of the facilities, even those that don't cover any demand
+    with arcpy.da.SearchCursor(fl, [fl_id_field]) as cursor:
+        store.add_facilities({fl_variable_name: [str(row[0]) for row in cursor]})
+    checkpoint = kwargs.pop("checkpoint", None)
+    logging.getLogger().info("Generating coverage in {} tiles...".format(grid.size))
+    for cell in range(grid.size):
+        xmin, ymin, xmax, ymax = grid.get_cell_bounds(cell)
+        tile = arcpy.Polygon(arcpy.Array([arcpy.Point(xmin, ymin), arcpy.Point(xmin, ymax), arcpy.Point(xmax, ymax),
+                                          arcpy.Point(xmax, ymin)]), dl_desc.spatialReference)
+        arcpy.SelectLayerByLocation_management(dl, "HAVE_THEIR_CENTER_IN", tile)
+        # Centers on the edge of two tiles are selected by both, keep them in the tile the grid assigns them to
+        dl_table = _read_selection(dl, [dl_id_field, dl_demand_field, "SHAPE@AREA", "SHAPE@XY"],
+                                   lambda row: grid.get_cell(*row["SHAPE@XY"]) == cell)
+        if not dl_table.geometries:
+            continue
+        # The facilities that can cover the demand selected (a superset if centers on the edge were dropped)
+        arcpy.SelectLayerByLocation_management(fl, "INTERSECT", dl, search_distance)
+        fl_table = _read_selection(fl, [fl_id_field])
+        if checkpoint is not None:
+            kwargs["checkpoint"] = "{}.{}".format(checkpoint, cell)
+        coverage = generators[coverage_type](dl_table, fl_table, dl_demand_field, dl_id_field, fl_id_field,
+                                             fl_variable_name=fl_variable_name, **kwargs)
+        store.append_coverage(coverage, dict(zip(dl_table.ids(dl_id_field),
+                                                 [tuple(xy) for xy in dl_table.columns["SHAPE@XY"]])))
+        logging.getLogger().info("Tile {} of {}: {} demand units, {} facilities".format(
+            cell + 1, grid.size, len(dl_table.geometries), len(fl_table.geometries)))
+    store.create_indexes()
+    reset_layers(dl, fl)
+    logging.getLogger().info("Tiled coverage successfully generated.")
+    return store
+
+
 def generate_traumah_coverage(dl, dl_service_area, tc_layer, ad_layer, dl_demand_field, air_distance_threshold, dl_id_field="OBJECTID", tc_layer_id_field="OBJECTID", ad_layer_id_field="OBJECTID"):
     """
     Generates a coverage model for the TRAUMAH model. The traumah model uses trauma centers (TC), air depots (AD), and demand
-    :param dl: (Feature Layer) The demand point layer
-    :param dl_service_area (Feature Layer) The demand service area (generally derived from street network)
-    :param tc_layer: (Feature Layer) The Trauma Center point layer
-    :param ad_layer: (Feature Layer) The Air Depot point layer
+    :param dl: (Feature Layer or LayerTable) The demand point layer
+    :param dl_service_area (Feature Layer or LayerTable) The demand service area (generally derived from street network)
+    :param tc_layer: (Feature Layer or LayerTable) The Trauma Center point layer
+    :param ad_layer: (Feature Layer or LayerTable) The Air Depot point layer
     :param dl_demand_field: (string) The attribute that represents the demand in the demand layer
     :param air_distance_threshold: (float) The maximum total distance a helicopter can fly
     :param dl_id_field: (string) The attribute that represents unique ids for the demand layers
@@ -319,29 +726,33 @@ def generate_traumah_coverage(dl, dl_service_area, tc_layer, ad_layer, dl_demand
     :param ad_layer_id_field: (string) The attribute that represents unique ids for the air depot layers
     :return: (dictionary) A nested dictionary storing the coverage relationships
     """
-    # Reset DF
     # Check parameters so we get useful exceptions and messages
-    if arcpy.Describe(dl).shapeType != "Point":
+    dl_table = get_layer_table(dl)
+    dl_service_area_table = get_layer_table(dl_service_area)
+    tc_table = get_layer_table(tc_layer)
+    ad_table = get_layer_table(ad_layer)
+    if dl_table.shape_type != "Point":
         raise TypeError("Demand layer must have point geometry")
-    if arcpy.Describe(dl_service_area).shapeType != "Polygon":
+    if dl_service_area_table.shape_type != "Polygon":
         raise TypeError("Demand layer must have polygon geometry")
-    if arcpy.Describe(tc_layer).shapeType != "Point":
+    if tc_table.shape_type != "Point":
         raise TypeError("Trauma center layer must have point geometry")
-    dl_field_names = [f.name for f in arcpy.Describe(dl).fields]
-    dl_service_area_field_names = [f.name for f in arcpy.Describe(dl_service_area).fields]
-    if dl_demand_field not in dl_field_names:
+    if dl_demand_field not in dl_table.field_names:
         raise ValueError("'{}' field not found in demand layer".format(dl_demand_field))
-    if dl_id_field not in dl_field_names:
+    if dl_id_field not in dl_table.field_names:
         raise ValueError("'{}' field not found in demand layer".format(dl_id_field))
-    if dl_id_field not in dl_service_area_field_names:
+    if dl_id_field not in dl_service_area_table.field_names:
         raise ValueError("'{}' field not found in demand service area layer".format(dl_id_field))
-    tc_layer_field_names = [f.name for f in arcpy.Describe(tc_layer).fields]
-    if tc_layer_id_field not in tc_layer_field_names:
+    if tc_layer_id_field not in tc_table.field_names:
         raise ValueError("'{}' field not found in trauma center layer".format(tc_layer_id_field))
-    ad_layer_field_names = [f.name for f in arcpy.Describe(ad_layer).fields]
-    if ad_layer_id_field not in ad_layer_field_names:
+    if ad_layer_id_field not in ad_table.field_names:
         raise ValueError("'{}' field not found in air depot layer".format(ad_layer_id_field))
-    reset_layers(dl, dl_service_area, tc_layer, ad_layer)
+    # Reset DF
+    reset_layers(dl_table.layer, dl_service_area_table.layer, tc_table.layer, ad_table.layer)
+    dl_table.read([dl_id_field, dl_demand_field, "SHAPE@AREA"])
+    dl_service_area_table.read([dl_id_field])
+    tc_table.read([tc_layer_id_field])
+    ad_table.read([ad_layer_id_field])
     ad_variable_name = "AirDepot"
     tc_variable_name = "TraumaCenter"
     ad_tc_variable_name = "ADTCPair"
@@ -356,57 +767,44 @@ def generate_traumah_coverage(dl, dl_service_area, tc_layer, ad_layer, dl_demand
         "demand": {},
         "totalDemand": 0.0,
         "totalServiceableDemand": 0.0,
-        "facilities": {ad_variable_name: [],
-                       tc_variable_name: []}
+        "facilities": {ad_variable_name: ad_table.ids(ad_layer_id_field),
+                       tc_variable_name: tc_table.ids(tc_layer_id_field)}
     }
-    # Populate the facility ids
-    with arcpy.da.SearchCursor(ad_layer, [ad_layer_id_field]) as cursor:
-        for row in cursor:
-            output["facilities"][ad_variable_name].append(str(row[0]))
-    with arcpy.da.SearchCursor(tc_layer, [tc_layer_id_field]) as cursor:
-        for row in cursor:
-            output["facilities"][tc_variable_name].append(str(row[0]))
     # populate the coverage dictionary with all demand areas (i)
     logging.getLogger().info("Initializing demand in output...")
-    with arcpy.da.SearchCursor(dl, [dl_id_field, dl_demand_field, "SHAPE@AREA"]) as cursor:
-        for row in cursor:
-            output["demand"][str(row[0])] = {
-                "area": round(row[2]),
-                "demand": round(row[1]),
-                "serviceableDemand": 0.0,
-                "coverage": {tc_variable_name: [],
-                             ad_tc_variable_name: []
-                }
+    dl_ids = dl_table.ids(dl_id_field)
+    for demand_id, demand, area in zip(dl_ids, dl_table.columns[dl_demand_field], dl_table.columns["SHAPE@AREA"]):
+        output["demand"][demand_id] = {
+            "area": round(area),
+            "demand": round(demand),
+            "serviceableDemand": 0.0,
+            "coverage": {tc_variable_name: [],
+                         ad_tc_variable_name: []
             }
+        }
     logging.getLogger().info("Determining binary coverage (using ground transport service area) for each demand unit...")
-    with arcpy.da.SearchCursor(tc_layer, [tc_layer_id_field, "SHAPE@"]) as fcursor:
-        for f in fcursor:
-            with arcpy.da.SearchCursor(dl_service_area, [dl_id_field, "SHAPE@"]) as dcursor:
-                for d in dcursor:
-                    if not f[1].disjoint(d[1]):
-                        output["demand"][str(d[0])]["coverage"][tc_variable_name].append({
-                            tc_variable_name: str(f[0])
-                        })
+    tc_rows = list(zip(tc_table.ids(tc_layer_id_field), tc_table.geometries))
+    ad_rows = list(zip(ad_table.ids(ad_layer_id_field), ad_table.geometries))
+    for tc_id, tc_geometry in tc_rows:
+        for demand_id, geometry in zip(dl_service_area_table.ids(dl_id_field), dl_service_area_table.geometries):
+            if not tc_geometry.disjoint(geometry):
+                output["demand"][demand_id]["coverage"][tc_variable_name].append({
+                    tc_variable_name: tc_id
+                })
 
     logging.getLogger().info("Determining binary coverage (using air transportation) for each demand unit...")
-    with arcpy.da.SearchCursor(dl, [dl_id_field, "SHAPE@"]) as dcursor:
-        for d in dcursor:
-            distances = {}
-            with arcpy.da.SearchCursor(tc_layer, [tc_layer_id_field, "SHAPE@"]) as tc_cursor:
-                for tc in tc_cursor:
-                    distances[tc[0]] = d[1].distanceTo(tc[1])
-
-            with arcpy.da.SearchCursor(ad_layer, [ad_layer_id_field, "SHAPE@"]) as ad_cursor:
-                for ad in ad_cursor:
-                    distance = d[1].distanceTo(ad[1])
-                    for k, v in distances.items():
-                         if distance+v <= air_distance_threshold:
-                             output["demand"][str(d[0])]["coverage"][ad_tc_variable_name].append({
-                                 tc_variable_name: str(k),
-                                 ad_variable_name: str(ad[0])
-                             })
+    for demand_id, geometry in zip(dl_ids, dl_table.geometries):
+        distances = [(tc_id, geometry.distanceTo(tc_geometry)) for tc_id, tc_geometry in tc_rows]
+        for ad_id, ad_geometry in ad_rows:
+            distance = geometry.distanceTo(ad_geometry)
+            for tc_id, tc_distance in distances:
+                if distance + tc_distance <= air_distance_threshold:
+                    output["demand"][demand_id]["coverage"][ad_tc_variable_name].append({
+                        tc_variable_name: tc_id,
+                        ad_variable_name: ad_id
+                    })
     logging.getLogger().info("Binary traumah coverage successfully generated.")
-    reset_layers(dl, tc_layer, ad_layer)
+    reset_layers(dl_table.layer, tc_table.layer, ad_table.layer)
     return output
 
 
@@ -416,61 +814,120 @@ def get_covered_demand(dl, dl_demand_field, mode, *args):
     Merges polygons & dissolves them to form one big area of total coverage
     Then intersects with demand layer. Only used for partial coverages
 
-    Honors definition query and selection for facility layers
-    :param dl: (Feature Layer) The demand polygon or point layer
+    Honors definition query and selection for facility layers (a LayerTable is read again if they have changed
+    since it was read)
+    :param dl: (Feature Layer or LayerTable) The demand polygon or point layer
     :param dl_demand_field: (string) The field representing demand
     :param mode: (string) ['binary', 'partial'] The method to use to evaluate coverage
-    :param args: (Feature Layer) The facility layers to use
+    :param args: (Feature Layer or LayerTable) The facility layers to use
     :return: (dictionary) A dictionary of similar format to the coverage format
     """
-    # Reset DF
     # Check parameters so we get useful exceptions and messages
-    reset_layers(dl)
-    if arcpy.Describe(dl).shapeType not in ["Polygon", "Point"]:
+    dl_table = get_layer_table(dl)
+    fl_tables = [get_layer_table(fl) for fl in args]
+    if dl_table.shape_type not in ["Polygon", "Point"]:
         raise TypeError("Demand layer must have polygon geometry")
-    dl_field_names = [f.name for f in arcpy.Describe(dl).fields]
-    if dl_demand_field not in dl_field_names:
+    if dl_demand_field not in dl_table.field_names:
         raise ValueError("'{}' field not found in demand layer".format(dl_demand_field))
     # Check that all facility layers are polygon
-    for fl in args:
-        if arcpy.Describe(fl).shapeType != "Polygon":
-            raise TypeError("{} is not a polygon layer".format(fl.desc.name))
-    if fl is None:
+    for fl_table in fl_tables:
+        if fl_table.shape_type != "Polygon":
+            raise TypeError("{} is not a polygon layer".format(fl_table.name))
+    if not fl_tables:
         raise ValueError("No facility service area feature layers specified")
+    # Reset DF
+    reset_layers(dl_table.layer)
+    dl_table.read([dl_demand_field])
+    for fl_table in fl_tables:
+        fl_table.read([])
     logging.getLogger().info("Combining facilities...")
-    dissovled_geom = None
-    for layer in args:
-        with arcpy.da.SearchCursor(layer, ['SHAPE@']) as fcursor:
-            for f in fcursor:
-                if dissovled_geom is None:
-                    dissovled_geom = f[0]
-                dissovled_geom = dissovled_geom.union(f[0])
+    dissovled_geom = _dissolve(fl_tables)
     total_coverage = 0
     logging.getLogger().info("Summing service coverage for each demand unit...")
-    with arcpy.da.SearchCursor(dl, [dl_demand_field, "SHAPE@"]) as dcursor:
-        if arcpy.Describe(dl).shapeType == "Polygon" and mode == "partial":
-            for d in dcursor:
-                if not dissovled_geom.disjoint(d[1]):
-                    intersected = dissovled_geom.intersect(d[1], 4)
-                    if intersected.area > 0:
-                        serviceable_demand = math.ceil(
-                            float(intersected.area / d[1].area) * d[0])
-                    else:
-                        serviceable_demand = 0.0
-                else:
-                    serviceable_demand = 0.0
-                # Make sure serviceable is less than or equal to demand, floating point issues
-                if serviceable_demand < d[0]:
-                    total_coverage += serviceable_demand
-                else:
-                    total_coverage += d[0]
-        else:  # binary point or polygon
-            for d in dcursor:
-                if dissovled_geom.contains(d[1]):  # check if valid
-                    serviceable_demand = d[0]
+    demand_rows = zip(dl_table.columns[dl_demand_field], dl_table.geometries)
+    if dl_table.shape_type == "Polygon" and mode == "partial":
+        for demand, geometry in demand_rows:
+            if not dissovled_geom.disjoint(geometry):
+                intersected = dissovled_geom.intersect(geometry, 4)
+                if intersected.area > 0:
+                    serviceable_demand = math.ceil(
+                        float(intersected.area / geometry.area) * demand)
                 else:
                     serviceable_demand = 0.0
+            else:
+                serviceable_demand = 0.0
+            # Make sure serviceable is less than or equal to demand, floating point issues
+            if serviceable_demand < demand:
                 total_coverage += serviceable_demand
+            else:
+                total_coverage += demand
+    else:  # binary point or polygon
+        for demand, geometry in demand_rows:
+            if dissovled_geom.contains(geometry):  # check if valid
+                serviceable_demand = demand
+            else:
+                serviceable_demand = 0.0
+            total_coverage += serviceable_demand
     logging.getLogger().info("Covered demand is: {}".format(total_coverage))
-    reset_layers(dl)
+    reset_layers(dl_table.layer)
     return total_coverage
+
+
+def write_field_values(layer, id_field, values, field_name, field_type="DOUBLE", default=0):
+    """
+    Writes values (keyed on id) to a field of the layer in a single UpdateCursor pass, the field is added if needed
+    :param layer: (Feature Layer) The layer to write to
+    :param id_field: (string) The name of the unique identifying field on the layer
+    :param values: (dictionary) The values to write keyed on id (as strings)
+    :param field_name: (string) The name of the field to write the values to
+    :param field_type: (string) The arcpy type of the field if it needs to be added (SHORT, LONG, DOUBLE...)
+    :param default: The value to write for features that are not in values
+    :return: (int) The number of features that were found in values
+    """
+    import arcpy
+
+    field_names = [f.name for f in arcpy.Describe(layer).fields]
+    if id_field not in field_names:
+        raise ValueError("'{}' field not found in layer".format(id_field))
+    if field_name not in field_names:
+        arcpy.AddField_management(layer, field_name, field_type)
+    reset_layers(layer)
+    written = 0
+    with arcpy.da.UpdateCursor(layer, [id_field, field_name]) as cursor:
+        for row in cursor:
+            key = str(row[0])
+            if key in values:
+                row[1] = values[key]
+                written += 1
+            else:
+                row[1] = default
+            cursor.updateRow(row)
+    return written
+
+
+def write_selected_facilities(fl, fl_id_field, ids, field_name="SELECTED"):
+    """
+    Flags the chosen facilities (1) and the others (0) on the facility layer
+    Replaces applying generate_query as a definition query, which gets slow with many ids
+    :param fl: (Feature Layer) The facility layer
+    :param fl_id_field: (string) The name of the unique identifying field on the facility layer
+    :param ids: (list) The ids of the chosen facilities (see utilities.get_ids)
+    :param field_name: (string) The name of the field to write the flags to
+    :return: (int) The number of facilities flagged
+    """
+    return write_field_values(fl, fl_id_field, {str(facility_id): 1 for facility_id in ids}, field_name, "SHORT", 0)
+
+
+def write_covered_demand(dl, dl_id_field, covered_demand, field_name="COVERED"):
+    """
+    Writes the demand covered for each demand unit (from utilities.get_covered_demand) to the demand layer
+    :param dl: (Feature Layer) The demand layer
+    :param dl_id_field: (string) The name of the unique identifying field on the demand layer
+    :param covered_demand: (dictionary) The covered demand, either the output of utilities.get_covered_demand or
+        its 'demand' dictionary (covered demand keyed on demand id)
+    :param field_name: (string) The name of the field to write the covered demand to
+    :return: (int) The number of demand units written
+    """
+    if "demand" in covered_demand and isinstance(covered_demand["demand"], dict):
+        covered_demand = covered_demand["demand"]
+    return write_field_values(dl, dl_id_field, covered_demand, field_name, "DOUBLE", 0)
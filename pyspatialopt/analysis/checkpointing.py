@@ -0,0 +1,200 @@
+# -*- coding: UTF-8 -*-
+import hashlib
+import json
+import logging
+import os
+import time
+
+
+def get_ids_hash(ids):
+    """
+    Hashes a list of ids (independent of their order) so the ids a checkpoint was written for can be part of its key
+    :param ids: (list) The ids
+    :return: (string) The sha256 hex digest
+    """
+    return hashlib.sha256(json.dumps(sorted(set(str(i) for i in ids))).encode("utf-8")).hexdigest()
+
+
+def get_stats(sliver_filter, relations, start=None):
+    """
+    Gets the statistics recorded by a partial coverage generator so they can be saved with each demand unit
+    :param sliver_filter: (SliverFilter) The sliver filter of the generator
+    :param relations: (Counter) The number of demand/facility pairs of each relation
+    :param start: (dictionary) The statistics before the demand unit was generated, the difference is returned
+        (optional)
+    :return: (dictionary) The number of slivers, the demand discarded and the pairs of each relation
+    """
+    stats = {"slivers": sliver_filter.slivers, "discardedDemand": sliver_filter.discarded_demand,
+             "relations": dict(relations)}
+    if start is not None:
+        stats = {"slivers": stats["slivers"] - start["slivers"],
+                 "discardedDemand": stats["discardedDemand"] - start["discardedDemand"],
+                 "relations": {relation: count - start["relations"].get(relation, 0)
+                               for relation, count in stats["relations"].items()
+                               if count != start["relations"].get(relation, 0)}}
+    return stats
+
+
+def add_stats(stats, sliver_filter, relations):
+    """
+    Adds the statistics of a demand unit restored from a checkpoint back to a generator
+    :param stats: (dictionary) The statistics (see get_stats), nothing is added if None
+    :param sliver_filter: (SliverFilter) The sliver filter of the generator
+    :param relations: (Counter) The number of demand/facility pairs of each relation
+    :return:
+    """
+    if stats is None:
+        return
+    sliver_filter.add(stats["slivers"], stats["discardedDemand"])
+    relations.update(stats["relations"])
+
+
+class CoverageCheckpoint(object):
+    """
+    Records the demand units of a coverage that have been generated in a local file so a long running generator
+    that is killed can be resumed where it stopped. Each demand unit is appended as a line of json (the first line
+    identifies the coverage being generated), lines are buffered and written every interval demand units or seconds.
+    Statistics of each demand unit (slivers dropped...) can be saved with it so a resumed run reports the same totals.
+    A line that was only partly written when the job was killed is ignored
+    """
+
+    def __init__(self, path, key, interval=1000, seconds=60.0):
+        """
+        :param path: (string) The path of the checkpoint file (created if it doesn't exist)
+        :param key: (dictionary) Identifies the coverage (type, layer sources, fields, hash of the facility ids...), a
+            checkpoint written for a different coverage is not resumed
+        :param interval: (int) The number of demand units to buffer before writing
+        :param seconds: (float) The longest time to buffer demand units before writing
+        """
+        self.path = path
+        self.key = key
+        self.interval = interval
+        self.seconds = seconds
+        self.stats = {}
+        self._buffer = []
+        self._last_write = time.time()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.flush()
+
+    def load(self):
+        """
+        Loads the demand units already generated, their statistics are loaded into stats (keyed on demand id)
+        :return: (dictionary) The demand units already generated keyed on demand id
+        """
+        if not os.path.exists(self.path):
+            with open(self.path, "w") as f:
+                f.write(json.dumps({"key": self.key}) + "\n")
+            return {}
+        completed = {}
+        with open(self.path, "r") as f:
+            try:
+                header = json.loads(f.readline())
+            except ValueError:
+                header = None
+            if header is None:
+                # Killed while the file was being created, nothing was saved
+                logging.getLogger().info("Checkpoint {} has no header, starting from scratch".format(self.path))
+                with open(self.path, "w") as new_file:
+                    new_file.write(json.dumps({"key": self.key}) + "\n")
+                return {}
+            if header.get("key") != self.key:
+                raise ValueError("Checkpoint {} was written for {} not {}".format(self.path, header.get("key"),
+                                                                                   self.key))
+            for line in f:
+                try:
+                    values = json.loads(line)
+                except ValueError:
+                    continue
+                completed[values[0]] = values[1]
+                if len(values) > 2:
+                    self.stats[values[0]] = values[2]
+        logging.getLogger().info("Resuming from checkpoint with {} demand units".format(len(completed)))
+        return completed
+
+    def add(self, demand_id, demand_obj, stats=None):
+        """
+        :param demand_id: (string) The id of the demand unit that was generated
+        :param demand_obj: (dictionary) The demand unit
+        :param stats: (dictionary) Statistics of the demand unit to restore when resuming (optional)
+        :return:
+        """
+        self._buffer.append(json.dumps([demand_id, demand_obj] if stats is None else [demand_id, demand_obj, stats]))
+        if len(self._buffer) >= self.interval or time.time() - self._last_write >= self.seconds:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered demand units to disk
+        :return:
+        """
+        if self._buffer:
+            with open(self.path, "a") as f:
+                # A partly written line of a previous (killed) run is ended so it is the only line lost
+                f.write("\n" if f.tell() > 0 and not self._ends_with_newline() else "")
+                f.write("\n".join(self._buffer) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._buffer = []
+        self._last_write = time.time()
+
+    def _ends_with_newline(self):
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+
+class ProgressReporter(object):
+    """
+    Reports the progress, rate and estimated time remaining of a generator every interval seconds
+    """
+
+    def __init__(self, total, callback=None, seconds=10.0, completed=0):
+        """
+        :param total: (int) The number of units to process
+        :param callback: (function) Called with a dictionary of 'completed', 'total', 'rate' (units per second) and
+            'eta' (seconds remaining, None until the rate is known), logged if not provided
+        :param seconds: (float) The time between reports
+        :param completed: (int) The number of units already completed (resumed from a checkpoint), not counted in the
+            rate
+        """
+        self.total = total
+        self.callback = callback
+        self.seconds = seconds
+        self.completed = completed
+        self._resumed = completed
+        self._start = time.time()
+        self._last_report = self._start
+
+    def update(self, count=1):
+        """
+        :param count: (int) The number of units that were completed
+        :return:
+        """
+        self.completed += count
+        now = time.time()
+        if now - self._last_report >= self.seconds or self.completed >= self.total:
+            self._last_report = now
+            self.report(now)
+
+    def report(self, now=None):
+        """
+        :return: (dictionary) The progress reported
+        """
+        elapsed = (now or time.time()) - self._start
+        rate = (self.completed - self._resumed) / elapsed if elapsed > 0 else 0.0
+        progress = {
+            "completed": self.completed,
+            "total": self.total,
+            "rate": rate,
+            "eta": (self.total - self.completed) / rate if rate > 0 else None
+        }
+        if self.callback is not None:
+            self.callback(progress)
+        else:
+            logging.getLogger().info("Completed {} of {} ({:.1f}/s, {} s remaining)".format(
+                self.completed, self.total, rate, "?" if progress["eta"] is None else int(progress["eta"])))
+        return progress
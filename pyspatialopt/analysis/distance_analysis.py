@@ -0,0 +1,113 @@
+# -*- coding: UTF-8 -*-
+import logging
+import numbers
+
+from pyspatialopt import version
+
+# The mean radius of the earth in meters, used when distances are calculated from longitude/latitude
+EARTH_RADIUS = 6371008.8
+
+
+def _get_cartesian(points, geographic, earth_radius):
+    """
+    :param points: (list) The (x, y) coordinates, (longitude, latitude) in degrees if geographic
+    :param geographic: (bool) Are the coordinates longitude/latitude
+    :param earth_radius: (float) The radius of the earth in the units of the distances
+    :return: (numpy array) The points as 2D coordinates, or 3D coordinates on the sphere if geographic
+    """
+    import numpy
+
+    points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 2)
+    if not geographic:
+        return points
+    longitude, latitude = numpy.radians(points).T
+    return earth_radius * numpy.column_stack([numpy.cos(latitude) * numpy.cos(longitude),
+                                              numpy.cos(latitude) * numpy.sin(longitude),
+                                              numpy.sin(latitude)])
+
+
+def get_pairs_within(dl_points, fl_points, max_distance, geographic=False, earth_radius=EARTH_RADIUS):
+    """
+    Finds every facility and demand point that are within a distance of each other with KD-trees. Geographic
+    distances are great circle (haversine) distances: the points are placed on a sphere so the tree searches the
+    chord that corresponds to the distance
+    :param dl_points: (list) The (x, y) coordinates of the demand points
+    :param fl_points: (list) The (x, y) coordinates of the facilities
+    :param max_distance: (float) The maximum distance
+    :param geographic: (bool) Are the coordinates (longitude, latitude) in degrees
+    :param earth_radius: (float) The radius of the earth in the units of max_distance (meters by default)
+    :return: (tuple) The facility indexes, demand indexes and distances of the pairs (numpy arrays)
+    """
+    import numpy
+    import scipy.spatial
+
+    dl_tree = scipy.spatial.cKDTree(_get_cartesian(dl_points, geographic, earth_radius))
+    fl_tree = scipy.spatial.cKDTree(_get_cartesian(fl_points, geographic, earth_radius))
+    if geographic:
+        # Chords are shorter than arcs, distances past half way round the earth are all within the diameter
+        chord = 2 * earth_radius * numpy.sin(min(max_distance / (2.0 * earth_radius), numpy.pi / 2))
+        pairs = fl_tree.sparse_distance_matrix(dl_tree, chord, output_type="ndarray")
+        distances = 2 * earth_radius * numpy.arcsin(numpy.minimum(pairs["v"] / (2.0 * earth_radius), 1.0))
+    else:
+        pairs = fl_tree.sparse_distance_matrix(dl_tree, max_distance, output_type="ndarray")
+        distances = pairs["v"]
+    return pairs["i"], pairs["j"], distances
+
+
+def generate_radius_coverage(dl_ids, dl_demand, dl_points, fl_ids, fl_points, radius, fl_variable_name="facility",
+                             geographic=False, earth_radius=EARTH_RADIUS):
+    """
+    Generates a dictionary representing the binary coverage of facilities to demand points within a straight line
+    (Euclidean or great circle) distance, without building service area polygons. Several radii can be given, the
+    trees are built and searched once for the largest
+    :param dl_ids: (list) The demand ids
+    :param dl_demand: (list) The demand of each demand point
+    :param dl_points: (list) The (x, y) coordinates of each demand point
+    :param fl_ids: (list) The facility ids
+    :param fl_points: (list) The (x, y) coordinates of each facility
+    :param radius: (float or list) The service radius, or a list of radii
+    :param fl_variable_name: (string) The name to use to represent the facility variable
+    :param geographic: (bool) Are the coordinates (longitude, latitude) in degrees
+    :param earth_radius: (float) The radius of the earth in the units of the radius (meters by default)
+    :return: (dictionary or list) A nested dictionary storing the coverage relationships (one for each radius if a
+        list of radii was given)
+    """
+    dl_ids = [str(demand_id) for demand_id in dl_ids]
+    fl_ids = [str(facility_id) for facility_id in fl_ids]
+    radii = [radius] if isinstance(radius, numbers.Number) else list(radius)
+    logging.getLogger().info("Finding pairs within {}...".format(max(radii)))
+    fl_indexes, dl_indexes, distances = get_pairs_within(dl_points, fl_points, max(radii), geographic, earth_radius)
+    fl_indexes = fl_indexes.tolist()
+    dl_indexes = dl_indexes.tolist()
+    distances = distances.tolist()
+    outputs = []
+    for current_radius in radii:
+        output = {
+            "version": version.__version__,
+            "type": {
+                "mode": "coverage",
+                "type": "binary",
+            },
+            "demand": {},
+            "totalDemand": 0.0,
+            "totalServiceableDemand": 0.0,
+            "facilities": {fl_variable_name: list(fl_ids)}
+        }
+        for demand_id, demand in zip(dl_ids, dl_demand):
+            output["demand"][demand_id] = {
+                "area": 0,
+                "demand": round(demand),
+                "serviceableDemand": 0.0,
+                "coverage": {fl_variable_name: {}}
+            }
+        for facility_index, demand_index, distance in zip(fl_indexes, dl_indexes, distances):
+            if distance <= current_radius:
+                demand_obj = output["demand"][dl_ids[demand_index]]
+                demand_obj["coverage"][fl_variable_name][fl_ids[facility_index]] = 1
+                demand_obj["serviceableDemand"] = demand_obj["demand"]
+        for demand_obj in output["demand"].values():
+            output["totalServiceableDemand"] += demand_obj["serviceableDemand"]
+            output["totalDemand"] += demand_obj["demand"]
+        outputs.append(output)
+    logging.getLogger().info("Binary coverage successfully generated.")
+    return outputs[0] if isinstance(radius, numbers.Number) else outputs
@@ -0,0 +1,362 @@
+# -*- coding: UTF-8 -*-
+import heapq
+import logging
+
+# The maximum number of times a polygon is split in half when it is subdivided
+MAX_SUBDIVISION_DEPTH = 16
+
+# How a demand area relates to a service area (see classify_bounds)
+DISJOINT = "disjoint"
+INSIDE = "inside"
+BOUNDARY = "boundary"
+
+
+def _open_ring(ring):
+    # Rings may repeat the first vertex at the end (shapefiles, GeoJSON), the functions here work on open rings
+    ring = [tuple(point) for point in ring]
+    if len(ring) > 1 and ring[0] == ring[-1]:
+        ring = ring[:-1]
+    return ring
+
+
+def _get_triangle_area(point1, point2, point3):
+    return abs((point2[0] - point1[0]) * (point3[1] - point1[1]) - (point3[0] - point1[0]) * (point2[1] - point1[1])) / 2.0
+
+
+def get_ring_area(ring):
+    """
+    :param ring: (list) The (x, y) vertices of the ring
+    :return: (float) The signed area of the ring (positive if counter clockwise)
+    """
+    ring = _open_ring(ring)
+    area = 0.0
+    for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+        area += x1 * y2 - x2 * y1
+    return area / 2.0
+
+
+def simplify_ring(ring, area_tolerance):
+    """
+    Simplifies a ring by removing the vertices that change its area the least (Visvalingam-Whyatt). Removing a
+    vertex changes the ring by the triangle it forms with its neighbours, vertices are removed until the triangles
+    removed would add up to more than the tolerance, so the area of the difference between the rings is at most the
+    tolerance. At least 3 vertices are kept
+    :param ring: (list) The (x, y) vertices of the ring
+    :param area_tolerance: (float) The maximum area of the difference between the original and simplified ring
+    :return: (list) The simplified ring (open)
+    """
+    ring = _open_ring(ring)
+    count = len(ring)
+    if count <= 3:
+        return ring
+    previous = [(i - 1) % count for i in range(count)]
+    following = [(i + 1) % count for i in range(count)]
+    areas = [_get_triangle_area(ring[previous[i]], ring[i], ring[following[i]]) for i in range(count)]
+    heap = [(area, i) for i, area in enumerate(areas)]
+    heapq.heapify(heap)
+    removed = [False] * count
+    remaining = count
+    used = 0.0
+    while heap and remaining > 3:
+        area, i = heapq.heappop(heap)
+        # Skip entries for removed vertices or areas that have since been recalculated
+        if removed[i] or area != areas[i]:
+            continue
+        if used + area > area_tolerance:
+            break
+        used += area
+        removed[i] = True
+        remaining -= 1
+        following[previous[i]] = following[i]
+        previous[following[i]] = previous[i]
+        for j in [previous[i], following[i]]:
+            areas[j] = _get_triangle_area(ring[previous[j]], ring[j], ring[following[j]])
+            heapq.heappush(heap, (areas[j], j))
+    return [point for point, is_removed in zip(ring, removed) if not is_removed]
+
+
+def snap_ring(ring, precision):
+    """
+    Snaps the vertices of a ring to a grid, removing the vertices that collapse onto their neighbour
+    :param ring: (list) The (x, y) vertices of the ring
+    :param precision: (float) The grid spacing
+    :return: (list) The snapped ring (open), empty if it collapsed to fewer than 3 vertices
+    """
+    snapped = []
+    for x, y in _open_ring(ring):
+        point = (round(x / precision) * precision, round(y / precision) * precision)
+        if not snapped or point != snapped[-1]:
+            snapped.append(point)
+    if len(snapped) > 1 and snapped[0] == snapped[-1]:
+        snapped.pop()
+    return snapped if len(snapped) >= 3 else []
+
+
+def _clip_half_plane(ring, inside, intersect, axis):
+    # Clips a ring to one side of a line. The pieces of the ring inside are chains from where it enters to where it
+    # leaves the line, along the line the ring is inside between every other crossing so each chain is joined to the
+    # one that starts at the other end of that stretch. A concave ring may become several rings
+    start = next((i for i, point in enumerate(ring) if not inside(point)), None)
+    if start is None:
+        return [ring]
+    ring = ring[start:] + ring[:start]
+    chains = []
+    for previous, point in zip(ring, ring[1:] + ring[:1]):
+        if inside(point):
+            if not inside(previous):
+                chains.append([intersect(previous, point)])
+            chains[-1].append(point)
+        elif inside(previous):
+            chains[-1].append(intersect(previous, point))
+    # A ring that only touches the line (vertices on the line, the ring outside on both sides) doesn't cross it
+    chains = [chain for chain in chains if any(point[1 - axis] != chain[0][1 - axis] for point in chain)]
+    if not chains:
+        return []
+    # (position along the line, is it the end of the chain, chain)
+    crossings = sorted([(chain[0][axis], False, c) for c, chain in enumerate(chains)] +
+                       [(chain[-1][axis], True, c) for c, chain in enumerate(chains)])
+    following = {}
+    for (_, is_end1, c1), (_, is_end2, c2) in zip(crossings[0::2], crossings[1::2]):
+        if is_end1 and not is_end2:
+            following[c1] = c2
+        elif is_end2 and not is_end1:
+            following[c2] = c1
+    rings = []
+    used = set()
+    for c in range(len(chains)):
+        clipped = []
+        while c not in used:
+            used.add(c)
+            clipped.extend(chains[c])
+            c = following.get(c, c)
+        if clipped:
+            rings.append(clipped)
+    return rings
+
+
+def clip_ring(ring, bounds):
+    """
+    Clips a ring to a rectangle (Sutherland-Hodgman, one edge of the rectangle at a time). A concave ring clipped into
+    several pieces becomes several rings
+    :param ring: (list) The (x, y) vertices of the ring
+    :param bounds: (tuple) The rectangle (xmin, ymin, xmax, ymax)
+    :return: (list) The clipped rings (open), empty if the ring is outside of the rectangle
+    """
+    xmin, ymin, xmax, ymax = bounds
+    # Each edge of the rectangle as (is the point inside, the intersection of a segment with the edge, the axis
+    # along the edge)
+    edges = [
+        (lambda p: p[0] >= xmin, lambda p, q: (xmin, p[1] + (q[1] - p[1]) * (xmin - p[0]) / (q[0] - p[0])), 1),
+        (lambda p: p[0] <= xmax, lambda p, q: (xmax, p[1] + (q[1] - p[1]) * (xmax - p[0]) / (q[0] - p[0])), 1),
+        (lambda p: p[1] >= ymin, lambda p, q: (p[0] + (q[0] - p[0]) * (ymin - p[1]) / (q[1] - p[1]), ymin), 0),
+        (lambda p: p[1] <= ymax, lambda p, q: (p[0] + (q[0] - p[0]) * (ymax - p[1]) / (q[1] - p[1]), ymax), 0)
+    ]
+    rings = [_open_ring(ring)]
+    for inside, intersect, axis in edges:
+        rings = [clipped for ring in rings for clipped in _clip_half_plane(ring, inside, intersect, axis)]
+    clipped_rings = []
+    for ring in rings:
+        # A vertex on the edge of the rectangle is repeated where the ring leaves from it
+        ring = [point for i, point in enumerate(ring) if point != ring[i - 1]]
+        if len(ring) >= 3:
+            clipped_rings.append(ring)
+    return clipped_rings
+
+
+def get_tiles(rings, max_vertices):
+    """
+    Splits the extent of a polygon in half (at the median vertex, along the longer side) until no tile contains
+    more than max_vertices vertices
+    :param rings: (list) The rings of the polygon, each a list of (x, y) tuples
+    :param max_vertices: (int) The maximum number of vertices in a tile
+    :return: (list) The tiles (xmin, ymin, xmax, ymax)
+    """
+    points = [point for ring in rings for point in _open_ring(ring)]
+    xs = [point[0] for point in points]
+    ys = [point[1] for point in points]
+    tiles = []
+    stack = [((min(xs), min(ys), max(xs), max(ys)), points, 0)]
+    while stack:
+        bounds, points, depth = stack.pop()
+        if len(points) <= max_vertices or depth >= MAX_SUBDIVISION_DEPTH:
+            tiles.append(bounds)
+            continue
+        xmin, ymin, xmax, ymax = bounds
+        axis = 0 if xmax - xmin >= ymax - ymin else 1
+        values = sorted(point[axis] for point in points)
+        split = values[len(values) // 2]
+        if split <= bounds[axis] or split >= bounds[axis + 2]:
+            split = (bounds[axis] + bounds[axis + 2]) / 2.0
+        low = list(bounds)
+        high = list(bounds)
+        low[axis + 2] = split
+        high[axis] = split
+        stack.append((tuple(high), [point for point in points if point[axis] >= split], depth + 1))
+        stack.append((tuple(low), [point for point in points if point[axis] < split], depth + 1))
+    return tiles
+
+
+def get_polygon_parts(rings):
+    """
+    Groups the rings of a polygon into parts (an exterior ring followed by its holes), holes are the rings oriented
+    opposite to the largest ring. A hole belongs to the smallest exterior ring that contains it (an island in a lake
+    can have its own holes)
+    :param rings: (list) The rings of the polygon, each a list of (x, y) tuples
+    :return: (list) The parts, each a list of rings with the exterior ring first
+    """
+    areas = [get_ring_area(ring) for ring in rings]
+    if not rings:
+        return []
+    sign = 1 if max(areas, key=abs) > 0 else -1
+    parts = [[ring] for ring, area in zip(rings, areas) if area * sign > 0]
+    part_areas = [abs(area) for area in areas if area * sign > 0]
+    for ring, area in zip(rings, areas):
+        if area * sign < 0:
+            containing = [i for i, part in enumerate(parts) if _contains_ring(part[0], ring)]
+            if containing:
+                parts[min(containing, key=lambda i: part_areas[i])].append(ring)
+    return parts
+
+
+def _contains(ring, point):
+    # Even-odd point in ring test
+    inside = False
+    ring = _open_ring(ring)
+    x, y = point
+    for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+        if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+    return inside
+
+
+def _on_boundary(ring, point):
+    x, y = point
+    for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+        if (min(x1, x2) <= x <= max(x1, x2) and min(y1, y2) <= y <= max(y1, y2) and
+                (x2 - x1) * (y - y1) == (y2 - y1) * (x - x1)):
+            return True
+    return False
+
+
+def _contains_ring(exterior, ring):
+    # A ring is inside an exterior ring if its vertices are, vertices on the boundary (holes clipped along the same
+    # edge as the exterior) are skipped
+    exterior = _open_ring(exterior)
+    for point in _open_ring(ring):
+        if not _on_boundary(exterior, point):
+            return _contains(exterior, point)
+    return True
+
+
+def preprocess_polygons(ids, polygons, area_tolerance=None, precision=None, max_vertices=None):
+    """
+    Prepares (service area) polygons for overlay: simplifies the rings within an area tolerance, snaps them to a
+    precision grid and subdivides polygons with more than max_vertices vertices into tiles. A polygon can become
+    several pieces, each piece keeps the id of its polygon
+    :param ids: (list) The id of each polygon
+    :param polygons: (list) The rings of each polygon, each ring is a list of (x, y) tuples
+    :param area_tolerance: (float) The maximum area change of each ring when simplifying (not simplified if None)
+    :param precision: (float) The spacing of the grid to snap to (not snapped if None)
+    :param max_vertices: (int) The maximum number of vertices of a piece (not subdivided if None)
+    :return: (tuple) The id and the rings of each piece
+    """
+    piece_ids = []
+    pieces = []
+    vertices = 0
+    for polygon_id, rings in zip(ids, polygons):
+        rings = [_open_ring(ring) for ring in rings]
+        vertices += sum(len(ring) for ring in rings)
+        if area_tolerance is not None:
+            rings = [simplify_ring(ring, area_tolerance) for ring in rings]
+        if precision is not None:
+            rings = [snap_ring(ring, precision) for ring in rings]
+        rings = [ring for ring in rings if len(ring) >= 3]
+        if not rings:
+            continue
+        if max_vertices is None or sum(len(ring) for ring in rings) <= max_vertices:
+            piece_ids.append(polygon_id)
+            pieces.append(rings)
+            continue
+        for tile in get_tiles(rings, max_vertices):
+            clipped = [clipped for ring in rings for clipped in clip_ring(ring, tile)]
+            clipped = [ring for ring in clipped if get_ring_area(ring) != 0]
+            if clipped:
+                piece_ids.append(polygon_id)
+                pieces.append(clipped)
+    logging.getLogger().info("Preprocessed {} polygons ({} vertices) into {} pieces ({} vertices)".format(
+        len(polygons), vertices, len(pieces), sum(len(ring) for rings in pieces for ring in rings)))
+    return piece_ids, pieces
+
+
+def classify_bounds(bounds, container_bounds):
+    """
+    Classifies a pair of geometries from their envelopes before any (slow) geometry operation. Geometries with
+    envelopes that don't overlap are disjoint, a geometry can only be inside another if its envelope is inside the
+    envelope of the other, the rest may cross the boundary
+    :param bounds: (tuple) The envelope (xmin, ymin, xmax, ymax) of the geometry (demand area)
+    :param container_bounds: (tuple) The envelope of the possible container (service area)
+    :return: (string) DISJOINT, INSIDE (if the geometry may be inside, to be confirmed with a contains predicate) or
+        BOUNDARY
+    """
+    xmin, ymin, xmax, ymax = bounds
+    container_xmin, container_ymin, container_xmax, container_ymax = container_bounds
+    if xmax < container_xmin or xmin > container_xmax or ymax < container_ymin or ymin > container_ymax:
+        return DISJOINT
+    if xmin >= container_xmin and xmax <= container_xmax and ymin >= container_ymin and ymax <= container_ymax:
+        return INSIDE
+    return BOUNDARY
+
+
+class SliverFilter(object):
+    """
+    Drops the negligible coverage of a demand area by a service area that only grazes it (a sliver) when partial
+    coverage is generated, so it doesn't become a nonzero in the models. A pair is a sliver if it is below any of the
+    thresholds that are set. The number of slivers and the total demand they would have covered are recorded
+    """
+
+    def __init__(self, min_area=None, min_share=None, min_demand=None):
+        """
+        :param min_area: (float) The minimum covered area, in the units of the layers
+        :param min_share: (float) The minimum share (0 - 1) of the demand area that is covered
+        :param min_demand: (float) The minimum covered demand
+        """
+        self.min_area = min_area
+        self.min_share = min_share
+        self.min_demand = min_demand
+        self.slivers = 0
+        self.discarded_demand = 0.0
+
+    def is_active(self):
+        return self.min_area is not None or self.min_share is not None or self.min_demand is not None
+
+    def is_sliver(self, covered_area, demand_area, covered_demand):
+        """
+        :param covered_area: (float) The area of the demand area covered by the service area
+        :param demand_area: (float) The area of the demand area
+        :param covered_demand: (float) The demand covered by the service area
+        :return: (bool) Is the coverage a sliver (recorded if it is)
+        """
+        sliver = ((self.min_area is not None and covered_area < self.min_area) or
+                  (self.min_share is not None and demand_area > 0 and covered_area < self.min_share * demand_area) or
+                  (self.min_demand is not None and covered_demand < self.min_demand))
+        if sliver:
+            self.slivers += 1
+            self.discarded_demand += covered_demand
+        return sliver
+
+    def add(self, slivers, discarded_demand):
+        """
+        Records slivers dropped earlier (by a run that was resumed from a checkpoint)
+        :param slivers: (int) The number of slivers
+        :param discarded_demand: (float) The demand they would have covered
+        :return:
+        """
+        self.slivers += slivers
+        self.discarded_demand += discarded_demand
+
+    def get_report(self):
+        """
+        :return: (dictionary) The thresholds, the number of slivers and the total demand discarded
+        """
+        return {"minArea": self.min_area, "minShare": self.min_share, "minDemand": self.min_demand,
+                "slivers": self.slivers, "discardedDemand": self.discarded_demand}
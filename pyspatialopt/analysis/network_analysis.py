@@ -0,0 +1,205 @@
+# -*- coding: UTF-8 -*-
+import concurrent.futures
+import csv
+import logging
+
+from pyspatialopt import version
+
+# The maximum number of (facility, node) distances held in memory for a batch of facilities
+MAX_BATCH_DISTANCES = 10000000
+
+
+class RoadNetwork(object):
+    """
+    A road network held as a scipy.sparse.csgraph graph (CSR matrix of edge lengths) with the coordinates of its
+    nodes, so demand and facility points can be snapped to the nearest node and network distances computed in memory
+    """
+
+    def __init__(self, node_ids, node_points, edges, directed=False):
+        """
+        :param node_ids: (list) The ids of the nodes
+        :param node_points: (list) The (x, y) coordinates of each node
+        :param edges: (list) The (from node id, to node id, length) of each edge
+        :param directed: (bool) Are the edges one way (from -> to)
+        """
+        import numpy
+        import scipy.sparse
+
+        self.node_ids = [str(node_id) for node_id in node_ids]
+        self.node_index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        self.node_points = numpy.asarray(node_points, dtype=numpy.float64).reshape(-1, 2)
+        self.directed = directed
+        lengths = {}
+        for from_node, to_node, length in edges:
+            from_node, to_node = str(from_node), str(to_node)
+            if from_node not in self.node_index or to_node not in self.node_index:
+                raise ValueError("Edge ({}, {}) references an unknown node".format(from_node, to_node))
+            key = (self.node_index[from_node], self.node_index[to_node])
+            # Parallel edges keep the shortest length
+            lengths[key] = min(float(length), lengths.get(key, float("inf")))
+        size = len(self.node_ids)
+        rows = [key[0] for key in lengths]
+        columns = [key[1] for key in lengths]
+        self.graph = scipy.sparse.csr_matrix((list(lengths.values()), (rows, columns)), shape=(size, size))
+        self._tree = None
+
+    def snap(self, points):
+        """
+        Finds the nearest node to each point
+        :param points: (list) The (x, y) coordinates of the points
+        :return: (tuple) The node index and the straight line distance to the node of each point (numpy arrays)
+        """
+        import numpy
+        import scipy.spatial
+
+        if self._tree is None:
+            self._tree = scipy.spatial.cKDTree(self.node_points)
+        distances, nodes = self._tree.query(numpy.asarray(points, dtype=numpy.float64).reshape(-1, 2))
+        return nodes, distances
+
+    def get_distances(self, sources, limit):
+        """
+        Runs Dijkstra from each source node, stopping at the limit
+        :param sources: (list) The indexes of the source nodes
+        :param limit: (float) The maximum distance to search
+        :return: (numpy array) The distance from each source (row) to every node (column), inf beyond the limit
+        """
+        import scipy.sparse.csgraph
+
+        return scipy.sparse.csgraph.dijkstra(self.graph, directed=self.directed, indices=sources, limit=limit)
+
+
+def read_road_network(edges_file, nodes_file, from_field="from_node", to_field="to_node", length_field="length",
+                      node_id_field="node_id", x_field="x", y_field="y", directed=False):
+    """
+    Reads a road network from csv files of edges and nodes
+    :param edges_file: (string) The path to the edge csv (one row per road segment)
+    :param nodes_file: (string) The path to the node csv (one row per intersection/end point)
+    :param from_field: (string) The name of the field of the edge start node id
+    :param to_field: (string) The name of the field of the edge end node id
+    :param length_field: (string) The name of the field of the edge length (or travel time)
+    :param node_id_field: (string) The name of the node id field
+    :param x_field: (string) The name of the node x coordinate field
+    :param y_field: (string) The name of the node y coordinate field
+    :param directed: (bool) Are the edges one way (from -> to)
+    :return: (RoadNetwork) The network
+    """
+    with open(nodes_file) as csvfile:
+        reader = csv.DictReader(csvfile, skipinitialspace=True)
+        for field in [node_id_field, x_field, y_field]:
+            if field not in reader.fieldnames:
+                raise ValueError("'{}' field not found in node csv".format(field))
+        node_ids = []
+        node_points = []
+        for row in reader:
+            node_ids.append(row[node_id_field])
+            node_points.append((float(row[x_field]), float(row[y_field])))
+    with open(edges_file) as csvfile:
+        reader = csv.DictReader(csvfile, skipinitialspace=True)
+        for field in [from_field, to_field, length_field]:
+            if field not in reader.fieldnames:
+                raise ValueError("'{}' field not found in edge csv".format(field))
+        edges = [(row[from_field], row[to_field], row[length_field]) for row in reader]
+    logging.getLogger().info("Read road network with {} nodes and {} edges".format(len(node_ids), len(edges)))
+    return RoadNetwork(node_ids, node_points, edges, directed)
+
+
+def _get_covered(network, dl_nodes, dl_snap, fl_nodes, fl_limits):
+    """
+    :return: (list) The indexes of the demand within the limit of each facility
+    """
+    import numpy
+
+    distances = network.get_distances(fl_nodes, max(fl_limits)).reshape(len(fl_nodes), -1)
+    return [numpy.flatnonzero(row[dl_nodes] + dl_snap <= limit).tolist() for row, limit in zip(distances, fl_limits)]
+
+
+# The network and demand of a worker process, set once by _init_worker
+_worker_args = None
+
+
+def _init_worker(network, dl_nodes, dl_snap):
+    global _worker_args
+    _worker_args = (network, dl_nodes, dl_snap)
+
+
+def _get_covered_worker(args):
+    return _get_covered(*(_worker_args + args))
+
+
+def generate_binary_coverage(network, dl_ids, dl_demand, dl_points, fl_ids, fl_points, dist_threshold,
+                             fl_variable_name="facility", include_snap_distance=True, batch_size=None, processes=1):
+    """
+    Generates a dictionary representing the binary coverage of facilities to demand points along a road network.
+    Points are snapped to the nearest node and a Dijkstra search limited to the distance threshold is run from
+    each facility in batches, so the full origin-destination matrix is never built
+    :param network: (RoadNetwork) The road network
+    :param dl_ids: (list) The demand ids
+    :param dl_demand: (list) The demand of each demand point
+    :param dl_points: (list) The (x, y) coordinates of each demand point
+    :param fl_ids: (list) The facility ids
+    :param fl_points: (list) The (x, y) coordinates of each facility
+    :param dist_threshold: (numeric) The maximum network distance for a facility to cover a demand point
+    :param fl_variable_name: (string) The name to use to represent the facility variable
+    :param include_snap_distance: (bool) Should the straight line distances to the snapped nodes count towards the
+        threshold
+    :param batch_size: (int) The number of facilities to search from at once (defaults to as many as keep the
+        distances of a batch under MAX_BATCH_DISTANCES)
+    :param processes: (int) The number of processes to run the batches in (None uses all cpus, 1 runs them serially)
+    :return: (dictionary) A nested dictionary storing the coverage relationships
+    """
+    import numpy
+
+    dl_ids = [str(demand_id) for demand_id in dl_ids]
+    fl_ids = [str(facility_id) for facility_id in fl_ids]
+    output = {
+        "version": version.__version__,
+        "type": {
+            "mode": "coverage",
+            "type": "binary",
+        },
+        "demand": {},
+        "totalDemand": 0.0,
+        "totalServiceableDemand": 0.0,
+        "facilities": {fl_variable_name: list(fl_ids)}
+    }
+    for demand_id, demand in zip(dl_ids, dl_demand):
+        output["demand"][demand_id] = {
+            "area": 0,
+            "demand": round(demand),
+            "serviceableDemand": 0.0,
+            "coverage": {fl_variable_name: {}}
+        }
+    logging.getLogger().info("Snapping demand and facilities to the network...")
+    dl_nodes, dl_snap = network.snap(dl_points)
+    fl_nodes, fl_snap = network.snap(fl_points)
+    if not include_snap_distance:
+        dl_snap = numpy.zeros(len(dl_nodes))
+        fl_snap = numpy.zeros(len(fl_nodes))
+    # The network distance each facility can reach once its snapping distance is accounted for
+    fl_limits = dist_threshold - fl_snap
+    if batch_size is None:
+        batch_size = max(1, min(64, MAX_BATCH_DISTANCES // max(1, len(network.node_ids))))
+    batches = [(fl_nodes[start:start + batch_size], fl_limits[start:start + batch_size])
+               for start in range(0, len(fl_ids), batch_size)]
+    logging.getLogger().info("Determining binary coverage for {} facilities in {} batches...".format(len(fl_ids),
+                                                                                                  len(batches)))
+    if processes == 1 or len(batches) < 2:
+        covered = [_get_covered(network, dl_nodes, dl_snap, *batch) for batch in batches]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(processes, initializer=_init_worker,
+                                                    initargs=(network, dl_nodes, dl_snap)) as executor:
+            covered = list(executor.map(_get_covered_worker, batches))
+    facility_ids = iter(fl_ids)
+    for batch in covered:
+        for demand_indexes in batch:
+            facility_id = next(facility_ids)
+            for i in demand_indexes:
+                demand_obj = output["demand"][dl_ids[i]]
+                demand_obj["coverage"][fl_variable_name][facility_id] = 1
+                demand_obj["serviceableDemand"] = demand_obj["demand"]
+    for demand_obj in output["demand"].values():
+        output["totalServiceableDemand"] += demand_obj["serviceableDemand"]
+        output["totalDemand"] += demand_obj["demand"]
+    logging.getLogger().info("Binary coverage successfully generated.")
+    return output
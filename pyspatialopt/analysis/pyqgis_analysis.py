@@ -1,11 +1,11 @@
 # -*- coding: UTF-8 -*-
+import collections
 import logging
 import math
 import os
-import qgis
-import qgis.core
-import qgis.utils
+
 from pyspatialopt import version
+from pyspatialopt.analysis import checkpointing, distance_analysis, geometry_processing, raster_analysis
 
 
 def generate_query(unique_ids, unique_field_name, wrap_values_in_quotes=False):
@@ -15,6 +15,7 @@ def generate_query(unique_ids, unique_field_name, wrap_values_in_quotes=False):
     :param unique_field_name: (string) The name of field that the ids correspond to
     :param wrap_values_in_quotes: (bool) Should the ids be wrapped in quotes (if unique_field_name is string)
     :return: (string) A query string that can be applied to a layer
+    For large selections use write_selected_facilities instead, long queries are slow to evaluate
     """
     if unique_ids:
         if wrap_values_in_quotes:
@@ -48,6 +49,8 @@ def generate_serviceable_demand(dl, dl_demand_field, dl_id_field, *args):
     :param args: (Feature Layer) The facility layers to use
     :return: (dictionary) A dictionary of similar format to the coverage format
     """
+    import qgis.utils
+
     # Reset DF
     # Check parameters so we get useful exceptions and messages
     reset_layers(dl)
@@ -126,6 +129,8 @@ def generate_binary_coverage(dl, fl, dl_demand_field, dl_id_field, fl_id_field,
     :param fl_variable_name: (string) The name to use to represent the facility variable
     :return: (dictionary) A nested dictionary storing the coverage relationships
     """
+    import qgis.utils
+
     # Check parameters so we get useful exceptions and messages
     if dl.wkbType() not in [qgis.utils.QGis.WKBPoint, qgis.utils.QGis.WKBPolygon]:
         raise TypeError("Demand layer must have polygon or point geometry")
@@ -154,10 +159,10 @@ def generate_binary_coverage(dl, fl, dl_demand_field, dl_id_field, fl_id_field,
         "totalServiceableDemand": 0.0,
         "facilities": {fl_variable_name: []}
     }
-    # List all of the facilities
+    # List all of the facilities (once, service areas can be subdivided into pieces)
     logging.getLogger().info("Initializing facilities in output...")
-    for feature in fl.getFeatures():
-        output["facilities"][fl_variable_name].append(str(feature[fl_id_field]))
+    output["facilities"][fl_variable_name] = list(collections.OrderedDict.fromkeys(
+        str(feature[fl_id_field]) for feature in fl.getFeatures()))
     # Build empty data structure
     logging.getLogger().info("Initializing demand in output...")
     for feature in dl.getFeatures():
@@ -195,17 +200,193 @@ def generate_binary_coverage(dl, fl, dl_demand_field, dl_id_field, fl_id_field,
     return output
 
 
-def generate_partial_coverage(dl, fl, dl_demand_field, dl_id_field, fl_id_field, fl_variable_name=None):
+def generate_radius_coverage(dl, fl, dl_demand_field, radius, dl_id_field="FID", fl_id_field="FID",
+                             fl_variable_name=None, geographic=False):
+    """
+    Generates a dictionary representing the binary coverage of facility points to demand within a straight line
+    distance, without buffering the facilities (see distance_analysis.generate_radius_coverage)
+    :param dl: (Feature Layer) The demand point or polygon (centroid is used) layer
+    :param fl: (Feature Layer) The facility point layer
+    :param dl_demand_field: (string) The name of the field in the demand layer that describes the demand
+    :param radius: (float or list) The service radius in the units of the layers (meters if geographic), or a list
+    :param dl_id_field: (string) The name of the unique identifying field on the demand layer
+    :param fl_id_field: (string) The name of the unique identifying field on the facility layer
+    :param fl_variable_name: (string) The name to use to represent the facility variable
+    :param geographic: (bool) Are the layers in a geographic coordinate system (great circle distances are used)
+    :return: (dictionary or list) A nested dictionary storing the coverage relationships (one for each radius if a
+        list of radii was given)
+    """
+    import qgis.utils
+
+    # Check parameters so we get useful exceptions and messages
+    if dl.wkbType() not in [qgis.utils.QGis.WKBPolygon, qgis.utils.QGis.WKBPoint]:
+        raise TypeError("Demand layer must have polygon or point geometry")
+    if fl.wkbType() != qgis.utils.QGis.WKBPoint:
+        raise TypeError("Facility layer must have point geometry")
+    dl_field_names = [field.name() for field in dl.pendingFields()]
+    if dl_demand_field not in dl_field_names:
+        raise ValueError("'{}' field not found in demand layer".format(dl_demand_field))
+    if dl_id_field not in dl_field_names:
+        raise ValueError("'{}' field not found in demand layer".format(dl_id_field))
+    if fl_id_field not in [field.name() for field in fl.pendingFields()]:
+        raise ValueError("'{}' field not found in facility layer".format(fl_id_field))
+    reset_layers(dl, fl)
+    if fl_variable_name is None:
+        fl_variable_name = os.path.basename(os.path.abspath(fl.dataProvider().dataSourceUri())).split(".")[0]
+    dl_features = list(dl.getFeatures())
+    fl_features = list(fl.getFeatures())
+    dl_points = [feature.geometry().centroid().asPoint() for feature in dl_features]
+    fl_points = [feature.geometry().asPoint() for feature in fl_features]
+    output = distance_analysis.generate_radius_coverage(
+        [str(feature[dl_id_field]) for feature in dl_features], [feature[dl_demand_field] for feature in dl_features],
+        [(point.x(), point.y()) for point in dl_points], [str(feature[fl_id_field]) for feature in fl_features],
+        [(point.x(), point.y()) for point in fl_points], radius, fl_variable_name, geographic)
+    reset_layers(dl, fl)
+    return output
+
+
+def _get_rings(geometry):
+    """
+    :param geometry: (QgsGeometry) The polygon geometry
+    :return: (list) The rings of all parts of the polygon, each a list of (x, y) tuples
+    """
+    polygons = geometry.asMultiPolygon() if geometry.isMultipart() else [geometry.asPolygon()]
+    return [[(point.x(), point.y()) for point in ring] for polygon in polygons for ring in polygon if ring]
+
+
+def _get_bounds(geometry):
+    rectangle = geometry.boundingBox()
+    return rectangle.xMinimum(), rectangle.yMinimum(), rectangle.xMaximum(), rectangle.yMaximum()
+
+
+def _prepare(geometry):
+    """
+    :param geometry: (QgsGeometry) The geometry
+    :return: (QgsGeometryEngine) A prepared geometry engine, so predicates against it are evaluated with an index
+    """
+    import qgis.core
+
+    engine = qgis.core.QgsGeometry.createGeometryEngine(geometry.geometry())
+    engine.prepareGeometry()
+    return engine
+
+
+def _get_covered_part(geometry, bounds, service_area, service_area_bounds, service_area_engine, relations):
+    """
+    Classifies a demand area against a service area with the envelopes and then the prepared contains/intersects
+    predicates, only the pairs that cross the boundary of the service area are intersected
+    :param geometry: (QgsGeometry) The demand area
+    :param bounds: (tuple) The envelope of the demand area (see _get_bounds)
+    :param service_area: (QgsGeometry) The service area
+    :param service_area_bounds: (tuple) The envelope of the service area
+    :param service_area_engine: (QgsGeometryEngine) The prepared service area (see _prepare)
+    :param relations: (Counter) The number of pairs of each relation (updated)
+    :return: (QgsGeometry) The part of the demand area that is in the service area (the demand area if it is inside,
+        None if it is disjoint)
+    """
+    relation = geometry_processing.classify_bounds(bounds, service_area_bounds)
+    if relation == geometry_processing.INSIDE and not service_area_engine.contains(geometry.geometry()):
+        relation = geometry_processing.BOUNDARY
+    if relation == geometry_processing.BOUNDARY and not service_area_engine.intersects(geometry.geometry()):
+        relation = geometry_processing.DISJOINT
+    relations[relation] += 1
+    if relation == geometry_processing.DISJOINT:
+        return None
+    if relation == geometry_processing.INSIDE:
+        return geometry
+    return service_area.intersection(geometry)
+
+
+def _get_union_area(geometry, parts):
+    """
+    :param geometry: (QgsGeometry) The demand area
+    :param parts: (list) The parts of the demand area in each service area (see _get_covered_part)
+    :return: (float) The area of the demand area that is in any of the service areas
+    """
+    if not parts:
+        return 0.0
+    if any(part is geometry for part in parts):
+        return geometry.area()
+    union = parts[0]
+    for part in parts[1:]:
+        union = union.combine(part)
+    return union.area()
+
+
+def preprocess_polygons(layer, id_field, area_tolerance=None, precision=None, max_vertices=None):
+    """
+    Simplifies, snaps and subdivides the polygons of a (service area) layer so the overlays in
+    generate_partial_coverage and generate_serviceable_demand run on smaller geometries (see
+    geometry_processing.preprocess_polygons). The pieces of a polygon keep its id. Subdivided polygons should not be
+    used for binary coverage of demand polygons, as a demand polygon may not be completely within any single piece
+    :param layer: (Feature Layer) The polygon layer
+    :param id_field: (string) The name of the unique identifying field on the layer
+    :param area_tolerance: (float) The maximum area change of each ring when simplifying (not simplified if None)
+    :param precision: (float) The spacing of the grid to snap to (not snapped if None)
+    :param max_vertices: (int) The maximum number of vertices of a piece (not subdivided if None)
+    :return: (Feature Layer) A memory layer of the pieces with the id field
+    """
+    import qgis.core
+    import qgis.utils
+
+    if layer.wkbType() != qgis.utils.QGis.WKBPolygon:
+        raise TypeError("Layer must have polygon geometry")
+    field_index = layer.fieldNameIndex(id_field)
+    if field_index < 0:
+        raise ValueError("'{}' field not found in layer".format(id_field))
+    reset_layers(layer)
+    features = list(layer.getFeatures())
+    piece_ids, pieces = geometry_processing.preprocess_polygons(
+        [feature[id_field] for feature in features], [_get_rings(feature.geometry()) for feature in features],
+        area_tolerance, precision, max_vertices)
+    output = qgis.core.QgsVectorLayer("Polygon?crs={}".format(layer.crs().authid()), layer.name(), "memory")
+    provider = output.dataProvider()
+    provider.addAttributes([layer.pendingFields()[field_index]])
+    output.updateFields()
+    output_features = []
+    for piece_id, rings in zip(piece_ids, pieces):
+        parts = [[[qgis.core.QgsPoint(x, y) for x, y in ring + ring[:1]] for ring in part]
+                 for part in geometry_processing.get_polygon_parts(rings)]
+        feature = qgis.core.QgsFeature(output.pendingFields())
+        if len(parts) == 1:
+            feature.setGeometry(qgis.core.QgsGeometry.fromPolygon(parts[0]))
+        else:
+            feature.setGeometry(qgis.core.QgsGeometry.fromMultiPolygon(parts))
+        feature.setAttributes([piece_id])
+        output_features.append(feature)
+    provider.addFeatures(output_features)
+    output.updateExtents()
+    return output
+
+
+def generate_partial_coverage(dl, fl, dl_demand_field, dl_id_field, fl_id_field, fl_variable_name=None,
+                              resolution=None, min_area=None, min_share=None, min_demand=None, checkpoint=None,
+                              progress_callback=None):
     """
     Generates a dictionary representing the partial coverage (based on area) of a facility to demand areas
+    If a resolution is provided, the coverage is approximated by rasterizing the polygons (see
+    raster_analysis.generate_partial_coverage) rather than intersecting every demand area with every service area.
+    Slivers are dropped if any of the thresholds are set (see geometry_processing.SliverFilter), the demand discarded
+    is reported in the output as 'sliverFilter'. With a checkpoint file, the demand units are saved as they are
+    generated and the units already in the file (from a run that was stopped) are not generated again
     :param dl: (Feature Layer) The demand polygon layer
     :param fl: (Feature Layer) The facility service area polygon layer
     :param dl_demand_field: (string) The name of the field in the demand layer that describes the demand
     :param dl_id_field: (string) The name of the unique identifying field on the demand layer
     :param fl_id_field: (string) The name of the unique identifying field on the facility layer
     :param fl_variable_name: (string) The name to use to represent the facility variable
+    :param resolution: (float) The width of a raster cell in the units of the layers (exact intersection if None)
+    :param min_area: (float) The minimum covered area of a demand area by a facility (no minimum if None)
+    :param min_share: (float) The minimum share (0 - 1) of a demand area covered by a facility (no minimum if None)
+    :param min_demand: (float) The minimum demand covered by a facility (no minimum if None)
+    :param checkpoint: (string) The path of a file to save the demand units to as they are generated, and resume
+        from (see checkpointing.CoverageCheckpoint), not used with a resolution
+    :param progress_callback: (function) Called periodically with the progress, rate and eta (see
+        checkpointing.ProgressReporter), logged if not provided
     :return: (dictionary) A nested dictionary storing the coverage relationships
     """
+    import qgis.utils
+
     # Reset DF
     # Check parameters so we get useful exceptions and messages
     if dl.wkbType() != qgis.utils.QGis.WKBPolygon:
@@ -224,6 +405,18 @@ def generate_partial_coverage(dl, fl, dl_demand_field, dl_id_field, fl_id_field,
     # If no facility layer name provided, use the name of the feature class/shapefile
     if fl_variable_name is None:
         fl_variable_name = os.path.basename(os.path.abspath(fl.dataProvider().dataSourceUri())).split(".")[0]
+    if resolution is not None:
+        dl_features = list(dl.getFeatures())
+        fl_features = list(fl.getFeatures())
+        output = raster_analysis.generate_partial_coverage(
+            [str(feature[dl_id_field]) for feature in dl_features],
+            [feature[dl_demand_field] for feature in dl_features],
+            [_get_rings(feature.geometry()) for feature in dl_features],
+            [str(feature[fl_id_field]) for feature in fl_features],
+            [_get_rings(feature.geometry()) for feature in fl_features], resolution, fl_variable_name,
+            [feature.geometry().area() for feature in dl_features], min_area, min_share, min_demand)
+        reset_layers(dl, fl)
+        return output
     # Create the initial data structure
     logging.getLogger().info("Initializing facilities in output...")
     output = {
@@ -235,11 +428,10 @@ def generate_partial_coverage(dl, fl, dl_demand_field, dl_id_field, fl_id_field,
         "demand": {},
         "totalDemand": 0.0,
         "totalServiceableDemand": 0.0,
-        "facilities": {fl_variable_name: []}
+        # List all of the facilities (once, service areas can be subdivided into pieces)
+        "facilities": {fl_variable_name: list(collections.OrderedDict.fromkeys(
+            str(feature[fl_id_field]) for feature in fl.getFeatures()))}
     }
-    # List all of the facilities
-    for feature in fl.getFeatures():
-        output["facilities"][fl_variable_name].append(str(feature[fl_id_field]))
     # Build empty data structure
     logging.getLogger().info("Initializing demand in output...")
     for feature in dl.getFeatures():
@@ -249,46 +441,177 @@ def generate_partial_coverage(dl, fl, dl_demand_field, dl_id_field, fl_id_field,
             "serviceableDemand": 0.0,
             "coverage": {fl_variable_name: {}}
         }
-    # Dissolve all facility service areas so we can find the total serviceable area
-    logging.getLogger().info("Combining facilities...")
-    dissolved_geom = None
-    for feature in fl.getFeatures():
-        if dissolved_geom is None:
-            dissolved_geom = feature.geometry()
-        dissolved_geom = dissolved_geom.combine(feature.geometry())
+    # The envelopes and prepared geometries of the service areas are reused for every demand unit
+    fl_features = list(fl.getFeatures())
+    fl_bounds = [_get_bounds(feature2.geometry()) for feature2 in fl_features]
+    fl_engines = [_prepare(feature2.geometry()) for feature2 in fl_features]
+    relations = collections.Counter()
+    sliver_filter = geometry_processing.SliverFilter(min_area, min_share, min_demand)
     # Iterate over each intersected polygon and areal interpolate the demand that is covered
+    completed = {}
+    if checkpoint is not None:
+        checkpoint = checkpointing.CoverageCheckpoint(checkpoint, {
+            "type": "partial", "demandSource": dl.dataProvider().dataSourceUri(), "demandId": dl_id_field,
+            "demand": dl_demand_field, "facilitySource": fl.dataProvider().dataSourceUri(),
+            "facilities": fl_variable_name,
+            "facilityIds": checkpointing.get_ids_hash(output["facilities"][fl_variable_name]), "minArea": min_area,
+            "minShare": min_share, "minDemand": min_demand})
+        completed = checkpoint.load()
+    progress = checkpointing.ProgressReporter(dl.featureCount(), progress_callback,
+                                              completed=len(set(completed).intersection(output["demand"])))
     logging.getLogger().info("Determining partial coverage for each demand unit...")
-    for feature in dl.getFeatures():
-        intersected = dissolved_geom.intersection(feature.geometry())
-        if intersected.area() > 0:
-            serviceable_demand = math.ceil(float(intersected.area() / feature.geometry().area()) * feature[dl_demand_field])
-        else:
-            serviceable_demand = 0.0
-        # Make sure serviceable is less than or equal to demand, floating point issues
-        if serviceable_demand < output["demand"][str(feature[dl_id_field])]["demand"]:
-            output["demand"][str(feature[dl_id_field])]["serviceableDemand"] = serviceable_demand
-        else:
-            output["demand"][str(feature[dl_id_field])]["serviceableDemand"] = \
-            output["demand"][str(feature[dl_id_field])]["demand"]
-
-        for feature2 in fl.getFeatures():
-            intersected_fd = feature.geometry().intersection(feature2.geometry())
-            if intersected_fd.area() > 0:
-                demand = math.ceil(float(intersected_fd.area() / feature.geometry().area()) * feature[dl_demand_field])
-                if demand < output["demand"][feature[str(dl_id_field)]]["serviceableDemand"]:
-                    output["demand"][str(feature[dl_id_field])]["coverage"][fl_variable_name] \
-                        [str(feature2[fl_id_field])] = demand
-                else:
-                    output["demand"][str(feature[dl_id_field])]["coverage"][fl_variable_name][
-                        str(feature2[fl_id_field])] = output["demand"][str(feature[dl_id_field])]["serviceableDemand"]
+    try:
+        for feature in dl.getFeatures():
+            if str(feature[dl_id_field]) in completed:
+                output["demand"][str(feature[dl_id_field])] = completed[str(feature[dl_id_field])]
+                checkpointing.add_stats(checkpoint.stats.get(str(feature[dl_id_field])), sliver_filter, relations)
+                continue
+            start = checkpointing.get_stats(sliver_filter, relations)
+            geometry = feature.geometry()
+            bounds = _get_bounds(geometry)
+            # Each facility is intersected with the demand unit once, the area covered by each facility is summed over
+            # the pieces of subdivided service areas
+            parts = []
+            covered_areas = {}
+            for feature2, facility_bounds, facility_engine in zip(fl_features, fl_bounds, fl_engines):
+                part = _get_covered_part(geometry, bounds, feature2.geometry(), facility_bounds, facility_engine,
+                                         relations)
+                if part is not None and part.area() > 0:
+                    parts.append(part)
+                    facility_id = str(feature2[fl_id_field])
+                    covered_areas[facility_id] = covered_areas.get(facility_id, 0.0) + part.area()
+            # The serviceable area is the union of the parts (already clipped to the demand unit), no need to dissolve
+            # all of the service areas
+            area = _get_union_area(geometry, parts)
+            if area > 0:
+                serviceable_demand = math.ceil(float(area / geometry.area()) * feature[dl_demand_field])
+            else:
+                serviceable_demand = 0.0
+            # Make sure serviceable is less than or equal to demand, floating point issues
+            if serviceable_demand < output["demand"][str(feature[dl_id_field])]["demand"]:
+                output["demand"][str(feature[dl_id_field])]["serviceableDemand"] = serviceable_demand
+            else:
+                output["demand"][str(feature[dl_id_field])]["serviceableDemand"] = \
+                output["demand"][str(feature[dl_id_field])]["demand"]
+            for facility_id, covered_area in covered_areas.items():
+                demand = math.ceil(float(covered_area / geometry.area()) * feature[dl_demand_field])
+                if demand > output["demand"][str(feature[dl_id_field])]["serviceableDemand"]:
+                    demand = output["demand"][str(feature[dl_id_field])]["serviceableDemand"]
+                if not sliver_filter.is_sliver(covered_area, geometry.area(), demand):
+                    output["demand"][str(feature[dl_id_field])]["coverage"][fl_variable_name][facility_id] = demand
+            if checkpoint is not None:
+                checkpoint.add(str(feature[dl_id_field]), output["demand"][str(feature[dl_id_field])],
+                               checkpointing.get_stats(sliver_filter, relations, start))
+            progress.update()
+    finally:
+        # Save the demand units generated so far, even if the run is interrupted
+        if checkpoint is not None:
+            checkpoint.flush()
     for feature in dl.getFeatures():
         output["totalServiceableDemand"] += output["demand"][str(feature[dl_id_field])]["serviceableDemand"]
         output["totalDemand"] += feature[dl_demand_field]
+    logging.getLogger().info("Demand/facility pairs by relation: {}".format(dict(relations)))
+    if sliver_filter.is_active():
+        output["sliverFilter"] = sliver_filter.get_report()
+        logging.getLogger().info("Dropped {} slivers ({} demand).".format(sliver_filter.slivers,
+                                                                          sliver_filter.discarded_demand))
     logging.getLogger().info("Partial coverage successfully generated.")
     reset_layers(dl, fl)
     return output
 
 
+def _get_memory_layer(layer, features):
+    """
+    :param layer: (Feature Layer) The layer the features are from
+    :param features: (list) The features
+    :return: (Feature Layer) A memory layer with the fields of the layer and the features
+    """
+    import qgis.core
+    import qgis.utils
+
+    geometry_type = "Point" if layer.wkbType() == qgis.utils.QGis.WKBPoint else "Polygon"
+    output = qgis.core.QgsVectorLayer("{}?crs={}".format(geometry_type, layer.crs().authid()), layer.name(), "memory")
+    provider = output.dataProvider()
+    provider.addAttributes(layer.pendingFields().toList())
+    output.updateFields()
+    provider.addFeatures(features)
+    output.updateExtents()
+    return output
+
+
+def generate_tiled_coverage(dl, fl, dl_demand_field, dl_id_field, fl_id_field, store, tile_size,
+                            coverage_type="binary", fl_variable_name=None, search_distance=0.0, **kwargs):
+    """
+    Generates a binary or partial coverage one spatial tile of the demand layer at a time and appends each tile to a
+    coverage store on disk, for demand layers too large to hold the coverage (or the features) in memory. The demand
+    units with their centroid in a tile are read with the facilities whose envelopes intersect the envelope of the
+    tile's demand (expanded by the search distance), so memory is bounded by the size of a tile. The coverage can then
+    be loaded from the store lazily (by bounding box or demand ids, see CoverageStore.iter_demand and
+    CoverageStore.load_coverage)
+    :param dl: (Feature Layer) The demand polygon or point layer
+    :param fl: (Feature Layer) The facility service area polygon layer
+    :param dl_demand_field: (string) The name of the field in the demand layer that describes the demand
+    :param dl_id_field: (string) The name of the unique identifying field on the demand layer
+    :param fl_id_field: (string) The name of the unique identifying field on the facility layer
+    :param store: (CoverageStore) The store to write the coverage to (any coverage already stored is replaced)
+    :param tile_size: (float) The width (and height) of a tile in the units of the demand layer
+    :param coverage_type: (string) ['binary', 'partial'] The type of coverage to generate
+    :param fl_variable_name: (string) The name to use to represent the facility variable
+    :param search_distance: (float) The distance around the demand of a tile that facilities are read from
+    :param kwargs: Keyword arguments for generate_partial_coverage (resolution, min_area...), the facilities read
+        differ between tiles so a checkpoint path is used as the prefix of one checkpoint file per tile
+        ('<checkpoint>.<tile>')
+    :return: (CoverageStore) The store
+    """
+    import qgis.core
+
+    generators = {"binary": generate_binary_coverage, "partial": generate_partial_coverage}
+    if coverage_type not in generators:
+        raise ValueError("Expected types: '{}' got type '{}'".format(sorted(generators), coverage_type))
+    reset_layers(dl, fl)
+    if fl_variable_name is None:
+        fl_variable_name = os.path.basename(os.path.abspath(fl.dataProvider().dataSourceUri())).split(".")[0]
+    extent = dl.extent()
+    grid = raster_analysis.RasterGrid((extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum()),
+                                      tile_size)
+    store.clear()
+    # List all of the facilities, even those that don't cover any demand
+    request = qgis.core.QgsFeatureRequest().setFlags(qgis.core.QgsFeatureRequest.NoGeometry)
+    store.add_facilities({fl_variable_name: [str(feature[fl_id_field]) for feature in fl.getFeatures(request)]})
+    checkpoint = kwargs.pop("checkpoint", None)
+    logging.getLogger().info("Generating coverage in {} tiles...".format(grid.size))
+    for cell in range(grid.size):
+        request = qgis.core.QgsFeatureRequest().setFilterRect(qgis.core.QgsRectangle(*grid.get_cell_bounds(cell)))
+        dl_features = []
+        dl_locations = {}
+        for feature in dl.getFeatures(request):
+            centroid = feature.geometry().centroid().asPoint()
+            # Each demand unit is in the one tile that its centroid is in
+            if grid.get_cell(centroid.x(), centroid.y()) == cell:
+                dl_features.append(feature)
+                dl_locations[str(feature[dl_id_field])] = (centroid.x(), centroid.y())
+        if not dl_features:
+            continue
+        bounds = qgis.core.QgsRectangle(dl_features[0].geometry().boundingBox())
+        for feature in dl_features[1:]:
+            bounds.combineExtentWith(feature.geometry().boundingBox())
+        bounds = qgis.core.QgsRectangle(bounds.xMinimum() - search_distance, bounds.yMinimum() - search_distance,
+                                        bounds.xMaximum() + search_distance, bounds.yMaximum() + search_distance)
+        fl_features = list(fl.getFeatures(qgis.core.QgsFeatureRequest().setFilterRect(bounds)))
+        if checkpoint is not None:
+            kwargs["checkpoint"] = "{}.{}".format(checkpoint, cell)
+        coverage = generators[coverage_type](_get_memory_layer(dl, dl_features), _get_memory_layer(fl, fl_features),
+                                             dl_demand_field, dl_id_field, fl_id_field,
+                                             fl_variable_name=fl_variable_name, **kwargs)
+        store.append_coverage(coverage, dl_locations)
+        logging.getLogger().info("Tile {} of {}: {} demand units, {} facilities".format(
+            cell + 1, grid.size, len(dl_features), len(fl_features)))
+    store.create_indexes()
+    reset_layers(dl, fl)
+    logging.getLogger().info("Tiled coverage successfully generated.")
+    return store
+
+
 def generate_traumah_coverage(dl, dl_service_area, tc_layer, ad_layer, dl_demand_field, air_distance_threshold, dl_id_field="FID", tc_layer_id_field="FID", ad_layer_id_field="FID"):
     """
     Generates a coverage model for the TRAUMAH model. The traumah model uses trauma centers (TC), air depots (AD), and demand
@@ -303,6 +626,8 @@ def generate_traumah_coverage(dl, dl_service_area, tc_layer, ad_layer, dl_demand
     :param ad_layer_id_field: (string) The attribute that represents unique ids for the air depot layers
     :return: (dictionary) A nested dictionary storing the coverage relationships
     """
+    import qgis.utils
+
     if dl.wkbType() != qgis.utils.QGis.WKBPoint:
         raise TypeError("Demand layer must have point geometry")
     if dl_service_area.wkbType() != qgis.utils.QGis.WKBPolygon:
@@ -397,6 +722,8 @@ def get_covered_demand(dl, dl_demand_field, mode, *args):
     :param args: (Feature Layer) The facility layers to use
     :return: (dictionary) A dictionary of similar format to the coverage format
     """
+    import qgis.utils
+
     # Reset DF
     # Check parameters so we get useful exceptions and messages
     reset_layers(dl)
@@ -442,3 +769,69 @@ def get_covered_demand(dl, dl_demand_field, mode, *args):
     logging.getLogger().info("Covered demand is: {}".format(total_coverage))
     reset_layers(dl)
     return total_coverage
+
+
+def write_field_values(layer, id_field, values, field_name, field_type="double", default=0):
+    """
+    Writes values (keyed on id) to a field of the layer with one bulk change of the data provider,
+    the field is added if needed
+    :param layer: (Feature Layer) The layer to write to
+    :param id_field: (string) The name of the unique identifying field on the layer
+    :param values: (dictionary) The values to write keyed on id (as strings)
+    :param field_name: (string) The name of the field to write the values to
+    :param field_type: (string) ['int', 'double'] The type of the field if it needs to be added
+    :param default: The value to write for features that are not in values
+    :return: (int) The number of features that were found in values
+    """
+    import qgis.core
+    from PyQt4.QtCore import QVariant
+
+    field_names = [field.name() for field in layer.pendingFields()]
+    if id_field not in field_names:
+        raise ValueError("'{}' field not found in layer".format(id_field))
+    provider = layer.dataProvider()
+    if field_name not in field_names:
+        variant_type = QVariant.Int if field_type == "int" else QVariant.Double
+        provider.addAttributes([qgis.core.QgsField(field_name, variant_type)])
+        layer.updateFields()
+    reset_layers(layer)
+    field_index = layer.fieldNameIndex(field_name)
+    changes = {}
+    written = 0
+    for feature in layer.getFeatures():
+        key = str(feature[id_field])
+        if key in values:
+            changes[feature.id()] = {field_index: values[key]}
+            written += 1
+        else:
+            changes[feature.id()] = {field_index: default}
+    provider.changeAttributeValues(changes)
+    return written
+
+
+def write_selected_facilities(fl, fl_id_field, ids, field_name="SELECTED"):
+    """
+    Flags the chosen facilities (1) and the others (0) on the facility layer
+    Replaces applying generate_query as a subset string, which gets slow with many ids
+    :param fl: (Feature Layer) The facility layer
+    :param fl_id_field: (string) The name of the unique identifying field on the facility layer
+    :param ids: (list) The ids of the chosen facilities (see utilities.get_ids)
+    :param field_name: (string) The name of the field to write the flags to
+    :return: (int) The number of facilities flagged
+    """
+    return write_field_values(fl, fl_id_field, {str(facility_id): 1 for facility_id in ids}, field_name, "int", 0)
+
+
+def write_covered_demand(dl, dl_id_field, covered_demand, field_name="COVERED"):
+    """
+    Writes the demand covered for each demand unit (from utilities.get_covered_demand) to the demand layer
+    :param dl: (Feature Layer) The demand layer
+    :param dl_id_field: (string) The name of the unique identifying field on the demand layer
+    :param covered_demand: (dictionary) The covered demand, either the output of utilities.get_covered_demand or
+        its 'demand' dictionary (covered demand keyed on demand id)
+    :param field_name: (string) The name of the field to write the covered demand to
+    :return: (int) The number of demand units written
+    """
+    if "demand" in covered_demand and isinstance(covered_demand["demand"], dict):
+        covered_demand = covered_demand["demand"]
+    return write_field_values(dl, dl_id_field, covered_demand, field_name, "double", 0)
@@ -0,0 +1,323 @@
+# -*- coding: UTF-8 -*-
+import collections
+import logging
+import math
+
+from pyspatialopt import version
+from pyspatialopt.analysis import geometry_processing
+
+# The maximum number of (row, edge) crossings computed at once when rasterizing a polygon
+MAX_CROSSINGS = 4000000
+
+
+def get_rings_bounds(rings):
+    """
+    :param rings: (list) The rings of a polygon, each a list of (x, y) tuples
+    :return: (tuple) The bounds (xmin, ymin, xmax, ymax)
+    """
+    xs = [point[0] for ring in rings for point in ring]
+    ys = [point[1] for ring in rings for point in ring]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def get_rings_area(rings):
+    """
+    Calculates the area of a polygon with the shoelace formula. Interior rings (holes) must be oriented opposite to
+    the exterior rings as they are in shapefiles, file geodatabases and GeoJSON
+    :param rings: (list) The rings of a polygon, each a list of (x, y) tuples
+    :return: (float) The area
+    """
+    area = 0.0
+    for ring in rings:
+        for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+            area += x1 * y2 - x2 * y1
+    return abs(area) / 2.0
+
+
+class RasterGrid(object):
+    """
+    A regular grid of square cells that polygons are rasterized onto. Cells are numbered row by row from the
+    bottom left corner, a cell belongs to a polygon when its center is inside the polygon (even-odd rule)
+    """
+
+    def __init__(self, bounds, resolution):
+        """
+        :param bounds: (tuple) The extent (xmin, ymin, xmax, ymax) to cover
+        :param resolution: (float) The width (and height) of a cell
+        """
+        if resolution <= 0:
+            raise ValueError("Resolution must be greater than 0")
+        self.resolution = float(resolution)
+        self.x0 = float(bounds[0])
+        self.y0 = float(bounds[1])
+        self.columns = max(1, int(math.ceil((bounds[2] - bounds[0]) / self.resolution)))
+        self.rows = max(1, int(math.ceil((bounds[3] - bounds[1]) / self.resolution)))
+        self.size = self.columns * self.rows
+        self.cell_area = self.resolution * self.resolution
+
+    @staticmethod
+    def _get_edges(rings):
+        import numpy
+
+        edges = []
+        for ring in rings:
+            points = numpy.asarray(ring, dtype=numpy.float64)
+            edges.append(numpy.hstack([points, numpy.roll(points, -1, axis=0)]))
+        return numpy.vstack(edges)
+
+    def get_cell(self, x, y):
+        """
+        :param x: (float) The x coordinate
+        :param y: (float) The y coordinate
+        :return: (int) The cell containing the point (clamped to the grid)
+        """
+        column = min(max(int((x - self.x0) // self.resolution), 0), self.columns - 1)
+        row = min(max(int((y - self.y0) // self.resolution), 0), self.rows - 1)
+        return row * self.columns + column
+
+    def get_cell_bounds(self, cell):
+        """
+        :param cell: (int) The cell number
+        :return: (tuple) The bounds (xmin, ymin, xmax, ymax) of the cell
+        """
+        row, column = divmod(cell, self.columns)
+        xmin = self.x0 + column * self.resolution
+        ymin = self.y0 + row * self.resolution
+        return xmin, ymin, xmin + self.resolution, ymin + self.resolution
+
+    def rasterize(self, rings):
+        """
+        Finds the cells whose center is inside a polygon by intersecting the rows of cell centers with the edges
+        :param rings: (list) The rings of the polygon, each a list of (x, y) tuples
+        :return: (numpy array) The sorted cell numbers
+        """
+        import numpy
+
+        edges = self._get_edges(rings)
+        x1, y1, x2, y2 = edges.T
+        first_row = max(int(math.ceil((y1.min() - self.y0) / self.resolution - 0.5)), 0)
+        last_row = min(int(math.floor((y1.max() - self.y0) / self.resolution - 0.5)), self.rows - 1)
+        dy = numpy.where(y1 == y2, 1.0, y2 - y1)
+        cells = []
+        step = max(1, MAX_CROSSINGS // len(edges))
+        for start in range(first_row, last_row + 1, step):
+            rows = numpy.arange(start, min(start + step, last_row + 1))
+            ys = self.y0 + (rows[:, None] + 0.5) * self.resolution
+            # The x of the crossing of each row with each edge, infinite when the edge doesn't cross the row
+            crosses = (y1 <= ys) != (y2 <= ys)
+            xs = numpy.where(crosses, x1 + (ys - y1) * (x2 - x1) / dy, numpy.inf)
+            xs.sort(axis=1)
+            if xs.shape[1] % 2:
+                xs = numpy.hstack([xs, numpy.full((len(xs), 1), numpy.inf)])
+            # Every other pair of crossings is inside the polygon
+            starts = xs[:, 0::2]
+            ends = xs[:, 1::2]
+            inside = numpy.isfinite(starts)
+            first = numpy.ceil((starts[inside] - self.x0) / self.resolution - 0.5).astype(numpy.int64)
+            last = numpy.floor((ends[inside] - self.x0) / self.resolution - 0.5).astype(numpy.int64)
+            first = numpy.maximum(first, 0)
+            last = numpy.minimum(last, self.columns - 1)
+            row = numpy.broadcast_to(rows[:, None], inside.shape)[inside]
+            valid = last >= first
+            first, last, row = first[valid], last[valid], row[valid]
+            lengths = last - first + 1
+            offsets = numpy.repeat(numpy.cumsum(lengths) - lengths, lengths)
+            cells.append(numpy.repeat(row * self.columns + first, lengths) + numpy.arange(lengths.sum()) - offsets)
+        if not cells:
+            return numpy.zeros(0, dtype=numpy.int64)
+        # The spans are in order so the cells are sorted, two spans can only share a cell when they touch
+        cells = numpy.concatenate(cells)
+        return cells[numpy.concatenate([[True], cells[1:] != cells[:-1]])]
+
+    def rasterize_boundary(self, rings):
+        """
+        Finds the cells that the boundary of a polygon passes through (or touches). These are the only cells where
+        the rasterized area of the polygon can differ from the exact area
+        :param rings: (list) The rings of the polygon, each a list of (x, y) tuples
+        :return: (numpy array) The sorted cell numbers
+        """
+        import numpy
+
+        edges = self._get_edges(rings)
+        # Sample each edge every eighth of a cell, a cell the edge passes through is then next to the cell of a sample
+        counts = numpy.ceil(numpy.hypot(edges[:, 2] - edges[:, 0], edges[:, 3] - edges[:, 1]) /
+                            (self.resolution / 8.0)).astype(numpy.int64) + 1
+        edge_index = numpy.repeat(numpy.arange(len(edges)), counts)
+        t = (numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)) / \
+            numpy.repeat(numpy.maximum(counts - 1, 1), counts)
+        x1, y1, x2, y2 = edges[edge_index].T
+        columns = numpy.floor((x1 + t * (x2 - x1) - self.x0) / self.resolution).astype(numpy.int64)
+        rows = numpy.floor((y1 + t * (y2 - y1) - self.y0) / self.resolution).astype(numpy.int64)
+        # Samples more than a cell outside the grid have no neighbours in it
+        inside = (rows >= -1) & (rows <= self.rows) & (columns >= -1) & (columns <= self.columns)
+        stride = (self.rows + 2) * (self.columns + 2)
+        candidates = numpy.unique(edge_index[inside] * stride + (rows[inside] + 1) * (self.columns + 2) +
+                                  columns[inside] + 1)
+        edge_index, cells = numpy.divmod(candidates, stride)
+        rows, columns = numpy.divmod(cells, self.columns + 2)
+        edge_index = numpy.repeat(edge_index, 9)
+        rows = (rows[:, None] + numpy.array([-2, -2, -2, -1, -1, -1, 0, 0, 0])).ravel()
+        columns = (columns[:, None] + numpy.array([-2, -1, 0, -2, -1, 0, -2, -1, 0])).ravel()
+        valid = (rows >= 0) & (rows < self.rows) & (columns >= 0) & (columns < self.columns)
+        edge_index, rows, columns = edge_index[valid], rows[valid], columns[valid]
+        # Keep the cells the edge intersects: their extents overlap and the corners aren't all on one side of the edge
+        x1, y1, x2, y2 = edges[edge_index].T
+        cell_x = self.x0 + columns * self.resolution
+        cell_y = self.y0 + rows * self.resolution
+        intersects = (numpy.minimum(x1, x2) <= cell_x + self.resolution) & (numpy.maximum(x1, x2) >= cell_x) & \
+                     (numpy.minimum(y1, y2) <= cell_y + self.resolution) & (numpy.maximum(y1, y2) >= cell_y)
+        sides = numpy.column_stack([(x2 - x1) * (cell_y + dy - y1) - (y2 - y1) * (cell_x + dx - x1)
+                                    for dx, dy in [(0, 0), (self.resolution, 0), (0, self.resolution),
+                                                   (self.resolution, self.resolution)]])
+        intersects &= (sides.min(axis=1) <= 0) & (sides.max(axis=1) >= 0)
+        return numpy.unique(rows[intersects] * self.columns + columns[intersects])
+
+
+def _get_pairs(cells):
+    """
+    :param cells: (list) The cells (numpy arrays) of each polygon
+    :return: (tuple) The cells and polygon index of every (cell, polygon) pair sorted by cell, and the sort order
+    """
+    import numpy
+
+    polygons = numpy.repeat(numpy.arange(len(cells)), [len(polygon_cells) for polygon_cells in cells])
+    cells = numpy.concatenate(cells)
+    order = numpy.argsort(cells, kind="stable")
+    return cells[order], polygons[order], order
+
+
+def generate_partial_coverage(dl_ids, dl_demand, dl_polygons, fl_ids, fl_polygons, resolution,
+                              fl_variable_name="facility", dl_areas=None, min_area=None, min_share=None,
+                              min_demand=None):
+    """
+    Generates a dictionary representing the approximate partial coverage (based on area) of a facility to demand
+    areas by rasterizing the demand and service area polygons onto a grid. Each cell of a demand polygon carries
+    demand * cell area / polygon area, the demand covered by a facility is the demand of the cells inside its service
+    area. The largest possible difference between an approximate and exact covered demand (before rounding up) is
+    reported in the output as 'approximation': {'resolution', 'maxError'}. Slivers are dropped if any of the
+    thresholds are set (see geometry_processing.SliverFilter), the demand discarded is reported as 'sliverFilter'
+    :param dl_ids: (list) The demand ids
+    :param dl_demand: (list) The demand of each demand polygon
+    :param dl_polygons: (list) The rings of each demand polygon, each ring is a list of (x, y) tuples
+    :param fl_ids: (list) The facility ids
+    :param fl_polygons: (list) The rings of each facility service area polygon
+    :param resolution: (float) The width of a grid cell in the units of the coordinates
+    :param fl_variable_name: (string) The name to use to represent the facility variable
+    :param dl_areas: (list) The areas of the demand polygons (calculated from the rings if not provided)
+    :param min_area: (float) The minimum covered area of a demand polygon by a facility (no minimum if None)
+    :param min_share: (float) The minimum share (0 - 1) of a demand polygon covered by a facility (no minimum if None)
+    :param min_demand: (float) The minimum demand covered by a facility (no minimum if None)
+    :return: (dictionary) A nested dictionary storing the coverage relationships
+    """
+    import numpy
+
+    dl_ids = [str(demand_id) for demand_id in dl_ids]
+    fl_ids = [str(facility_id) for facility_id in fl_ids]
+    if dl_areas is None:
+        dl_areas = [get_rings_area(rings) for rings in dl_polygons]
+    logging.getLogger().info("Initializing facilities in output...")
+    output = {
+        "version": version.__version__,
+        "type": {
+            "mode": "coverage",
+            "type": "partial",
+        },
+        "demand": {},
+        "totalDemand": 0.0,
+        "totalServiceableDemand": 0.0,
+        "facilities": {fl_variable_name: list(collections.OrderedDict.fromkeys(fl_ids))}
+    }
+    logging.getLogger().info("Initializing demand in output...")
+    for demand_id, demand, area in zip(dl_ids, dl_demand, dl_areas):
+        output["demand"][demand_id] = {
+            "area": round(area),
+            "demand": round(demand),
+            "serviceableDemand": 0.0,
+            "coverage": {fl_variable_name: {}}
+        }
+    dl_bounds = numpy.array([get_rings_bounds(rings) for rings in dl_polygons], dtype=numpy.float64).reshape(-1, 4)
+    fl_bounds = numpy.array([get_rings_bounds(rings) for rings in fl_polygons], dtype=numpy.float64).reshape(-1, 4)
+    grid = RasterGrid((dl_bounds[:, 0].min(), dl_bounds[:, 1].min(), dl_bounds[:, 2].max(), dl_bounds[:, 3].max()),
+                      resolution)
+    logging.getLogger().info("Rasterizing {} demand polygons onto {}x{} cells...".format(len(dl_ids), grid.columns,
+                                                                                        grid.rows))
+    # (cell, demand index) pairs sorted by cell, so the pairs in the rows of a facility are a contiguous slice
+    dl_cells = []
+    dl_boundaries = []
+    on_boundary = []
+    for rings in dl_polygons:
+        cells = grid.rasterize(rings)
+        if len(cells) == 0:
+            # Smaller than a cell, use the cell of a vertex (a boundary cell so the error is accounted for)
+            cells = numpy.array([grid.get_cell(*rings[0][0])], dtype=numpy.int64)
+        boundary = grid.rasterize_boundary(rings)
+        dl_cells.append(cells)
+        dl_boundaries.append(boundary)
+        on_boundary.append(numpy.isin(cells, boundary, assume_unique=True))
+    pair_cells, pair_demand, order = _get_pairs(dl_cells)
+    on_boundary = numpy.concatenate(on_boundary)[order]
+    boundary_pair_cells, boundary_pair_demand, order = _get_pairs(dl_boundaries)
+    dl_demand = numpy.asarray(dl_demand, dtype=numpy.float64)
+    dl_areas = numpy.asarray(dl_areas, dtype=numpy.float64)
+    # The demand carried by each cell of each demand polygon
+    cell_demand = numpy.where(dl_areas > 0, dl_demand * grid.cell_area / numpy.where(dl_areas > 0, dl_areas, 1.0),
+                              dl_demand)
+    logging.getLogger().info("Determining partial coverage for each facility...")
+    mask = numpy.zeros(grid.size, dtype=bool)
+    serviceable_mask = numpy.zeros(grid.size, dtype=bool)
+    # The counts of a facility are summed over the pieces of subdivided service areas
+    covered_counts = {}
+    error_counts = {}
+    for facility_id, rings, bounds in zip(fl_ids, fl_polygons, fl_bounds):
+        cells = grid.rasterize(rings)
+        boundary = grid.rasterize_boundary(rings)
+        serviceable_mask[cells] = True
+        # The boundary cells can be a cell outside of the bounds of the service area
+        xmin, ymin, xmax, ymax = bounds + numpy.array([-1.0, -1.0, 1.0, 1.0]) * grid.resolution
+        cell_range = [grid.get_cell(xmin, ymin), grid.get_cell(xmax, ymax) + 1]
+        first, last = numpy.searchsorted(pair_cells, cell_range)
+        boundary_first, boundary_last = numpy.searchsorted(boundary_pair_cells, cell_range)
+        mask[cells] = True
+        hits = mask[pair_cells[first:last]]
+        counts = numpy.bincount(pair_demand[first:last][hits], minlength=len(dl_ids))
+        covered_counts[facility_id] = covered_counts[facility_id] + counts if facility_id in covered_counts else counts
+        # A cell can only be misclassified if the boundary of the demand or service area passes through it, and it
+        # is in (or crossed by the boundary of) the other polygon
+        mask[boundary] = True
+        near = mask[boundary_pair_cells[boundary_first:boundary_last]]
+        counts = numpy.bincount(boundary_pair_demand[boundary_first:boundary_last][near], minlength=len(dl_ids))
+        # Every cell the service area boundary crosses can be misclassified, whether its center is inside or not
+        mask[cells] = False
+        mask[boundary] = True
+        near = mask[pair_cells[first:last]] & ~on_boundary[first:last]
+        counts += numpy.bincount(pair_demand[first:last][near], minlength=len(dl_ids))
+        mask[boundary] = False
+        error_counts[facility_id] = error_counts[facility_id] + counts if facility_id in error_counts else counts
+    max_error = 0.0
+    for counts in error_counts.values():
+        if counts.any():
+            max_error = max(max_error, float(numpy.minimum(counts * cell_demand, dl_demand).max()))
+    serviceable_counts = numpy.bincount(pair_demand[serviceable_mask[pair_cells]], minlength=len(dl_ids))
+    for i, demand_id in enumerate(dl_ids):
+        demand_obj = output["demand"][demand_id]
+        serviceable_demand = math.ceil(float(serviceable_counts[i] * cell_demand[i]))
+        # Make sure serviceable is less than or equal to demand, the approximation can overshoot
+        demand_obj["serviceableDemand"] = min(serviceable_demand, demand_obj["demand"])
+    sliver_filter = geometry_processing.SliverFilter(min_area, min_share, min_demand)
+    for facility_id, counts in covered_counts.items():
+        for i in numpy.flatnonzero(counts).tolist():
+            demand_obj = output["demand"][dl_ids[i]]
+            covered_demand = min(math.ceil(float(counts[i] * cell_demand[i])), demand_obj["serviceableDemand"])
+            if sliver_filter.is_sliver(float(counts[i] * grid.cell_area), float(dl_areas[i]), covered_demand):
+                continue
+            demand_obj["coverage"][fl_variable_name][facility_id] = covered_demand
+    for demand_id, demand in zip(dl_ids, dl_demand.tolist()):
+        output["totalServiceableDemand"] += output["demand"][demand_id]["serviceableDemand"]
+        output["totalDemand"] += demand
+    output["approximation"] = {"resolution": grid.resolution, "maxError": max_error}
+    if sliver_filter.is_active():
+        output["sliverFilter"] = sliver_filter.get_report()
+        logging.getLogger().info("Dropped {} slivers ({} demand).".format(sliver_filter.slivers,
+                                                                          sliver_filter.discarded_demand))
+    logging.getLogger().info("Partial coverage successfully generated (max error {}).".format(max_error))
+    return output
@@ -1,10 +1,10 @@
 # -*- coding: UTF-8 -*-
 import logging
-import pulp
 import csv
 import os
 from pyspatialopt.models import utilities
 from pyspatialopt.models import covering
+from pyspatialopt.models import solving
 
 
 def generate_binary_coverage_from_dist_matrix(
@@ -72,20 +72,228 @@ def generate_binary_coverage_from_dist_matrix(
     return output
 
 
-def binary_mclp_distance_matrix(file_distance_matrix, service_dist, num_facility, list_field_req=None, facility_variable_name="facility", workspace_path="."):
+# The columnar formats that can be read (besides csv) keyed on file extension
+FILE_FORMATS = {".parquet": "parquet", ".pq": "parquet", ".feather": "ipc", ".arrow": "ipc", ".ipc": "ipc",
+                ".npy": "npy"}
+
+
+def _build_coverage(dl_ids, dl_demand, fl_ids, pair_fl_index, pair_dl_index, fl_variable_name):
+    """
+    Builds a binary coverage from the unique ids and the (facility, demand) index pairs that are within the threshold
+    """
+    output = {
+        "version": "1",
+        "type": {
+            "mode": "coverage",
+            "type": "binary",
+        },
+        "demand": {},
+        "totalDemand": 0.0,
+        "totalServiceableDemand": 0.0,
+        "facilities": {fl_variable_name: list(fl_ids)}
+    }
+    for demand_id, demand in zip(dl_ids, dl_demand):
+        output["demand"][demand_id] = {
+            "area": 0,
+            "demand": float(demand),
+            "serviceableDemand": 0.0,
+            "coverage": {fl_variable_name: {}}
+        }
+    for facility_index, demand_index in zip(pair_fl_index, pair_dl_index):
+        demand_obj = output["demand"][dl_ids[demand_index]]
+        demand_obj["serviceableDemand"] = demand_obj["demand"]
+        demand_obj["coverage"][fl_variable_name][fl_ids[facility_index]] = 1
+    for row in output["demand"].values():
+        output["totalServiceableDemand"] += row["serviceableDemand"]
+        output["totalDemand"] += row["demand"]
+    return output
+
+
+def _get_unique(values):
+    """
+    Finds the unique values of an array in order of first appearance
+    :param values: (numpy array) The values
+    :return: (tuple) The unique values, the index of the first appearance of each and the index of each value in the
+    unique values (numpy arrays)
+    """
+    import numpy
+
+    unique, first, codes = numpy.unique(values, return_index=True, return_inverse=True)
+    order = numpy.argsort(first, kind="stable")
+    rank = numpy.empty_like(order)
+    rank[order] = numpy.arange(len(order))
+    return unique[order], first[order], rank[codes.ravel()]
+
+
+def _get_codes(array):
+    """
+    Dictionary encodes an arrow array of ids, the dictionary of an already encoded array is used as is
+    :param array: (pyarrow ChunkedArray) The ids (any type, possibly already dictionary encoded)
+    :return: (tuple) The ids (strings, in order of first appearance), the index of the first appearance of each id and
+    the index of each value in the ids (numpy arrays)
+    """
+    import numpy
+    import pyarrow
+
+    if not pyarrow.types.is_dictionary(array.type):
+        array = array.dictionary_encode()
+    # Chunks (row groups) can have their own dictionaries
+    array = array.unify_dictionaries()
+    if array.num_chunks == 0:
+        return [], numpy.array([], dtype="i8"), numpy.array([], dtype="i8")
+    indices = numpy.concatenate([chunk.indices.to_numpy(zero_copy_only=False) for chunk in array.chunks])
+    # The dictionary may hold values that aren't used, only the used ones are ids
+    used, first, codes = _get_unique(indices)
+    dictionary = array.chunks[0].dictionary
+    ids = [str(value) for value in dictionary.take(pyarrow.array(used)).to_pylist()]
+    return ids, first, codes
+
+
+def _check_fields(names, fields):
+    """
+    Raises a ValueError if any of the fields isn't in the distance matrix
+    """
+    for field in fields:
+        if names is None or field not in names:
+            raise ValueError("Error: this field {} not found in the distance matrix".format(field))
+
+
+def _read_arrow(file_distance_matrix, file_format, dist_threshold, dl_id_field, fl_id_field, demand_field,
+                distance_field, list_field_req):
+    """
+    Reads a Parquet or Feather (Arrow IPC) distance matrix in one scan of the needed columns
+    """
+    import numpy
+    import pyarrow.dataset
+
+    dataset = pyarrow.dataset.dataset(file_distance_matrix, format=file_format)
+    _check_fields(dataset.schema.names, [dl_id_field, fl_id_field, demand_field, distance_field] + list_field_req)
+    table = dataset.to_table(columns=[dl_id_field, fl_id_field, demand_field, distance_field])
+    # Every demand unit and facility is part of the coverage, even if it isn't within the threshold of any other
+    dl_ids, dl_first, dl_codes = _get_codes(table[dl_id_field])
+    fl_ids, _, fl_codes = _get_codes(table[fl_id_field])
+    dl_demand = table[demand_field].take(pyarrow.array(dl_first)).to_pylist()
+    within = numpy.asarray(table[distance_field].to_numpy()) <= dist_threshold
+    return dl_ids, dl_demand, fl_ids, fl_codes[within].tolist(), dl_codes[within].tolist()
+
+
+def _read_npy(file_distance_matrix, dist_threshold, dl_id_field, fl_id_field, demand_field, distance_field,
+              list_field_req):
+    """
+    Reads a numpy structured array distance matrix (memory mapped so only the columns used are read)
+    """
+    import numpy
+
+    array = numpy.load(file_distance_matrix, mmap_mode="r")
+    _check_fields(array.dtype.names, [dl_id_field, fl_id_field, demand_field, distance_field] + list_field_req)
+    dl_values, dl_first, dl_codes = _get_unique(array[dl_id_field])
+    fl_values, _, fl_codes = _get_unique(array[fl_id_field])
+    within = numpy.asarray(array[distance_field]) <= dist_threshold
+    dl_ids = [str(value) for value in dl_values.tolist()]
+    fl_ids = [str(value) for value in fl_values.tolist()]
+    dl_demand = numpy.asarray(array[demand_field])[dl_first].tolist()
+    return dl_ids, dl_demand, fl_ids, fl_codes[within].tolist(), dl_codes[within].tolist()
+
+
+def generate_binary_coverage_from_dist_file(file_distance_matrix, dist_threshold, dl_id_field="demand_id",
+                                            fl_id_field="facility_id", demand_field="demand",
+                                            distance_field="distance", fl_variable_name=None, list_field_req=None):
+    """
+    Generates a dictionary representing the binary coverage of a facility to demand points from a distance matrix
+    file. Parquet and Feather (Arrow IPC) files are read with pyarrow in one scan that only projects the needed
+    columns, ids are dictionary encoded (reusing the file's dictionaries). Numpy (.npy) structured arrays are memory
+    mapped. Other files are read as csv (see generate_binary_coverage_from_dist_matrix)
+    :param file_distance_matrix: (string) The path to the distance matrix (.parquet, .feather, .npy or .csv)
+    :param dist_threshold: (numeric) The distance threshold
+    :param dl_id_field: (string) The name of the demand point id field
+    :param fl_id_field: (string) The name of the facility id field
+    :param demand_field: (string) The name of demand weight field
+    :param distance_field: (string) The name of distance field
+    :param fl_variable_name: (string) The name to use to represent the facility variable
+    :param list_field_req: (list of string) Other fields that must be in the distance matrix
+    :return: (dictionary) A nested dictionary storing the coverage relationships
+    """
+    if fl_variable_name is None:
+        fl_variable_name = "facility"
+    if list_field_req is None:
+        list_field_req = []
+    file_format = FILE_FORMATS.get(os.path.splitext(file_distance_matrix)[1].lower())
+    if file_format is None:
+        with open(file_distance_matrix) as csvfile:
+            reader = csv.DictReader(csvfile, skipinitialspace=True)
+            _check_fields(reader.fieldnames, list_field_req)
+            rows = list(reader)
+        return generate_binary_coverage_from_dist_matrix(rows, dist_threshold, dl_id_field, fl_id_field, demand_field,
+                                                         distance_field, fl_variable_name)
+    logging.getLogger().info("Reading {}...".format(file_distance_matrix))
+    if file_format == "npy":
+        columns = _read_npy(file_distance_matrix, dist_threshold, dl_id_field, fl_id_field, demand_field,
+                            distance_field, list_field_req)
+    else:
+        columns = _read_arrow(file_distance_matrix, file_format, dist_threshold, dl_id_field, fl_id_field,
+                              demand_field, distance_field, list_field_req)
+    output = _build_coverage(*(columns + (fl_variable_name,)))
+    logging.getLogger().info("Binary coverage successfully generated.")
+    return output
+
+
+def _solve_mclp(dict_coverage, num_facility, facility_variable_name, solver, time_limit, gap):
+    """
+    Solves the MCLP of a distance matrix coverage and summarizes the result (see binary_mclp_distance_matrix)
+    """
+    # formulate model
+    mclp = covering.create_mclp_model(dict_coverage, {"total": num_facility})
+
+    # solve
+    solve_result = solving.solve_model(mclp, solver, time_limit=time_limit, gap=gap)
+
+    # Get the id set of facilities chosen
+    set_facility_id_chosen = set(utilities.get_ids(mclp, facility_variable_name))
+
+    # Query the demand covered from the dict_coverage
+    total_demand_covered = 0.0
+
+    for demand_id, demand_obj in dict_coverage["demand"].items():
+        # if this demand_id is covered by any facility in ids
+        if not set_facility_id_chosen.isdisjoint(demand_obj["coverage"][facility_variable_name].keys()):
+            total_demand_covered += demand_obj["demand"]
+
+    result_coverage = {
+        "number_facility": num_facility,
+        "number_facility_chosen": len(set_facility_id_chosen),
+        "set_facility_id_chosen": set_facility_id_chosen,
+        "total_demand": dict_coverage["totalDemand"],
+        "percent_demand_coverage": (100 * total_demand_covered) /
+        dict_coverage["totalDemand"],
+        "status": solve_result["status"],
+        "gap": solve_result["gap"],
+        }
+    return result_coverage
+
+
+def binary_mclp_distance_matrix(file_distance_matrix, service_dist, num_facility, list_field_req=None, facility_variable_name="facility", workspace_path=".",
+                                solver="glpk", time_limit=None, gap=None):
     """
     Solve a binary and point-based MCLP based on a distance matrix
-    :param file_distance_matrix: (string) file name of a distance matrix. CSV format.
+    :param file_distance_matrix: (string) file name of a distance matrix. CSV, Parquet, Feather or NPY format.
     :param service_dist: (numeric) maximum service distance
     :param num_facility: (integer) number of facilities to locate
     :param list_field_req: (list of string) a list of fields in the file_distance_matrix
     :param facility_variable_name: (string) facility variable name in the coverage object
     :param workspace_path: (string) the folder path of file_distance_matrix
+    :param solver: (string) the solver to use (see solving.solve_model)
+    :param time_limit: (numeric) maximum time (seconds) to spend solving, the best solution found is used
+    :param gap: (numeric) relative MIP gap to stop solving at
     :return: (dictionary) A dictionary storing the coverage result
     """
 
     if list_field_req is None:
         list_field_req = ["facility_id", "demand_id", "demand", "distance"]
+    if os.path.splitext(file_distance_matrix)[1].lower() in FILE_FORMATS:
+        dict_coverage = generate_binary_coverage_from_dist_file(os.path.join(workspace_path, file_distance_matrix),
+                                                                service_dist, fl_variable_name=facility_variable_name,
+                                                                list_field_req=list_field_req)
+        return _solve_mclp(dict_coverage, num_facility, facility_variable_name, solver, time_limit, gap)
     # read the distance matrix
     with open(os.path.join(workspace_path, file_distance_matrix)) as csvfile:
         dict_pairwise_distance = [
@@ -108,29 +316,4 @@ def binary_mclp_distance_matrix(file_distance_matrix, service_dist, num_facility
         distance_field="distance", fl_variable_name=facility_variable_name
         )
 
-    # formulate model
-    mclp = covering.create_mclp_model(dict_coverage, {"total": num_facility})
-
-    # solve
-    mclp.solve(pulp.GLPK())
-
-    # Get the id set of facilities chosen
-    set_facility_id_chosen = set(utilities.get_ids(mclp, facility_variable_name))
-
-    # Query the demand covered from the dict_coverage
-    total_demand_covered = 0.0
-
-    for demand_id, demand_obj in dict_coverage["demand"].items():
-        # if this demand_id is covered by any facility in ids
-        if not set_facility_id_chosen.isdisjoint(demand_obj["coverage"]["facility"].keys()):
-            total_demand_covered += demand_obj["demand"]
-
-    result_coverage = {
-        "number_facility": num_facility,
-        "number_facility_chosen": len(set_facility_id_chosen),
-        "set_facility_id_chosen": set_facility_id_chosen,
-        "total_demand": dict_coverage["totalDemand"],
-        "percent_demand_coverage": (100 * total_demand_covered) /
-        dict_coverage["totalDemand"],
-        }
-    return result_coverage
+    return _solve_mclp(dict_coverage, num_facility, facility_variable_name, solver, time_limit, gap)
@@ -0,0 +1,374 @@
+# -*- coding: UTF-8 -*-
+import itertools
+import json
+import logging
+import sqlite3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS demand (
+    id TEXT PRIMARY KEY,
+    area NUMERIC,
+    demand NUMERIC,
+    serviceable_demand NUMERIC,
+    x REAL,
+    y REAL
+);
+CREATE TABLE IF NOT EXISTS facility (
+    type TEXT,
+    id TEXT,
+    x REAL,
+    y REAL,
+    PRIMARY KEY (type, id)
+);
+CREATE TABLE IF NOT EXISTS coverage (
+    demand_id TEXT,
+    facility_type TEXT,
+    facility_id TEXT,
+    value NUMERIC
+);
+"""
+
+# Created after the bulk insert, building the indexes once is much faster than updating them on every row
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS demand_xy ON demand (x, y);
+CREATE INDEX IF NOT EXISTS coverage_demand ON coverage (demand_id);
+CREATE INDEX IF NOT EXISTS coverage_facility ON coverage (facility_type, facility_id);
+"""
+
+
+class CoverageStore(object):
+    """
+    Stores a (binary or partial) coverage in a SQLite database with indexed demand/facility pair tables
+    so it can be queried, iterated and partially loaded without loading the whole coverage into memory
+    """
+
+    def __init__(self, path):
+        """
+        :param path: (string) The path of the database file (':memory:' for an in memory database)
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(_SCHEMA)
+        # Each selection gets its own temporary table so generators can be interleaved
+        self._selections = itertools.count()
+        self._undropped = []
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _get_meta(self, key):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError("'{}' not found in coverage store, has a coverage been written?".format(key))
+        return json.loads(row[0])
+
+    def write_coverage(self, coverage_dict, demand_locations=None, facility_locations=None, batch_size=10000):
+        """
+        Writes a coverage to the store (replacing any coverage already stored) with bulk inserts
+        :param coverage_dict: (dictionary) The binary or partial coverage to store
+        :param demand_locations: (dictionary) The x, y location of the demand units keyed on demand id (optional),
+            needed to query by bounding box
+        :param facility_locations: (dictionary) The x, y location of the facilities keyed on facility type then id
+            (optional)
+        :param batch_size: (int) The number of rows to insert at a time
+        :return:
+        """
+        logging.getLogger().info("Writing coverage to {}...".format(self.path))
+        with self.connection:
+            self._clear()
+            self._append(coverage_dict, demand_locations, facility_locations, batch_size)
+            self.connection.executescript(_INDEXES)
+        logging.getLogger().info("Coverage written.")
+
+    def clear(self):
+        """
+        Removes any coverage already stored
+        :return:
+        """
+        with self.connection:
+            self._clear()
+
+    def _clear(self):
+        for table in ["meta", "demand", "facility", "coverage"]:
+            self.connection.execute("DELETE FROM {}".format(table))
+
+    def append_coverage(self, coverage_dict, demand_locations=None, facility_locations=None, batch_size=10000):
+        """
+        Appends the coverage of more demand units (a tile) to the store, so a coverage too large for memory can be
+        written in parts. The demand units must not already be stored, facilities that are already stored are kept
+        and the totals are added to. Call create_indexes once all of the parts are appended
+        :param coverage_dict: (dictionary) The binary or partial coverage of the demand units
+        :param demand_locations: (dictionary) The x, y location of the demand units keyed on demand id (optional),
+            needed to query by bounding box
+        :param facility_locations: (dictionary) The x, y location of the facilities keyed on facility type then id
+            (optional)
+        :param batch_size: (int) The number of rows to insert at a time
+        :return:
+        """
+        with self.connection:
+            self._append(coverage_dict, demand_locations, facility_locations, batch_size)
+
+    def _append(self, coverage_dict, demand_locations, facility_locations, batch_size):
+        if coverage_dict["type"]["type"] not in ["binary", "partial"]:
+            raise ValueError("Expected types: '{}' got type '{}'".format(["binary", "partial"],
+                                                                         coverage_dict["type"]["type"]))
+        demand_locations = demand_locations or {}
+        facility_locations = facility_locations or {}
+        try:
+            stored_type = self._get_meta("type")
+        except KeyError:
+            stored_type = None
+        if stored_type is None:
+            self.connection.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+                ("version", json.dumps(coverage_dict.get("version"))),
+                ("type", json.dumps(coverage_dict["type"])),
+                ("totalDemand", json.dumps(0.0)),
+                ("totalServiceableDemand", json.dumps(0.0))
+            ])
+        elif stored_type != coverage_dict["type"]:
+            raise ValueError("Cannot append a coverage of type '{}' to a store of type '{}'".format(
+                coverage_dict["type"], stored_type))
+        for key in ["totalDemand", "totalServiceableDemand"]:
+            self.connection.execute("UPDATE meta SET value = ? WHERE key = ?",
+                                    (json.dumps(self._get_meta(key) + coverage_dict.get(key, 0.0)), key))
+        self._add_facilities(coverage_dict["facilities"], facility_locations)
+        demand_rows = []
+        coverage_rows = []
+        for demand_id, demand_obj in coverage_dict["demand"].items():
+            x, y = demand_locations.get(demand_id, (None, None))
+            demand_rows.append((demand_id, demand_obj.get("area", 0), demand_obj["demand"],
+                                demand_obj["serviceableDemand"], x, y))
+            for facility_type, facilities in demand_obj["coverage"].items():
+                for facility_id, value in facilities.items():
+                    coverage_rows.append((demand_id, facility_type, facility_id, value))
+            if len(demand_rows) >= batch_size:
+                self._insert(demand_rows, coverage_rows)
+                demand_rows, coverage_rows = [], []
+        self._insert(demand_rows, coverage_rows)
+
+    def add_facilities(self, facilities, facility_locations=None):
+        """
+        Adds the facilities that are not already stored (in order)
+        :param facilities: (dictionary) The facility ids keyed on facility type
+        :param facility_locations: (dictionary) The x, y location of the facilities keyed on facility type then id
+            (optional)
+        :return:
+        """
+        with self.connection:
+            self._add_facilities(facilities, facility_locations)
+
+    def _add_facilities(self, facilities, facility_locations):
+        facility_locations = facility_locations or {}
+        facility_rows = []
+        for facility_type, facility_ids in facilities.items():
+            for facility_id in facility_ids:
+                x, y = facility_locations.get(facility_type, {}).get(facility_id, (None, None))
+                facility_rows.append((facility_type, facility_id, x, y))
+        self.connection.executemany("INSERT OR IGNORE INTO facility (type, id, x, y) VALUES (?, ?, ?, ?)",
+                                    facility_rows)
+
+    def create_indexes(self):
+        """
+        Indexes the demand locations and coverage pairs (once all of the coverage is written)
+        :return:
+        """
+        self.connection.executescript(_INDEXES)
+
+    def _insert(self, demand_rows, coverage_rows):
+        self.connection.executemany(
+            "INSERT INTO demand (id, area, demand, serviceable_demand, x, y) VALUES (?, ?, ?, ?, ?, ?)", demand_rows)
+        self.connection.executemany(
+            "INSERT INTO coverage (demand_id, facility_type, facility_id, value) VALUES (?, ?, ?, ?)", coverage_rows)
+
+    def get_facilities(self):
+        """
+        :return: (dictionary) The facility ids keyed on facility type
+        """
+        facilities = {}
+        for facility_type, facility_id in self.connection.execute("SELECT type, id FROM facility ORDER BY rowid"):
+            facilities.setdefault(facility_type, []).append(facility_id)
+        return facilities
+
+    def get_facilities_covering(self, demand_id):
+        """
+        :param demand_id: (string) The id of the demand unit
+        :return: (dictionary) The coverage of the demand unit (facility ids and values keyed on facility type)
+        """
+        coverage = {}
+        for facility_type, facility_id, value in self.connection.execute(
+                "SELECT facility_type, facility_id, value FROM coverage WHERE demand_id = ?", (demand_id,)):
+            coverage.setdefault(facility_type, {})[facility_id] = value
+        return coverage
+
+    def get_demand_covered_by(self, facility_type, facility_id):
+        """
+        :param facility_type: (string) The facility type
+        :param facility_id: (string) The id of the facility
+        :return: (dictionary) The coverage values of the demand units the facility covers keyed on demand id
+        """
+        return dict(self.connection.execute(
+            "SELECT demand_id, value FROM coverage WHERE facility_type = ? AND facility_id = ?",
+            (facility_type, facility_id)))
+
+    def get_reachable_demand(self, facility_type, facility_id, use_serviceable_demand=False):
+        """
+        Finds the total demand a facility can cover (on its own)
+        For binary coverage this is the demand of every demand unit it covers, for partial coverage the sum of the
+        coverage values (the demand covered)
+        :param facility_type: (string) The facility type
+        :param facility_id: (string) The id of the facility
+        :param use_serviceable_demand: (bool) Should we use the serviceable demand rather than demand (binary only)
+        :return: (float) The reachable demand
+        """
+        if self._get_meta("type")["type"] == "partial":
+            query = "SELECT SUM(value) FROM coverage WHERE facility_type = ? AND facility_id = ?"
+        else:
+            query = "SELECT SUM(d.{}) FROM coverage c JOIN demand d ON d.id = c.demand_id " \
+                    "WHERE c.facility_type = ? AND c.facility_id = ?".format(
+                        "serviceable_demand" if use_serviceable_demand else "demand")
+        return self.connection.execute(query, (facility_type, facility_id)).fetchone()[0] or 0.0
+
+    def _select_demand(self, demand_ids=None, bbox=None):
+        """
+        Creates a temporary table of the selected demand ids so large id subsets can be joined rather than
+        passed as query parameters (drop it with _drop_selection once it is no longer used)
+        :return: (string) The name of the table (or None if everything is selected)
+        """
+        if demand_ids is None and bbox is None:
+            return None
+        table = "temp.selected_demand_{}".format(next(self._selections))
+        self.connection.execute("CREATE TEMP TABLE {} (id TEXT PRIMARY KEY)".format(table.split(".")[1]))
+        if demand_ids is not None:
+            self.connection.executemany("INSERT OR IGNORE INTO {} (id) VALUES (?)".format(table),
+                                        ((str(demand_id),) for demand_id in demand_ids))
+            if bbox is not None:
+                xmin, ymin, xmax, ymax = bbox
+                self.connection.execute(
+                    "DELETE FROM {} WHERE id NOT IN (SELECT id FROM demand "
+                    "WHERE x BETWEEN ? AND ? AND y BETWEEN ? AND ?)".format(table), (xmin, xmax, ymin, ymax))
+        else:
+            xmin, ymin, xmax, ymax = bbox
+            self.connection.execute(
+                "INSERT INTO {} (id) SELECT id FROM demand "
+                "WHERE x BETWEEN ? AND ? AND y BETWEEN ? AND ?".format(table), (xmin, xmax, ymin, ymax))
+        return table
+
+    def _drop_selection(self, table):
+        """
+        Drops a temporary selection table. A table can't be dropped while another query is running, its rows are
+        deleted and it is dropped with the next selection that is dropped instead
+        :param table: (string) The name of the table (see _select_demand)
+        :return:
+        """
+        if table is None:
+            return
+        self.connection.execute("DELETE FROM {}".format(table))
+        tables, self._undropped = self._undropped + [table], []
+        for table in tables:
+            try:
+                self.connection.execute("DROP TABLE {}".format(table))
+            except sqlite3.OperationalError:
+                self._undropped.append(table)
+
+    def iter_demand_ids(self, bbox=None):
+        """
+        :param bbox: (tuple) xmin, ymin, xmax, ymax of the demand locations to select (optional)
+        :return: (generator) The demand ids
+        """
+        if bbox is None:
+            cursor = self.connection.execute("SELECT id FROM demand ORDER BY id")
+        else:
+            xmin, ymin, xmax, ymax = bbox
+            cursor = self.connection.execute("SELECT id FROM demand WHERE x BETWEEN ? AND ? AND y BETWEEN ? AND ? "
+                                             "ORDER BY id", (xmin, xmax, ymin, ymax))
+        for row in cursor:
+            yield row[0]
+
+    def iter_demand(self, demand_ids=None, bbox=None, facility_ids=None):
+        """
+        Lazily iterates over demand units (in id order) in the format used in coverage["demand"]
+        :param demand_ids: (list) The ids of the demand units to include (optional)
+        :param bbox: (tuple) xmin, ymin, xmax, ymax of the demand locations to include (optional)
+        :param facility_ids: (dictionary) Facility ids keyed on facility type, only coverage by these
+            facilities is included (optional)
+        :return: (generator) Tuples of demand id and demand object
+        """
+        selected = self._select_demand(demand_ids, bbox)
+        query = "SELECT d.id, d.area, d.demand, d.serviceable_demand, c.facility_type, c.facility_id, c.value " \
+                "FROM demand d {} LEFT JOIN coverage c ON c.demand_id = d.id ORDER BY d.id".format(
+                    "JOIN {} s ON s.id = d.id".format(selected) if selected else "")
+        facility_types = [row[0] for row in self.connection.execute("SELECT DISTINCT type FROM facility")]
+        chosen = None
+        if facility_ids is not None:
+            chosen = set((facility_type, str(facility_id)) for facility_type in facility_ids
+                         for facility_id in facility_ids[facility_type])
+        cursor = self.connection.execute(query)
+        try:
+            for demand_id, rows in itertools.groupby(cursor, lambda row: row[0]):
+                demand_obj = None
+                for _, area, demand, serviceable_demand, facility_type, facility_id, value in rows:
+                    if demand_obj is None:
+                        demand_obj = {
+                            "area": area,
+                            "demand": demand,
+                            "serviceableDemand": serviceable_demand,
+                            "coverage": {facility_type: {} for facility_type in facility_types}
+                        }
+                    if facility_type is None or (chosen is not None and (facility_type, facility_id) not in chosen):
+                        continue
+                    demand_obj["coverage"].setdefault(facility_type, {})[facility_id] = value
+                yield demand_id, demand_obj
+        finally:
+            cursor.close()
+            self._drop_selection(selected)
+
+    def load_coverage(self, demand_ids=None, bbox=None, facility_ids=None):
+        """
+        Loads all or part of the coverage as a coverage dictionary (that can be used to create models)
+        When demand is selected, only the facilities that cover the selected demand are included
+        :param demand_ids: (list) The ids of the demand units to load (optional)
+        :param bbox: (tuple) xmin, ymin, xmax, ymax of the demand locations to load (optional)
+        :param facility_ids: (dictionary) Facility ids keyed on facility type, only these facilities are
+            loaded (optional)
+        :return: (dictionary) The coverage
+        """
+        coverage_type = self._get_meta("type")
+        facilities = self.get_facilities()
+        output = {
+            "version": self._get_meta("version"),
+            "type": coverage_type,
+            "demand": {},
+            "totalDemand": 0.0,
+            "totalServiceableDemand": 0.0,
+            "facilities": {facility_type: [] for facility_type in facilities}
+        }
+        covering = set()
+        for demand_id, demand_obj in self.iter_demand(demand_ids, bbox, facility_ids):
+            output["demand"][demand_id] = demand_obj
+            output["totalDemand"] += demand_obj["demand"]
+            output["totalServiceableDemand"] += demand_obj["serviceableDemand"]
+            for facility_type, coverage in demand_obj["coverage"].items():
+                for facility_id in coverage:
+                    covering.add((facility_type, facility_id))
+        if facility_ids is not None:
+            included = set((facility_type, str(facility_id)) for facility_type in facility_ids
+                           for facility_id in facility_ids[facility_type])
+        elif demand_ids is not None or bbox is not None:
+            included = covering
+        else:
+            included = None
+        for facility_type in facilities:
+            for facility_id in facilities[facility_type]:
+                if included is None or (facility_type, facility_id) in included:
+                    output["facilities"][facility_type].append(facility_id)
+        return output
@@ -1,5 +1,4 @@
 # -*- coding: UTF-8 -*-
-import copy
 import pulp
 
 
@@ -45,11 +44,15 @@ def merge_coverages(coverages):
     Combines multiple coverage dictionaries to form a 'master' coverage. Generally used if siting
     multiple types of facilities. Does NOT update serviceable area for partial coverage! Need to merge & dissolve all facility layers
 
+    The master coverage is built by reference: facility id lists and the per facility type coverage
+    dictionaries are shared with the input coverages rather than copied. Only the top level and per demand
+    dictionaries are new, so the master can be updated (update_serviceable_demand...) without altering the inputs.
+
     :param coverages: (list of dicts) The coverage dictionaries to combine
     :return: (dict) A nested dictionary storing the coverage relationships
     """
-    facility_types = []
-    demand_keys = []
+    facility_types = set()
+    demand_keys = None
     coverage_type = None
     for coverage in coverages:
         # make sure all coverages are of the same type (binary, partial)
@@ -57,37 +60,38 @@ def merge_coverages(coverages):
             coverage_type = coverage["type"]["type"]
         validate_coverage(coverage, ["coverage"], [coverage_type])
         # make sure all coverages contain unique facility types
-        for facility_type in coverage["facilities"].items():
+        for facility_type in coverage["facilities"].keys():
             if facility_type not in facility_types:
-                facility_types.append(facility_type)
+                facility_types.add(facility_type)
             else:
                 raise ValueError("Conflicting facility types")
-        demand_keys.append(set(coverage["demand"].keys()))
-    # Check to make sure all demand indicies are present in all coverages
-    for keys in demand_keys:
-        for keys2 in demand_keys:
-            if keys != keys2:
-                raise ValueError("Demand Keys Invalid")
-
-    master_coverage = copy.deepcopy(coverages[0])
-    for c in coverages[1:]:
-        coverage = copy.deepcopy(c)
+        # Check to make sure all demand indicies are present in all coverages
+        if demand_keys is None:
+            demand_keys = set(coverage["demand"].keys())
+        elif len(coverage["demand"]) != len(demand_keys) or not demand_keys.issuperset(coverage["demand"].keys()):
+            raise ValueError("Demand Keys Invalid")
+
+    master_coverage = dict(coverages[0])
+    master_coverage["type"] = dict(coverages[0]["type"])
+    master_coverage["facilities"] = dict(coverages[0]["facilities"])
+    master_coverage["demand"] = {}
+    for demand, demand_obj in coverages[0]["demand"].items():
+        master_demand = dict(demand_obj)
+        master_demand["coverage"] = dict(demand_obj["coverage"])
+        master_coverage["demand"][demand] = master_demand
+    for coverage in coverages[1:]:
         for facility_type in coverage["facilities"].keys():
-            if facility_type not in master_coverage["facilities"]:
-                master_coverage["facilities"][facility_type] = {}
             master_coverage["facilities"][facility_type] = coverage["facilities"][facility_type]
-
         for demand in coverage["demand"].keys():
+            master_demand = master_coverage["demand"][demand]
             for facility_type in coverage["demand"][demand]["coverage"].keys():
-                if facility_type not in master_coverage["demand"][demand]["coverage"]:
-                    master_coverage["demand"][demand]["coverage"][facility_type] = {}
-                for fac in coverage["demand"][demand]["coverage"][facility_type].keys():
-                    master_coverage["demand"][demand]["coverage"][facility_type][fac] = \
-                        coverage["demand"][demand]["coverage"][facility_type][fac]
-                    # Update serviceable demand for binary coverage
-                    if coverage_type == "Binary" and coverage["demand"][demand]["coverage"][facility_type][fac] == 1:
-                        master_coverage["demand"][demand]["serviceableDemand"] = coverage["demand"][demand]["coverage"][
-                            "demand"]
+                master_demand["coverage"][facility_type] = coverage["demand"][demand]["coverage"][facility_type]
+                # Update serviceable demand for binary coverage
+                if coverage_type == "binary" and coverage["demand"][demand]["coverage"][facility_type]:
+                    master_demand["serviceableDemand"] = master_demand["demand"]
+    if coverage_type == "binary" and "totalServiceableDemand" in master_coverage:
+        master_coverage["totalServiceableDemand"] = float(sum(demand_obj["serviceableDemand"] for demand_obj in
+                                                              master_coverage["demand"].values()))
     return master_coverage
 
 
@@ -0,0 +1,266 @@
+# -*- coding: UTF-8 -*-
+import collections
+import concurrent.futures
+import logging
+import math
+
+import pulp
+
+from pyspatialopt.models import covering, solving, utilities
+
+
+def partition_coverage(coverage_dict, max_region_facilities=50, num_regions=None):
+    """
+    Partitions the facilities of a coverage into weakly coupled regions using the coverage graph
+    (facilities are connected when they cover the same demand). Each connected component is a region,
+    components that are too big are cut into slabs following a breadth first ordering from a peripheral facility,
+    which keeps regions contiguous and the number of demand units shared between regions low
+
+    :param coverage_dict: (dictionary) The coverage to partition
+    :param max_region_facilities: (int) The maximum number of facilities in a region
+    :param num_regions: (int) The (approximate) number of regions to create, overrides max_region_facilities
+    :return: (list) The regions, each a list of (facility type, facility id) tuples
+    """
+    facilities = []
+    for facility_type in coverage_dict["facilities"]:
+        for facility_id in coverage_dict["facilities"][facility_type]:
+            facilities.append((facility_type, facility_id))
+    if num_regions:
+        max_region_facilities = int(math.ceil(len(facilities) / float(num_regions)))
+    if max_region_facilities < 1:
+        raise ValueError("max_region_facilities must be at least 1")
+    neighbors = {facility: set() for facility in facilities}
+    for demand_obj in coverage_dict["demand"].values():
+        covering_facilities = [(facility_type, facility_id) for facility_type in demand_obj["coverage"]
+                               for facility_id in demand_obj["coverage"][facility_type]]
+        for facility in covering_facilities:
+            neighbors[facility].update(covering_facilities)
+    for facility in facilities:
+        neighbors[facility].discard(facility)
+
+    def bfs(start, allowed):
+        order = [start]
+        seen = {start}
+        queue = collections.deque([start])
+        while queue:
+            for neighbor in sorted(neighbors[queue.popleft()]):
+                if neighbor in allowed and neighbor not in seen:
+                    seen.add(neighbor)
+                    order.append(neighbor)
+                    queue.append(neighbor)
+        return order
+
+    regions = []
+    assigned = set()
+    all_facilities = set(facilities)
+    for facility in facilities:
+        if facility in assigned:
+            continue
+        component = bfs(facility, all_facilities)
+        assigned.update(component)
+        if len(component) > max_region_facilities:
+            # Start from the last facility reached (a peripheral facility) so the slabs are contiguous
+            component = bfs(component[-1], set(component))
+        for i in range(0, len(component), max_region_facilities):
+            regions.append(component[i:i + max_region_facilities])
+    return regions
+
+
+def _get_region_coverage(coverage_dict, facilities, demand_ids):
+    """
+    Creates a coverage restricted to a set of facilities and demand units
+    :param coverage_dict: (dictionary) The coverage to restrict
+    :param facilities: (set) The (facility type, facility id) tuples to keep
+    :param demand_ids: (iterable) The demand ids to keep
+    :return: (dictionary) The restricted coverage
+    """
+    region_coverage = {
+        "type": coverage_dict["type"],
+        "demand": {},
+        "facilities": {facility_type: [] for facility_type in coverage_dict["facilities"]}
+    }
+    for facility_type, facility_id in facilities:
+        region_coverage["facilities"][facility_type].append(facility_id)
+    for demand_id in demand_ids:
+        demand_obj = coverage_dict["demand"][demand_id]
+        region_coverage["demand"][demand_id] = {
+            "demand": demand_obj["demand"],
+            "serviceableDemand": demand_obj["serviceableDemand"],
+            "coverage": {facility_type: {facility_id: value for facility_id, value in
+                                         demand_obj["coverage"][facility_type].items()
+                                         if (facility_type, facility_id) in facilities}
+                         for facility_type in demand_obj["coverage"]}
+        }
+    return region_coverage
+
+
+def _solve_region(region_coverage, budget, penalty, solver, solver_options, use_serviceable_demand):
+    """
+    Solves the MCLP of a region. When a penalty is given, the budget is dropped and every facility
+    used costs the penalty instead (the Lagrangian subproblem used to bound the global problem)
+    :return: (tuple) The objective, the bound and the chosen ids keyed on facility type
+    """
+    num_facilities = sum(len(ids) for ids in region_coverage["facilities"].values())
+    if budget == 0 or num_facilities == 0 or not region_coverage["demand"]:
+        return 0.0, 0.0, {}
+    prob = covering.create_mclp_model(region_coverage, {"total": num_facilities if penalty is not None else budget},
+                                      use_serviceable_demand=use_serviceable_demand)
+    variables = prob.variablesDict()
+    facility_vars = {}
+    for facility_type, ids in region_coverage["facilities"].items():
+        for facility_id in ids:
+            facility_vars[(facility_type, facility_id)] = variables["{}${}".format(facility_type, facility_id)]
+    if penalty is not None:
+        prob.setObjective(prob.objective - penalty * pulp.lpSum(facility_vars.values()))
+    result = solving.solve_model(prob, solver, **solver_options)
+    ids = {}
+    for (facility_type, facility_id), var in facility_vars.items():
+        if var.varValue is not None and var.varValue >= 1.0:
+            ids.setdefault(facility_type, []).append(facility_id)
+    objective = result["objective"] or 0.0
+    bound = result["bound"] if result["bound"] is not None else objective
+    return objective, bound, ids
+
+
+def _solve_regions(tasks, executor):
+    if executor is None:
+        return [_solve_region(*task) for task in tasks]
+    return list(executor.map(_solve_region, *zip(*tasks)))
+
+
+def solve_mclp_decomposed(coverage_dict, num_fac, max_region_facilities=50, num_regions=None, solver="glpk",
+                          solver_options=None, processes=None, max_iterations=100, use_serviceable_demand=False):
+    """
+    Solves a (binary) MCLP that is too large to solve in one model by spatial decomposition
+
+    The coverage is partitioned into weakly coupled regions (see partition_coverage) and each demand unit is assigned
+    to the region with most of the facilities that cover it. The facility budget is split between regions in
+    proportion to their demand and regional MCLPs are solved in parallel processes. The budget is then reallocated one
+    facility at a time from the region that loses the least to the region that gains the most until no move improves
+    the total. The global covered demand of the combined solution is computed on the full coverage and an upper bound
+    is found by Lagrangian relaxation of the budget constraint (every region solved without a budget where each
+    facility costs the marginal value of a facility) over all demand the region's facilities can reach.
+
+    :param coverage_dict: (dictionary) The (binary) coverage to use to generate the models
+    :param num_fac: (dictionary) The dictionary of number of facilities to use (only 'total' is supported)
+    :param max_region_facilities: (int) The maximum number of facilities in a region
+    :param num_regions: (int) The (approximate) number of regions to create, overrides max_region_facilities
+    :param solver: (string) The solver to use for the regional models (see solving.solve_model)
+    :param solver_options: (dictionary) Keyword arguments for solving.solve_model (time_limit, gap, threads)
+    :param processes: (int) The number of processes to solve regions in (None uses all cpus, 1 solves serially)
+    :param max_iterations: (int) The maximum number of budget reallocation moves
+    :param use_serviceable_demand: (bool) Should we use the serviceable demand rather than demand
+    :return: (dictionary) The chosen ids keyed on facility type, the covered demand, the bound, the relative gap
+        and the budget of every region
+    """
+    if not isinstance(num_fac, dict):
+        raise TypeError("num_fac is not a dictionary")
+    if set(num_fac.keys()) != {"total"}:
+        raise ValueError("Only a 'total' number of facilities is supported when decomposing")
+    covering.validate_coverage(coverage_dict, ["coverage"], ["binary"])
+    demand_var = "serviceableDemand" if use_serviceable_demand else "demand"
+    solver_options = solver_options or {}
+    logging.getLogger().info("Partitioning coverage...")
+    regions = partition_coverage(coverage_dict, max_region_facilities, num_regions)
+    region_of = {}
+    for r, region in enumerate(regions):
+        for facility in region:
+            region_of[facility] = r
+    # Assign each demand unit to the region with most of its covering facilities
+    owned = [[] for _ in regions]
+    reachable = [[] for _ in regions]
+    for demand_id, demand_obj in coverage_dict["demand"].items():
+        counts = collections.Counter(region_of[(facility_type, facility_id)]
+                                     for facility_type in demand_obj["coverage"]
+                                     for facility_id in demand_obj["coverage"][facility_type])
+        if counts:
+            owned[min(counts, key=lambda r: (-counts[r], r))].append(demand_id)
+            for r in counts:
+                reachable[r].append(demand_id)
+    region_sets = [set(region) for region in regions]
+    owned_coverages = [_get_region_coverage(coverage_dict, region_sets[r], owned[r]) for r in range(len(regions))]
+    logging.getLogger().info("Created {} regions".format(len(regions)))
+
+    # Initial budgets proportional to the demand of each region (largest remainder)
+    capacity = [len(region) for region in regions]
+    total = min(num_fac["total"], sum(capacity))
+    weights = [sum(coverage_dict["demand"][demand_id][demand_var] for demand_id in owned[r]) for r in range(len(regions))]
+    total_weight = float(sum(weights)) or 1.0
+    shares = [total * w / total_weight for w in weights]
+    budgets = [min(int(math.floor(share)), capacity[r]) for r, share in enumerate(shares)]
+    for r in sorted(range(len(regions)), key=lambda r: budgets[r] - shares[r]):
+        if sum(budgets) >= total:
+            break
+        if budgets[r] < capacity[r]:
+            budgets[r] += 1
+    while sum(budgets) < total:
+        r = next(r for r in range(len(regions)) if budgets[r] < capacity[r])
+        budgets[r] += 1
+
+    executor = None
+    if processes != 1 and len(regions) > 1:
+        executor = concurrent.futures.ProcessPoolExecutor(processes)
+    try:
+        values = {}
+
+        def evaluate(keys):
+            keys = [key for key in set(keys) if key not in values and 0 <= key[1] <= capacity[key[0]]]
+            tasks = [(owned_coverages[r], b, None, solver, solver_options, use_serviceable_demand) for r, b in keys]
+            for key, result in zip(keys, _solve_regions(tasks, executor)):
+                values[key] = result
+
+        iterations = 0
+        gains = losses = None
+        while True:
+            evaluate([(r, budgets[r] + d) for r in range(len(regions)) for d in (-1, 0, 1)])
+            gains = {r: values[(r, budgets[r] + 1)][0] - values[(r, budgets[r])][0]
+                     for r in range(len(regions)) if budgets[r] < capacity[r]}
+            losses = {r: values[(r, budgets[r])][0] - values[(r, budgets[r] - 1)][0]
+                      for r in range(len(regions)) if budgets[r] > 0}
+            if not gains or not losses or iterations >= max_iterations:
+                break
+            receiver = max(gains, key=lambda r: (gains[r], -r))
+            donors = [r for r in losses if r != receiver]
+            donor = min(donors, key=lambda r: (losses[r], r)) if donors else None
+            if donor is None or gains[receiver] <= losses[donor] + 1e-9:
+                break
+            logging.getLogger().info("Moving a facility from region {} to region {}".format(donor, receiver))
+            budgets[donor] -= 1
+            budgets[receiver] += 1
+            iterations += 1
+
+        ids = {}
+        for r in range(len(regions)):
+            for facility_type, facility_ids in values[(r, budgets[r])][2].items():
+                ids.setdefault(facility_type, []).extend(facility_ids)
+        for facility_type in ids:
+            ids[facility_type].sort()
+        covered_demand = utilities.get_covered_demand(coverage_dict, ids, use_serviceable_demand)["total"]
+
+        # Lagrangian bound, the price of a facility is taken between the best gain and the smallest loss
+        logging.getLogger().info("Bounding...")
+        if not gains:
+            # Every facility is used
+            penalty = 0.0
+        elif not losses:
+            penalty = max(gains.values())
+        else:
+            penalty = max(0.0, (max(gains.values()) + min(losses.values())) / 2.0)
+        tasks = [(_get_region_coverage(coverage_dict, region_sets[r], reachable[r]), capacity[r], penalty, solver,
+                  solver_options, use_serviceable_demand) for r in range(len(regions))]
+        bound = penalty * num_fac["total"] + sum(result[1] for result in _solve_regions(tasks, executor))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    bound = max(bound, covered_demand)
+    gap = (bound - covered_demand) / max(abs(covered_demand), 1e-10)
+    logging.getLogger().info("Decomposed MCLP covers {} with bound {} (gap {:.4f})".format(covered_demand, bound, gap))
+    return {
+        "ids": ids,
+        "covered_demand": covered_demand,
+        "bound": bound,
+        "gap": gap,
+        "regions": len(regions),
+        "budgets": budgets,
+        "iterations": iterations
+    }
@@ -0,0 +1,409 @@
+# -*- coding: UTF-8 -*-
+import logging
+
+
+class CoverageEvaluator(object):
+    """
+    Scores candidate sets of facilities against a (binary or partial) coverage without building or solving a model
+    The coverage is stored as a CSR matrix (demand units x facilities). Batches of candidates are scored with
+    bitsets (a bit per candidate) combined with vectorized bitwise operations, partial coverage values are summed
+    from the CSR matrix. Requires numpy
+    """
+
+    def __init__(self, coverage_dict, use_serviceable_demand=False, max_chunk_size=10000000):
+        """
+        :param coverage_dict: (dictionary) The binary or partial coverage
+        :param use_serviceable_demand: (bool) Should we use the serviceable demand rather than demand
+        :param max_chunk_size: (int) The maximum number of (candidate, coverage pair) values to hold in memory at once
+        """
+        import numpy
+
+        self.coverage_type = coverage_dict["type"]["type"]
+        if self.coverage_type not in ["binary", "partial"]:
+            raise ValueError("Expected types: '{}' got type '{}'".format(["binary", "partial"], self.coverage_type))
+        demand_var = "serviceableDemand" if use_serviceable_demand else "demand"
+        self.facilities = []
+        self.columns = {}
+        for facility_type in coverage_dict["facilities"]:
+            for facility_id in coverage_dict["facilities"][facility_type]:
+                self.columns[(facility_type, facility_id)] = len(self.facilities)
+                self.facilities.append((facility_type, facility_id))
+        self.demand_ids = list(coverage_dict["demand"].keys())
+        self.demand = numpy.array([coverage_dict["demand"][demand_id][demand_var] for demand_id in self.demand_ids],
+                                  dtype=numpy.double)
+        self.total_demand = float(self.demand.sum())
+        indptr = [0]
+        indices = []
+        values = []
+        for demand_id in self.demand_ids:
+            for facility_type, facilities in coverage_dict["demand"][demand_id]["coverage"].items():
+                for facility_id, value in facilities.items():
+                    indices.append(self.columns[(facility_type, facility_id)])
+                    values.append(value)
+            indptr.append(len(indices))
+        self.indptr = numpy.array(indptr, dtype=numpy.int64)
+        self.indices = numpy.array(indices, dtype=numpy.int64)
+        self.values = numpy.array(values, dtype=numpy.double)
+        self.max_chunk_size = max_chunk_size
+        logging.getLogger().info("Evaluator created for {} demand units, {} facilities and {} coverage pairs".format(
+            len(self.demand_ids), len(self.facilities), len(self.indices)))
+
+    def get_candidate_matrix(self, candidates):
+        """
+        Converts candidate facility sets to a boolean matrix (candidates x facilities)
+        :param candidates: (list) The candidates, each a dictionary of facility ids keyed on facility type
+            (see utilities.get_ids), or a boolean matrix that is returned as is
+        :return: (numpy.ndarray) The candidate matrix, columns are in the order of self.facilities
+        """
+        import numpy
+
+        if isinstance(candidates, numpy.ndarray):
+            if candidates.ndim != 2 or candidates.shape[1] != len(self.facilities):
+                raise ValueError("Expected a candidate matrix with {} columns".format(len(self.facilities)))
+            return candidates.astype(bool, copy=False)
+        matrix = numpy.zeros((len(candidates), len(self.facilities)), dtype=bool)
+        for row, candidate in enumerate(candidates):
+            for facility_type, facility_ids in candidate.items():
+                for facility_id in facility_ids:
+                    key = (facility_type, str(facility_id))
+                    if key not in self.columns:
+                        raise ValueError("'{}' is not a facility of type '{}'".format(facility_id, facility_type))
+                    matrix[row, self.columns[key]] = True
+        return matrix
+
+    def get_candidate_from_problem(self, problem, threshold=1.0, delineator="$"):
+        """
+        Gets the chosen facilities of a solved problem as a candidate (to validate solver output)
+        :param problem: (Pulp problem) The solved problem (created from the same coverage)
+        :param threshold: (float) The minimum value of a chosen facility variable
+        :param delineator: (string) The character(s) used to delineate the facility type from the ids
+        :return: (dictionary) The facility ids keyed on facility type
+        """
+        candidate = {}
+        for var in problem.variables():
+            parts = var.name.split(delineator)
+            if len(parts) == 2 and (parts[0], parts[1]) in self.columns:
+                if var.varValue is not None and var.varValue >= threshold:
+                    candidate.setdefault(parts[0], []).append(parts[1])
+        return candidate
+
+    def _iter_chunks(self, matrix):
+        # Each candidate needs a value per coverage pair, limit how many candidates are scored at once
+        chunk = max(1, self.max_chunk_size // max(1, len(self.indices)))
+        for start in range(0, matrix.shape[0], chunk):
+            yield start, matrix[start:start + chunk]
+
+    def _get_chunk_coverage(self, chunk):
+        import numpy
+
+        chosen = chunk[:, self.indices]
+        # Row sums from the cumulative sums at the row boundaries (also correct for empty rows)
+        cumulative = numpy.zeros((chunk.shape[0], len(self.indices) + 1), dtype=numpy.int64)
+        numpy.cumsum(chosen, axis=1, out=cumulative[:, 1:])
+        counts = cumulative[:, self.indptr[1:]] - cumulative[:, self.indptr[:-1]]
+        weighted = numpy.zeros((chunk.shape[0], len(self.indices) + 1), dtype=numpy.double)
+        numpy.cumsum(chosen * self.values, axis=1, out=weighted[:, 1:])
+        sums = weighted[:, self.indptr[1:]] - weighted[:, self.indptr[:-1]]
+        return counts, sums
+
+    def get_coverage(self, candidates):
+        """
+        Finds the coverage of each demand unit by each candidate (evaluate does not hold these in memory)
+        :param candidates: (list or numpy.ndarray) The candidates (see get_candidate_matrix)
+        :return: (tuple) Two matrices (candidates x demand units), the number of chosen facilities covering each
+            demand unit and the sum of their coverage values
+        """
+        import numpy
+
+        matrix = self.get_candidate_matrix(candidates)
+        counts = numpy.empty((matrix.shape[0], len(self.demand_ids)), dtype=numpy.int64)
+        sums = numpy.empty((matrix.shape[0], len(self.demand_ids)), dtype=numpy.double)
+        for start, chunk in self._iter_chunks(matrix):
+            counts[start:start + chunk.shape[0]], sums[start:start + chunk.shape[0]] = self._get_chunk_coverage(chunk)
+        return counts, sums
+
+    def _get_bit_coverage(self, matrix):
+        """
+        Finds which candidates cover each demand unit at least once and at least twice as bitsets
+        Each facility gets a bitset over the candidates that choose it, the bitsets of the facilities covering a
+        demand unit are then combined with bitwise operations
+        :param matrix: (numpy.ndarray) The candidate matrix
+        :return: (tuple) Two arrays (demand units x words) of candidate bits, covered once and covered twice
+        """
+        import numpy
+
+        words = (matrix.shape[0] + 63) // 64
+        facility_bits = numpy.zeros((len(self.facilities), words * 8), dtype=numpy.uint8)
+        facility_bits[:, :(matrix.shape[0] + 7) // 8] = numpy.packbits(matrix.T, axis=1, bitorder="little")
+        facility_bits = facility_bits.view(numpy.uint64)
+        once = numpy.zeros((len(self.demand_ids), words), dtype=numpy.uint64)
+        twice = numpy.zeros((len(self.demand_ids), words), dtype=numpy.uint64)
+        degree = numpy.diff(self.indptr)
+        # The k-th covering facility of every demand unit (that has one) at a time
+        for k in range(int(degree.max()) if len(degree) else 0):
+            rows = numpy.nonzero(degree > k)[0]
+            bits = facility_bits[self.indices[self.indptr[rows] + k]]
+            twice[rows] |= once[rows] & bits
+            once[rows] |= bits
+        return once, twice
+
+    def _sum_bits(self, bits, num_candidates):
+        """
+        :return: (tuple) The number of demand units and the demand with the candidate bit set, for each candidate
+        """
+        import numpy
+
+        counts = numpy.zeros(num_candidates, dtype=numpy.int64)
+        sums = numpy.zeros(num_candidates)
+        chunk = max(1, self.max_chunk_size // max(1, num_candidates))
+        for start in range(0, bits.shape[0], chunk):
+            unpacked = numpy.unpackbits(bits[start:start + chunk].view(numpy.uint8), axis=1,
+                                        bitorder="little")[:, :num_candidates]
+            counts += unpacked.sum(axis=0, dtype=numpy.int64)
+            sums += self.demand[start:start + chunk].dot(unpacked)
+        return counts, sums
+
+    def evaluate(self, candidates, psi=None):
+        """
+        Scores candidate facility sets
+        Binary coverage: a demand unit is covered when at least one chosen facility covers it and backed up when at
+        least two do. Partial coverage: the coverage values of the chosen facilities are summed and capped at the
+        demand (as in the MCLPCC model)
+        :param candidates: (list or numpy.ndarray) The candidates (see get_candidate_matrix)
+        :param psi: (float) The threshold (0-100%) of demand that must be covered, as in the threshold models
+        :return: (dictionary) Arrays with a value for each candidate: number of facilities, covered demand,
+            percent covered, number of demand units covered, demand covered at least twice (backup),
+            number of demand units covered at least twice and whether the threshold is met (if psi is given)
+        """
+        import numpy
+
+        matrix = self.get_candidate_matrix(candidates)
+        output = {
+            "num_facilities": matrix.sum(axis=1),
+            "covered_demand": numpy.zeros(matrix.shape[0]),
+            "covered_count": numpy.zeros(matrix.shape[0], dtype=numpy.int64),
+            "backup_demand": numpy.zeros(matrix.shape[0]),
+            "backup_count": numpy.zeros(matrix.shape[0], dtype=numpy.int64)
+        }
+        # Bitsets hold a bit per candidate for every demand unit, limit how many candidates are scored at once
+        chunk = max(64, 64 * (self.max_chunk_size // max(1, 64 * len(self.demand_ids))))
+        for start in range(0, matrix.shape[0], chunk):
+            end = min(start + chunk, matrix.shape[0])
+            once, twice = self._get_bit_coverage(matrix[start:end])
+            output["covered_count"][start:end], output["covered_demand"][start:end] = self._sum_bits(once, end - start)
+            output["backup_count"][start:end], output["backup_demand"][start:end] = self._sum_bits(twice, end - start)
+        if self.coverage_type == "partial":
+            # The demand covered depends on the coverage values, not only on which demand units are covered
+            for start, chunk in self._iter_chunks(matrix):
+                _, sums = self._get_chunk_coverage(chunk)
+                output["covered_demand"][start:start + chunk.shape[0]] = numpy.minimum(sums, self.demand).sum(axis=1)
+        if self.total_demand > 0:
+            output["percent_covered"] = 100 * output["covered_demand"] / self.total_demand
+        else:
+            output["percent_covered"] = numpy.zeros(matrix.shape[0])
+        if psi is not None:
+            output["threshold_met"] = output["percent_covered"] >= psi
+        return output
+
+
+class WhatIfSession(object):
+    """
+    Tracks the coverage of a set of open facilities as facilities are opened and closed one at a time
+    Each update only visits the demand units the toggled facility covers (and the facilities covering those), so the
+    covered demand, backup coverage and the marginal value of every facility stay current without recomputing
+    Binary coverage: a demand unit is covered by at least one open facility and backed up by at least two
+    Partial coverage: the coverage values of the open facilities are summed and capped at the demand
+    """
+
+    def __init__(self, coverage_dict, open_facilities=None, use_serviceable_demand=False):
+        """
+        :param coverage_dict: (dictionary) The binary or partial coverage
+        :param open_facilities: (dictionary) The facility ids that start open keyed on facility type
+        :param use_serviceable_demand: (bool) Should we use the serviceable demand rather than demand
+        """
+        self.coverage_type = coverage_dict["type"]["type"]
+        if self.coverage_type not in ["binary", "partial"]:
+            raise ValueError("Expected types: '{}' got type '{}'".format(["binary", "partial"], self.coverage_type))
+        demand_var = "serviceableDemand" if use_serviceable_demand else "demand"
+        self.demand = {}
+        self.demand_coverage = {}
+        self.facility_coverage = {}
+        for facility_type in coverage_dict["facilities"]:
+            for facility_id in coverage_dict["facilities"][facility_type]:
+                self.facility_coverage[(facility_type, facility_id)] = []
+        for demand_id, demand_obj in coverage_dict["demand"].items():
+            self.demand[demand_id] = demand_obj[demand_var]
+            self.demand_coverage[demand_id] = []
+            for facility_type, facilities in demand_obj["coverage"].items():
+                for facility_id, value in facilities.items():
+                    self.demand_coverage[demand_id].append(((facility_type, facility_id), value))
+                    self.facility_coverage[(facility_type, facility_id)].append((demand_id, value))
+        self.open = set()
+        self.counts = dict.fromkeys(self.demand, 0)
+        self.sums = dict.fromkeys(self.demand, 0.0)
+        self.covered_demand = 0.0
+        self.covered_count = 0
+        self.backup_demand = 0.0
+        self.backup_count = 0
+        self.history = []
+        for facility_type, facility_ids in (open_facilities or {}).items():
+            for facility_id in facility_ids:
+                self._toggle((facility_type, str(facility_id)), update_marginals=False)
+        # The marginals are computed once, then updated by each toggle
+        self.marginals = dict.fromkeys(self.facility_coverage, 0.0)
+        for demand_id in self.demand:
+            for facility, value in self.demand_coverage[demand_id]:
+                self.marginals[facility] += self._get_contribution(demand_id, facility, value)
+
+    def _get_covered(self, demand_id, count, total):
+        if self.coverage_type == "binary":
+            return self.demand[demand_id] if count > 0 else 0.0
+        return min(total, self.demand[demand_id])
+
+    def _get_contribution(self, demand_id, facility, value):
+        """
+        :return: (float) The change in the demand covered at a demand unit if the facility were toggled
+        """
+        count = self.counts[demand_id]
+        total = self.sums[demand_id]
+        if facility in self.open:
+            return self._get_covered(demand_id, count, total) - self._get_covered(demand_id, count - 1, total - value)
+        return self._get_covered(demand_id, count + 1, total + value) - self._get_covered(demand_id, count, total)
+
+    def _update_marginals(self, facility, sign):
+        for demand_id, _ in self.facility_coverage[facility]:
+            for other, other_value in self.demand_coverage[demand_id]:
+                self.marginals[other] += sign * self._get_contribution(demand_id, other, other_value)
+
+    def _toggle(self, facility, update_marginals=True):
+        if facility not in self.facility_coverage:
+            raise ValueError("'{}' is not a facility of type '{}'".format(facility[1], facility[0]))
+        opening = facility not in self.open
+        if self.coverage_type == "binary":
+            self._toggle_binary(facility, opening, update_marginals)
+            return
+        # Only the contributions at the demand units the facility covers change
+        if update_marginals:
+            self._update_marginals(facility, -1)
+        for demand_id, value in self.facility_coverage[facility]:
+            count = self.counts[demand_id]
+            total = self.sums[demand_id]
+            new_count = count + 1 if opening else count - 1
+            new_total = total + value if opening else total - value
+            self.covered_demand += self._get_covered(demand_id, new_count, new_total) - \
+                self._get_covered(demand_id, count, total)
+            self.covered_count += (new_count > 0) - (count > 0)
+            self.backup_count += (new_count > 1) - (count > 1)
+            self.backup_demand += self.demand[demand_id] * ((new_count > 1) - (count > 1))
+            self.counts[demand_id] = new_count
+            self.sums[demand_id] = new_total
+        if opening:
+            self.open.add(facility)
+        else:
+            self.open.discard(facility)
+        if update_marginals:
+            self._update_marginals(facility, 1)
+
+    def _toggle_binary(self, facility, opening, update_marginals):
+        """
+        Binary coverage only changes the marginals when a demand unit goes between 0 and 1 or 1 and 2 open facilities
+        (the facility's own marginal never changes)
+        """
+        for demand_id, _ in self.facility_coverage[facility]:
+            count = self.counts[demand_id]
+            demand = self.demand[demand_id]
+            new_count = count + 1 if opening else count - 1
+            if update_marginals and min(count, new_count) < 2:
+                if min(count, new_count) == 0:
+                    # The other (closed) facilities gain or lose the demand unit as a possible gain
+                    sign = -1 if opening else 1
+                    for other, _ in self.demand_coverage[demand_id]:
+                        if other != facility:
+                            self.marginals[other] += sign * demand
+                else:
+                    # The single other open facility gains or loses the demand unit as its unique coverage
+                    sign = -1 if opening else 1
+                    for other, _ in self.demand_coverage[demand_id]:
+                        if other != facility and other in self.open:
+                            self.marginals[other] += sign * demand
+            if count == 0 or new_count == 0:
+                self.covered_demand += demand if opening else -demand
+                self.covered_count += 1 if opening else -1
+            elif count == 1 or new_count == 1:
+                self.backup_demand += demand if opening else -demand
+                self.backup_count += 1 if opening else -1
+            self.counts[demand_id] = new_count
+        if opening:
+            self.open.add(facility)
+        else:
+            self.open.discard(facility)
+
+    def get_summary(self):
+        """
+        :return: (dictionary) The number of open facilities, covered demand, number of demand units covered and the
+            demand and number of demand units covered at least twice (backup)
+        """
+        return {
+            "num_facilities": len(self.open),
+            "covered_demand": self.covered_demand,
+            "covered_count": self.covered_count,
+            "backup_demand": self.backup_demand,
+            "backup_count": self.backup_count
+        }
+
+    def toggle(self, facility_type, facility_id):
+        """
+        Opens a closed facility or closes an open facility
+        :param facility_type: (string) The facility type
+        :param facility_id: (string) The id of the facility
+        :return: (dictionary) The summary after the update (see get_summary)
+        """
+        facility = (facility_type, str(facility_id))
+        self._toggle(facility)
+        self.history.append(facility)
+        return self.get_summary()
+
+    def open_facility(self, facility_type, facility_id):
+        """
+        Opens a facility (does nothing if it is already open)
+        :return: (dictionary) The summary after the update (see get_summary)
+        """
+        if (facility_type, str(facility_id)) in self.open:
+            return self.get_summary()
+        return self.toggle(facility_type, facility_id)
+
+    def close_facility(self, facility_type, facility_id):
+        """
+        Closes a facility (does nothing if it is already closed)
+        :return: (dictionary) The summary after the update (see get_summary)
+        """
+        if (facility_type, str(facility_id)) not in self.open:
+            return self.get_summary()
+        return self.toggle(facility_type, facility_id)
+
+    def undo(self):
+        """
+        Reverts the last toggle
+        :return: (dictionary) The summary after the update (see get_summary)
+        """
+        if not self.history:
+            raise IndexError("Nothing to undo")
+        self._toggle(self.history.pop())
+        return self.get_summary()
+
+    def get_marginal(self, facility_type, facility_id):
+        """
+        :param facility_type: (string) The facility type
+        :param facility_id: (string) The id of the facility
+        :return: (float) The demand that would be lost by closing the facility (if open) or gained by opening it
+        """
+        return self.marginals[(facility_type, str(facility_id))]
+
+    def get_open_facilities(self):
+        """
+        :return: (dictionary) The open facility ids keyed on facility type
+        """
+        open_facilities = {}
+        for facility_type, facility_id in sorted(self.open):
+            open_facilities.setdefault(facility_type, []).append(facility_id)
+        return open_facilities
@@ -0,0 +1,241 @@
+# -*- coding: UTF-8 -*-
+import logging
+
+import pulp
+
+from pyspatialopt.models import covering, decomposition, solving, utilities
+
+MODEL_TYPES = ["mclp", "lscp"]
+
+
+def cluster_demand(locations, num_clusters, seed=0):
+    """
+    Groups demand units into spatial clusters (k-means on the demand locations, requires scipy) so they can be
+    aggregated when no parent id (tract, block group...) is available
+    :param locations: (dictionary) The (x, y) location of each demand unit keyed on demand id
+    :param num_clusters: (int) The number of clusters to create
+    :param seed: (int) The seed of the random initial centers
+    :return: (dictionary) The cluster (parent id) of each demand unit keyed on demand id
+    """
+    import numpy
+    import scipy.cluster.vq
+    if num_clusters < 1:
+        raise ValueError("num_clusters must be at least 1")
+    demand_ids = list(locations.keys())
+    points = numpy.asarray([locations[demand_id] for demand_id in demand_ids], dtype=numpy.float64).reshape(-1, 2)
+    num_clusters = min(num_clusters, len(demand_ids))
+    _, labels = scipy.cluster.vq.kmeans2(points, num_clusters, minit="++", seed=seed)
+    return {demand_id: str(label) for demand_id, label in zip(demand_ids, labels)}
+
+
+def aggregate_coverage(coverage_dict, parent_ids):
+    """
+    Aggregates the demand units of a binary coverage into their parents. The demand of a parent is the sum of the
+    demand of its children and a parent is covered by every facility that covers any of its children, so the coarse
+    MCLP objective is an upper bound (and the coarse LSCP objective a lower bound) of the full resolution problem
+    :param coverage_dict: (dictionary) The binary coverage to aggregate
+    :param parent_ids: (dictionary) The parent id of each demand unit keyed on demand id
+    :return: (dictionary) The aggregated coverage, demand ids are the parent ids
+    """
+    covering.validate_coverage(coverage_dict, ["coverage"], ["binary"])
+    missing = [demand_id for demand_id in coverage_dict["demand"] if demand_id not in parent_ids]
+    if missing:
+        raise ValueError("{} demand units have no parent id (e.g. '{}')".format(len(missing), missing[0]))
+    coarse_coverage = {
+        "version": coverage_dict.get("version"),
+        "type": coverage_dict["type"],
+        "demand": {},
+        "totalDemand": coverage_dict.get("totalDemand"),
+        "totalServiceableDemand": coverage_dict.get("totalServiceableDemand"),
+        "facilities": coverage_dict["facilities"]
+    }
+    for demand_id, demand_obj in coverage_dict["demand"].items():
+        parent_id = str(parent_ids[demand_id])
+        if parent_id not in coarse_coverage["demand"]:
+            coarse_coverage["demand"][parent_id] = {
+                "demand": 0,
+                "serviceableDemand": 0,
+                "coverage": {facility_type: {} for facility_type in coverage_dict["facilities"]}
+            }
+        parent = coarse_coverage["demand"][parent_id]
+        parent["demand"] += demand_obj["demand"]
+        parent["serviceableDemand"] += demand_obj["serviceableDemand"]
+        for facility_type in demand_obj["coverage"]:
+            parent["coverage"].setdefault(facility_type, {}).update(demand_obj["coverage"][facility_type])
+    return coarse_coverage
+
+
+def get_neighbourhood(coverage_dict, ids, neighbourhood=1):
+    """
+    Finds the facilities near a solution: the chosen facilities and those that cover the same demand, repeated
+    neighbourhood times
+    :param coverage_dict: (dictionary) The binary coverage
+    :param ids: (dictionary) The chosen facility ids keyed on facility type
+    :param neighbourhood: (int) The number of steps through shared demand to take (0 keeps only the chosen facilities)
+    :return: (set) The (facility type, facility id) tuples in the neighbourhood
+    """
+    candidates = {(facility_type, facility_id) for facility_type in ids for facility_id in ids[facility_type]}
+    frontier = set(candidates)
+    for _ in range(neighbourhood):
+        found = set()
+        for demand_obj in coverage_dict["demand"].values():
+            covering_facilities = [(facility_type, facility_id) for facility_type in demand_obj["coverage"]
+                                   for facility_id in demand_obj["coverage"][facility_type]]
+            if any(facility in frontier for facility in covering_facilities):
+                found.update(covering_facilities)
+        frontier = found - candidates
+        if not frontier:
+            break
+        candidates.update(frontier)
+    return candidates
+
+
+def _get_mip_start(coverage_dict, ids, delineator):
+    """
+    Gets the values of the full resolution model variables for a set of facilities
+    :return: (dictionary) The variable values keyed on variable name
+    """
+    chosen = {(facility_type, facility_id) for facility_type in ids for facility_id in ids[facility_type]}
+    mip_start = {}
+    for facility_type in coverage_dict["facilities"]:
+        for facility_id in coverage_dict["facilities"][facility_type]:
+            name = pulp.LpVariable("{}{}{}".format(facility_type, delineator, facility_id)).name
+            mip_start[name] = 1 if (facility_type, facility_id) in chosen else 0
+    for demand_id, demand_obj in coverage_dict["demand"].items():
+        covered = any((facility_type, facility_id) in chosen for facility_type in demand_obj["coverage"]
+                      for facility_id in demand_obj["coverage"][facility_type])
+        mip_start[pulp.LpVariable("Y{}{}".format(delineator, demand_id)).name] = 1 if covered else 0
+    return mip_start
+
+
+def _repair_cover(coverage_dict, ids, candidates):
+    """
+    Adds facilities (greedily, the one covering the most uncovered demand units first) until every demand unit is
+    covered so the coarse LSCP solution can be used as a start at full resolution. Facilities that cover uncovered
+    demand units are added to the candidates
+    :return: (dictionary) The repaired ids keyed on facility type
+    """
+    chosen = {(facility_type, facility_id) for facility_type in ids for facility_id in ids[facility_type]}
+    uncovered = {}
+    for demand_id, demand_obj in coverage_dict["demand"].items():
+        covering_facilities = {(facility_type, facility_id) for facility_type in demand_obj["coverage"]
+                               for facility_id in demand_obj["coverage"][facility_type]}
+        if covering_facilities and not covering_facilities & chosen:
+            uncovered[demand_id] = covering_facilities
+            candidates.update(covering_facilities)
+    while uncovered:
+        counts = {}
+        for covering_facilities in uncovered.values():
+            for facility in covering_facilities:
+                counts[facility] = counts.get(facility, 0) + 1
+        facility = max(sorted(counts), key=lambda f: counts[f])
+        chosen.add(facility)
+        uncovered = {demand_id: covering_facilities for demand_id, covering_facilities in uncovered.items()
+                     if facility not in covering_facilities}
+    repaired = {}
+    for facility_type, facility_id in sorted(chosen):
+        repaired.setdefault(facility_type, []).append(facility_id)
+    return repaired
+
+
+def _solve(coverage_dict, model_type, num_fac, solver, solver_options, use_serviceable_demand, delineator,
+           mip_start=None):
+    if model_type == "mclp":
+        problem = covering.create_mclp_model(coverage_dict, num_fac, delineator=delineator,
+                                             use_serviceable_demand=use_serviceable_demand)
+    else:
+        problem = covering.create_lscp_model(coverage_dict, delineator=delineator)
+    result = solving.solve_model(problem, solver, mip_start=mip_start, **solver_options)
+    result["ids"] = {facility_type: utilities.get_ids(problem, facility_type, delineator=delineator)
+                     for facility_type in coverage_dict["facilities"]}
+    return result
+
+
+def solve_hierarchical(coverage_dict, model_type="mclp", num_fac=None, parent_ids=None, locations=None,
+                       num_clusters=None, neighbourhood=1, solver="glpk", solver_options=None,
+                       use_serviceable_demand=False, delineator="$"):
+    """
+    Solves a (binary) MCLP or LSCP with fine grained demand (blocks...) by aggregating then refining
+
+    The demand units are aggregated into their parents (a user supplied parent id such as the tract, or spatial
+    clusters of the demand locations) and the coarse problem is solved. The candidate facilities are then restricted
+    to the neighbourhood of the coarse solution (see get_neighbourhood) and the problem is solved at full resolution,
+    starting from the coarse solution. The coarse bound is a bound of the full resolution problem (upper for the MCLP,
+    lower for the LSCP) so the gap to it is reported
+
+    :param coverage_dict: (dictionary) The (binary) coverage to use to generate the models
+    :param model_type: (string) ['mclp', 'lscp'] The model to solve
+    :param num_fac: (dictionary) The dictionary of number of facilities to use (MCLP only)
+    :param parent_ids: (dictionary) The parent id of each demand unit keyed on demand id
+    :param locations: (dictionary) The (x, y) location of each demand unit keyed on demand id, clustered when no
+        parent ids are given (see cluster_demand)
+    :param num_clusters: (int) The number of clusters to create from the locations
+    :param neighbourhood: (int) The number of steps through shared demand from the coarse solution to keep candidates
+    :param solver: (string) The solver to use (see solving.solve_model)
+    :param solver_options: (dictionary) Keyword arguments for solving.solve_model (time_limit, gap, threads)
+    :param use_serviceable_demand: (bool) Should we use the serviceable demand rather than demand (MCLP only)
+    :param delineator: (string) The character(s) to use to delineate the layer from the ids
+    :return: (dictionary) The chosen ids keyed on facility type, the objective, the coarse objective and bound,
+        the relative gap to the coarse bound, the number of coarse demand units and candidate facilities, the ids
+        chosen by the coarse problem and the solve results of both levels
+    """
+    if model_type not in MODEL_TYPES:
+        raise ValueError("'{}' is not a supported model type, expected one of {}".format(model_type, MODEL_TYPES))
+    if model_type == "mclp" and not isinstance(num_fac, dict):
+        raise TypeError("num_fac is not a dictionary")
+    if parent_ids is None:
+        if locations is None or not num_clusters:
+            raise ValueError("Either parent_ids or locations and num_clusters are required")
+        logging.getLogger().info("Clustering demand...")
+        parent_ids = cluster_demand(locations, num_clusters)
+    solver_options = solver_options or {}
+    coarse_coverage = aggregate_coverage(coverage_dict, parent_ids)
+    logging.getLogger().info("Solving coarse {} with {} demand units...".format(model_type,
+                                                                                 len(coarse_coverage["demand"])))
+    coarse = _solve(coarse_coverage, model_type, num_fac, solver, solver_options, use_serviceable_demand, delineator)
+    if coarse["objective"] is None:
+        raise ValueError("The coarse {} could not be solved ({})".format(model_type, coarse["status"]))
+    coarse_ids = coarse["ids"]
+
+    candidates = get_neighbourhood(coverage_dict, coarse_ids, neighbourhood)
+    start_ids = coarse_ids
+    if model_type == "lscp":
+        start_ids = _repair_cover(coverage_dict, coarse_ids, candidates)
+        demand_ids = list(coverage_dict["demand"].keys())
+    else:
+        # Demand that no candidate covers can't be covered, it is left out of the model
+        demand_ids = [demand_id for demand_id, demand_obj in coverage_dict["demand"].items()
+                      if any((facility_type, facility_id) in candidates for facility_type in demand_obj["coverage"]
+                             for facility_id in demand_obj["coverage"][facility_type])]
+    fine_coverage = decomposition._get_region_coverage(coverage_dict, candidates, demand_ids)
+    for facility_type in fine_coverage["facilities"]:
+        fine_coverage["facilities"][facility_type].sort()
+    logging.getLogger().info("Solving {} with {} demand units and {} candidate facilities...".format(
+        model_type, len(demand_ids), len(candidates)))
+    fine = _solve(fine_coverage, model_type, num_fac, solver, solver_options, use_serviceable_demand, delineator,
+                  _get_mip_start(fine_coverage, start_ids, delineator))
+    if fine["objective"] is None:
+        raise ValueError("The {} could not be solved ({})".format(model_type, fine["status"]))
+
+    objective = fine["objective"]
+    bound = coarse["bound"] if coarse["bound"] is not None else coarse["objective"]
+    if model_type == "mclp":
+        bound = max(bound, objective)
+        gap = (bound - objective) / max(abs(objective), 1e-10)
+    else:
+        bound = min(bound, objective)
+        gap = (objective - bound) / max(abs(objective), 1e-10)
+    logging.getLogger().info("Hierarchical {} objective {} with coarse bound {} (gap {:.4f})".format(
+        model_type, objective, bound, gap))
+    return {
+        "ids": fine["ids"],
+        "objective": objective,
+        "coarse_objective": coarse["objective"],
+        "bound": bound,
+        "gap": gap,
+        "coarse_demand": len(coarse_coverage["demand"]),
+        "candidates": len(candidates),
+        "coarse_ids": coarse_ids,
+        "coarse": coarse,
+        "fine": fine
+    }
@@ -0,0 +1,158 @@
+# -*- coding: UTF-8 -*-
+import logging
+
+import pulp
+
+
+def _get_status(model_status, has_solution, highspy):
+    """
+    Maps a HiGHS model status onto the pulp status codes
+    :param model_status: (highspy.HighsModelStatus) The status reported by HiGHS
+    :param has_solution: (bool) Was a primal solution (incumbent) found
+    :param highspy: (module) The highspy module
+    :return: (tuple) The pulp status and solution status
+    """
+    if model_status == highspy.HighsModelStatus.kOptimal:
+        return pulp.LpStatusOptimal, 1
+    if model_status == highspy.HighsModelStatus.kInfeasible:
+        return pulp.LpStatusInfeasible, -1
+    if model_status in (highspy.HighsModelStatus.kUnbounded, highspy.HighsModelStatus.kUnboundedOrInfeasible):
+        return pulp.LpStatusUnbounded, -2
+    if has_solution:
+        # Stopped early (time limit...) with an incumbent
+        return pulp.LpStatusOptimal, 2
+    return pulp.LpStatusNotSolved, 0
+
+
+def build_highs_lp(problem):
+    """
+    Converts a pulp problem into a HiGHS model. The constraint matrix is passed row-wise as CSR arrays
+    :param problem: (Pulp problem) The problem to convert (generally created by the covering module)
+    :return: (tuple) The highspy.HighsLp and the list of pulp variables in column order
+    """
+    import highspy
+    import numpy
+
+    variables = problem.variables()
+    columns = {}
+    for i, var in enumerate(variables):
+        columns[var.name] = i
+    inf = highspy.kHighsInf
+    lp = highspy.HighsLp()
+    lp.num_col_ = len(variables)
+    lp.num_row_ = len(problem.constraints)
+    # Columns
+    col_cost = numpy.zeros(len(variables), dtype=numpy.double)
+    if problem.objective is not None:
+        for var, coefficient in problem.objective.items():
+            col_cost[columns[var.name]] = coefficient
+    lp.col_cost_ = col_cost
+    lp.col_lower_ = numpy.array([-inf if var.lowBound is None else var.lowBound for var in variables],
+                                dtype=numpy.double)
+    lp.col_upper_ = numpy.array([inf if var.upBound is None else var.upBound for var in variables],
+                                dtype=numpy.double)
+    lp.integrality_ = [highspy.HighsVarType.kInteger if var.cat == pulp.LpInteger else
+                       highspy.HighsVarType.kContinuous for var in variables]
+    if problem.sense == pulp.LpMaximize:
+        lp.sense_ = highspy.ObjSense.kMaximize
+    # Rows, each constraint is stored as expression + constant (sense) 0
+    row_lower = numpy.empty(len(problem.constraints), dtype=numpy.double)
+    row_upper = numpy.empty(len(problem.constraints), dtype=numpy.double)
+    start = numpy.empty(len(problem.constraints) + 1, dtype=numpy.int32)
+    index = []
+    value = []
+    start[0] = 0
+    for row, constraint in enumerate(problem.constraints.values()):
+        for var, coefficient in constraint.items():
+            index.append(columns[var.name])
+            value.append(coefficient)
+        start[row + 1] = len(index)
+        rhs = -constraint.constant
+        if constraint.sense == pulp.LpConstraintLE:
+            row_lower[row], row_upper[row] = -inf, rhs
+        elif constraint.sense == pulp.LpConstraintGE:
+            row_lower[row], row_upper[row] = rhs, inf
+        else:
+            row_lower[row], row_upper[row] = rhs, rhs
+    lp.row_lower_ = row_lower
+    lp.row_upper_ = row_upper
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kRowwise
+    lp.a_matrix_.num_col_ = lp.num_col_
+    lp.a_matrix_.num_row_ = lp.num_row_
+    lp.a_matrix_.start_ = start
+    lp.a_matrix_.index_ = numpy.array(index, dtype=numpy.int32)
+    lp.a_matrix_.value_ = numpy.array(value, dtype=numpy.double)
+    return lp, variables
+
+
+def solve_highs(problem, time_limit=None, mip_rel_gap=None, threads=None, msg=False, mip_start=None):
+    """
+    Solves a pulp problem with HiGHS in memory (through highspy) instead of writing an .lp/.mps file and
+    calling a solver executable. The solution is written back to the problem so utilities.get_ids etc work as usual
+    :param problem: (Pulp problem) The problem to solve (generally created by the covering module)
+    :param time_limit: (float) The maximum time (seconds) to spend solving
+    :param mip_rel_gap: (float) The relative MIP gap to stop at
+    :param threads: (int) The number of threads HiGHS can use
+    :param msg: (bool) Should the HiGHS log be output
+    :param mip_start: (dictionary) Starting values keyed on variable name, missing variables start at their lower bound
+    :return: (int) The pulp status of the problem
+    """
+    return run_highs(problem, time_limit, mip_rel_gap, threads, msg, mip_start)["status"]
+
+
+def run_highs(problem, time_limit=None, mip_rel_gap=None, threads=None, msg=False, mip_start=None):
+    """
+    Solves a pulp problem with HiGHS in memory and reports the solve statistics (see solve_highs)
+    :param problem: (Pulp problem) The problem to solve (generally created by the covering module)
+    :param time_limit: (float) The maximum time (seconds) to spend solving
+    :param mip_rel_gap: (float) The relative MIP gap to stop at
+    :param threads: (int) The number of threads HiGHS can use
+    :param msg: (bool) Should the HiGHS log be output
+    :param mip_start: (dictionary) Starting values keyed on variable name, missing variables start at their lower bound
+    :return: (dictionary) The pulp status, the best bound, the relative gap and whether the time limit was reached
+    """
+    try:
+        import highspy
+    except ImportError:
+        raise ImportError("highspy is required to solve with HiGHS (pip install highspy)")
+    logging.getLogger().info("Passing model to HiGHS...")
+    lp, variables = build_highs_lp(problem)
+    highs = highspy.Highs()
+    highs.setOptionValue("output_flag", bool(msg))
+    if time_limit is not None:
+        highs.setOptionValue("time_limit", float(time_limit))
+    if mip_rel_gap is not None:
+        highs.setOptionValue("mip_rel_gap", float(mip_rel_gap))
+    if threads is not None:
+        highs.setOptionValue("threads", int(threads))
+    highs.passModel(lp)
+    if mip_start:
+        start = highspy.HighsSolution()
+        start.col_value = [mip_start.get(var.name, var.lowBound or 0) for var in variables]
+        start.value_valid = True
+        highs.setSolution(start)
+    logging.getLogger().info("Solving with HiGHS...")
+    highs.run()
+    model_status = highs.getModelStatus()
+    info = highs.getInfo()
+    has_solution = info.primal_solution_status == highspy.SolutionStatus.kSolutionStatusFeasible
+    if has_solution:
+        for var, value in zip(variables, highs.getSolution().col_value):
+            if var.cat == pulp.LpInteger:
+                value = round(value)
+            var.varValue = value
+    problem.status, problem.sol_status = _get_status(model_status, has_solution, highspy)
+    logging.getLogger().info("HiGHS finished with status: {}".format(highs.modelStatusToString(model_status)))
+    is_mip = any(var.cat == pulp.LpInteger for var in variables)
+    if not has_solution:
+        bound = None
+    elif is_mip:
+        bound = info.mip_dual_bound
+    else:
+        bound = info.objective_function_value
+    return {
+        "status": problem.status,
+        "bound": bound,
+        "gap": info.mip_gap if is_mip and has_solution else None,
+        "timed_out": model_status == highspy.HighsModelStatus.kTimeLimit
+    }
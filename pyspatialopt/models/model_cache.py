@@ -0,0 +1,183 @@
+# -*- coding: UTF-8 -*-
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+import pulp
+
+from pyspatialopt.models import covering, solving, utilities
+
+# The model builders that can be cached keyed on model type
+MODEL_TYPES = {
+    "mclp": covering.create_mclp_model,
+    "mclp_cc": covering.create_mclp_cc_model,
+    "threshold": covering.create_threshold_model,
+    "cc_threshold": covering.create_cc_threshold_model,
+    "backup": covering.create_backup_model,
+    "lscp": covering.create_lscp_model,
+    "traumah": covering.create_traumah_model,
+    "bclpcc": covering.create_bclpcc_model
+}
+
+
+def _get_hash(value):
+    # Sorted keys and no whitespace so equal content always serializes (and hashes) the same
+    return hashlib.sha256(json.dumps(value, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def get_coverage_hash(coverage_dict):
+    """
+    Calculates a canonical hash of the content of a coverage, independent of the order of the keys
+    :param coverage_dict: (dictionary) The coverage
+    :return: (string) The sha256 hex digest
+    """
+    return _get_hash(coverage_dict)
+
+
+def _replace(source, destination):
+    # os.replace is Python 3 only, os.rename doesn't replace an existing file on Windows
+    if hasattr(os, "replace"):
+        os.replace(source, destination)
+    else:
+        if os.name == "nt" and os.path.exists(destination):
+            os.remove(destination)
+        os.rename(source, destination)
+
+
+class ModelCache(object):
+    """
+    A size bounded cache on local disk of built models (MPS files) and their solutions, keyed on the hash of the
+    coverage content, the model type and its parameters. Solutions are also keyed on the solver settings, so changing
+    only the solver settings reuses the model file. The least recently used files are evicted once the cache is
+    larger than max_size
+    """
+
+    def __init__(self, directory, max_size=2 ** 30):
+        """
+        :param directory: (string) The directory to store the cache in (created if it doesn't exist)
+        :param max_size: (int) The maximum size of the cache in bytes
+        """
+        self.directory = directory
+        self.max_size = max_size
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _get_path(self, key, extension):
+        return os.path.join(self.directory, "{}{}".format(key, extension))
+
+    def _touch(self, path):
+        # The modification time records the last use for the LRU eviction
+        os.utime(path, None)
+
+    def _write(self, path, write):
+        # Write to a temporary file first so a partially written file is never read
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(handle)
+        try:
+            write(temp_path)
+            _replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used files until the cache is no larger than max_size
+        :return: (int) The number of files removed
+        """
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not name.endswith(".tmp") and os.path.isfile(path):
+                stat = os.stat(path)
+                files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, path in sorted(files):
+            if total <= self.max_size:
+                break
+            os.remove(path)
+            total -= size
+            removed += 1
+        return removed
+
+    def get_model_key(self, model_type, coverage_dict, **params):
+        """
+        :param model_type: (string) The type of model (see MODEL_TYPES)
+        :param coverage_dict: (dictionary) The coverage
+        :param params: The parameters of the model builder (num_fac, psi...)
+        :return: (string) The key of the model
+        """
+        if model_type not in MODEL_TYPES:
+            raise ValueError("'{}' is not a supported model type, expected one of {}".format(model_type,
+                                                                                          sorted(MODEL_TYPES)))
+        return _get_hash({"coverage": get_coverage_hash(coverage_dict), "type": model_type, "params": params})
+
+    def create_model(self, model_type, coverage_dict, **params):
+        """
+        Gets a model from the cache or builds (and caches) it
+        :param model_type: (string) The type of model (see MODEL_TYPES)
+        :param coverage_dict: (dictionary) The coverage
+        :param params: The parameters of the model builder (num_fac, psi...)
+        :return: (Pulp problem) The model
+        """
+        return self._create_model(self.get_model_key(model_type, coverage_dict, **params), model_type,
+                                  coverage_dict, params)
+
+    def _create_model(self, key, model_type, coverage_dict, params):
+        mps_path = self._get_path(key, ".mps")
+        sense_path = self._get_path(key, ".sense")
+        if os.path.exists(mps_path) and os.path.exists(sense_path):
+            logging.getLogger().info("Reading cached {} model {}...".format(model_type, key))
+            self._touch(mps_path)
+            self._touch(sense_path)
+            with open(sense_path, "r") as f:
+                sense = int(f.read())
+            _, problem = pulp.LpProblem.fromMPS(mps_path, sense=sense)
+            return problem
+        problem = MODEL_TYPES[model_type](coverage_dict, **params)
+        self._write(mps_path, problem.writeMPS)
+
+        def write_sense(path):
+            with open(path, "w") as f:
+                f.write(str(problem.sense))
+        self._write(sense_path, write_sense)
+        return problem
+
+    def solve(self, model_type, coverage_dict, solver="glpk", solver_options=None, **params):
+        """
+        Gets a solution from the cache or builds (using the cached model if possible), solves and caches it
+        :param model_type: (string) The type of model (see MODEL_TYPES)
+        :param coverage_dict: (dictionary) The coverage
+        :param solver: (string) The solver to use (see solving.solve_model)
+        :param solver_options: (dictionary) Keyword arguments for solving.solve_model (time_limit, gap, threads)
+        :param params: The parameters of the model builder (num_fac, psi...)
+        :return: (dictionary) The solve results (see solving.solve_model) and the chosen ids of each facility type
+            ('ids'), 'cached' is True if the solution came from the cache
+        """
+        solver_options = solver_options or {}
+        model_key = self.get_model_key(model_type, coverage_dict, **params)
+        solution_key = _get_hash({"model": model_key, "solver": solver, "options": solver_options})
+        solution_path = self._get_path(solution_key, ".json")
+        if os.path.exists(solution_path):
+            logging.getLogger().info("Using cached solution {}...".format(solution_key))
+            self._touch(solution_path)
+            with open(solution_path, "r") as f:
+                result = json.load(f)
+            result["cached"] = True
+            return result
+        problem = self._create_model(model_key, model_type, coverage_dict, params)
+        result = solving.solve_model(problem, solver, **solver_options)
+        delineator = params.get("delineator", "$")
+        result["ids"] = {facility_type: utilities.get_ids(problem, facility_type, delineator=delineator)
+                         for facility_type in coverage_dict["facilities"]}
+
+        def write_solution(path):
+            with open(path, "w") as f:
+                json.dump(result, f)
+        self._write(solution_path, write_solution)
+        result["cached"] = False
+        return result
@@ -0,0 +1,169 @@
+# -*- coding: UTF-8 -*-
+import concurrent.futures
+import logging
+import multiprocessing
+
+import pulp
+
+from pyspatialopt.models import covering, solving, utilities
+
+MODEL_TYPES = ["mclp", "mclp_cc"]
+
+
+def _get_expression(constraint):
+    # pulp>=3 keeps the terms of a constraint in an expression, older versions store them on the constraint itself
+    return getattr(constraint, "expr", constraint)
+
+
+class MultiPeriodModel(object):
+    """
+    An MCLP or MCLPCC model built once for a coverage whose demand is replaced for each period (hour, day...)
+    Only the objective coefficients (and for MCLPCC the demand bounds and demand variable coefficients) are
+    changed, the variables and coverage constraints are reused
+    """
+
+    def __init__(self, coverage_dict, num_fac, model_type="mclp", use_serviceable_demand=False, delineator="$"):
+        """
+        :param coverage_dict: (dictionary) The coverage to use to generate the model (binary for MCLP, partial for
+            MCLPCC)
+        :param num_fac: (dictionary) The dictionary of number of facilities to use
+        :param model_type: (string) ['mclp', 'mclp_cc'] The model to build
+        :param use_serviceable_demand: (bool) Should we use the serviceable demand rather than demand
+        :param delineator: (string) The character(s) to use to delineate the layer from the ids
+        """
+        if model_type not in MODEL_TYPES:
+            raise ValueError("'{}' is not a supported model type, expected one of {}".format(model_type, MODEL_TYPES))
+        self.coverage_dict = coverage_dict
+        self.model_type = model_type
+        self.delineator = delineator
+        self.demand_var = "serviceableDemand" if use_serviceable_demand else "demand"
+        if model_type == "mclp":
+            self.problem = covering.create_mclp_model(coverage_dict, num_fac, delineator=delineator,
+                                                      use_serviceable_demand=use_serviceable_demand)
+        else:
+            self.problem = covering.create_mclp_cc_model(coverage_dict, num_fac, delineator=delineator,
+                                                         use_serviceable_demand=use_serviceable_demand)
+        self.demand_ids = list(coverage_dict["demand"].keys())
+        # Find the demand variables and the constraints that depend on the demand once
+        variables = self.problem.variablesDict()
+        self.demand_vars = {}
+        for demand_id in self.demand_ids:
+            var = pulp.LpVariable("Y{}{}".format(delineator, demand_id))
+            self.demand_vars[demand_id] = variables[var.name]
+        self.coverage_constraints = {}
+        self.bound_constraints = {}
+        if model_type == "mclp_cc":
+            demand_ids = {var.name: demand_id for demand_id, var in self.demand_vars.items()}
+            for name, constraint in self.problem.constraints.items():
+                for var in _get_expression(constraint).keys():
+                    if var.name in demand_ids:
+                        demand_id = demand_ids[var.name]
+                        # The coverage constraints are named D{id}, the demand bounds are unnamed
+                        if name == pulp.LpConstraint(name="D{}".format(demand_id)).name:
+                            self.coverage_constraints[demand_id] = constraint
+                        else:
+                            self.bound_constraints[demand_id] = constraint
+
+    def _get_demand_vector(self, demand):
+        if isinstance(demand, dict):
+            return [demand[demand_id] for demand_id in self.demand_ids]
+        demand = list(demand)
+        if len(demand) != len(self.demand_ids):
+            raise ValueError("Expected {} demand values got {}".format(len(self.demand_ids), len(demand)))
+        return demand
+
+    def set_demand(self, demand):
+        """
+        Replaces the demand of the model. The serviceable demand (and for partial coverage the demand covered by
+        each facility) is scaled by the ratio between the new and the coverage demand
+        :param demand: (dictionary or list) The demand keyed on demand id, or in the order of the coverage demand
+        :return:
+        """
+        for demand_id, value in zip(self.demand_ids, self._get_demand_vector(demand)):
+            demand_obj = self.coverage_dict["demand"][demand_id]
+            if demand_obj["demand"] > 0:
+                ratio = float(value) / demand_obj["demand"]
+                weight = demand_obj[self.demand_var] * ratio
+            else:
+                ratio = None
+                weight = value if self.demand_var == "demand" else 0.0
+            var = self.demand_vars[demand_id]
+            self.problem.objective[var] = weight
+            if self.model_type == "mclp_cc":
+                # Y <= demand
+                self.bound_constraints[demand_id].constant = -weight
+                # sum(ratio * covered demand * X) - Y >= 0 is scaled so only the coefficient of Y changes
+                _get_expression(self.coverage_constraints[demand_id])[var] = -1.0 / ratio if ratio else -1.0
+
+    def solve_period(self, demand, solver="glpk", solver_options=None, warm_start=True):
+        """
+        Replaces the demand and solves the model
+        :param demand: (dictionary or list) The demand of the period (see set_demand)
+        :param solver: (string) The solver to use (see solving.solve_model)
+        :param solver_options: (dictionary) Keyword arguments for solving.solve_model (time_limit, gap, threads)
+        :param warm_start: (bool) Should the previous solution be used as the MIP start
+        :return: (dictionary) The solve results (see solving.solve_model) and the chosen facility ids ('ids')
+        """
+        mip_start = None
+        if warm_start:
+            # The previous facilities stay feasible, the demand variables start at 0 so they can't exceed a new bound
+            demand_vars = set(var.name for var in self.demand_vars.values())
+            mip_start = {name: value for name, value in solving.get_mip_start(self.problem).items()
+                         if name not in demand_vars}
+        self.set_demand(demand)
+        result = solving.solve_model(self.problem, solver, mip_start=mip_start or None, **(solver_options or {}))
+        result["ids"] = {facility_type: utilities.get_ids(self.problem, facility_type, delineator=self.delineator)
+                         for facility_type in self.coverage_dict["facilities"]}
+        return result
+
+
+# The model of a worker process, built once by _init_worker and reused for every period the worker solves
+_worker_model = None
+
+
+def _init_worker(coverage_dict, num_fac, model_type, use_serviceable_demand):
+    global _worker_model
+    _worker_model = MultiPeriodModel(coverage_dict, num_fac, model_type, use_serviceable_demand)
+
+
+def _solve_worker(args):
+    period, demand, solver, solver_options, warm_start = args
+    result = _worker_model.solve_period(demand, solver, solver_options, warm_start)
+    result["period"] = period
+    return result
+
+
+def solve_periods(coverage_dict, num_fac, demand_matrix, model_type="mclp", solver="glpk", solver_options=None,
+                  processes=1, warm_start=True, use_serviceable_demand=False):
+    """
+    Solves an MCLP or MCLPCC for each period of a demand matrix, building the model once (per process)
+    :param coverage_dict: (dictionary) The coverage to use to generate the model
+    :param num_fac: (dictionary) The dictionary of number of facilities to use
+    :param demand_matrix: (list) The demand of each period, as dictionaries keyed on demand id or lists in the order
+        of the coverage demand
+    :param model_type: (string) ['mclp', 'mclp_cc'] The model to solve
+    :param solver: (string) The solver to use (see solving.solve_model)
+    :param solver_options: (dictionary) Keyword arguments for solving.solve_model (time_limit, gap, threads)
+    :param processes: (int) The number of processes to solve periods in (None uses all cpus, 1 solves serially)
+    :param warm_start: (bool) Should each period start from the solution of the previous period (in the same process)
+    :param use_serviceable_demand: (bool) Should we use the serviceable demand rather than demand
+    :return: (list) The results of each period (see MultiPeriodModel.solve_period) in order
+    """
+    demand_matrix = list(demand_matrix)
+    if processes == 1 or len(demand_matrix) < 2:
+        model = MultiPeriodModel(coverage_dict, num_fac, model_type, use_serviceable_demand)
+        results = []
+        for period, demand in enumerate(demand_matrix):
+            logging.getLogger().info("Solving period {}...".format(period))
+            result = model.solve_period(demand, solver, solver_options, warm_start)
+            result["period"] = period
+            results.append(result)
+        return results
+    tasks = [(period, demand, solver, solver_options, warm_start) for period, demand in enumerate(demand_matrix)]
+    processes = processes or multiprocessing.cpu_count()
+    with concurrent.futures.ProcessPoolExecutor(processes, initializer=_init_worker,
+                                                initargs=(coverage_dict, num_fac, model_type,
+                                                          use_serviceable_demand)) as executor:
+        # Consecutive periods go to the same worker so the warm start comes from a similar demand
+        chunksize = max(1, len(tasks) // processes)
+        return list(executor.map(_solve_worker, tasks, chunksize=chunksize))
@@ -0,0 +1,149 @@
+# -*- coding: UTF-8 -*-
+import logging
+import os
+import re
+import tempfile
+import time
+
+import pulp
+
+from pyspatialopt.models import highs_solver
+
+SOLVERS = ["glpk", "cbc", "gurobi", "highs"]
+
+
+def get_mip_start(problem):
+    """
+    Gets the values of a solved problem so they can be used as the MIP start of another (similar) problem
+    :param problem: (Pulp problem) The solved problem
+    :return: (dictionary) The variable values keyed on variable name
+    """
+    return {var.name: var.varValue for var in problem.variables() if var.varValue is not None}
+
+
+def _get_log_file():
+    handle, log_file = tempfile.mkstemp(suffix=".log")
+    os.close(handle)
+    return log_file
+
+
+def _read_log(log_file):
+    if not os.path.exists(log_file):
+        return ""
+    with open(log_file, "r") as f:
+        log = f.read()
+    os.remove(log_file)
+    return log
+
+
+def _solve_cbc(problem, time_limit, gap, threads, warm_start, msg):
+    log_file = _get_log_file()
+    problem.solve(pulp.PULP_CBC_CMD(msg=msg, timeLimit=time_limit, gapRel=gap, threads=threads,
+                                    warmStart=warm_start, logPath=log_file))
+    log = _read_log(log_file)
+    # CBC only reports the bound (and gap) when it stops early
+    match = re.search(r"^(?:Upper|Lower) bound:\s+(\S+)", log, re.MULTILINE)
+    return {
+        "bound": float(match.group(1)) if match else None,
+        "timed_out": "Stopped on time" in log
+    }
+
+
+def _solve_glpk(problem, time_limit, gap, threads, warm_start, msg):
+    if threads is not None or warm_start:
+        logging.getLogger().warning("GLPK does not support threads or MIP starts, ignoring")
+    log_file = _get_log_file()
+    options = ["--log", log_file]
+    if gap is not None:
+        options.extend(["--mipgap", str(gap)])
+    problem.solve(pulp.GLPK_CMD(msg=msg, timeLimit=time_limit, options=options))
+    log = _read_log(log_file)
+    # Progress lines look like: + 1234: mip =   5.194200000e+04 <=   5.678961700e+04   9.3% (12; 0)
+    matches = re.findall(r"mip =\s+(\S+)\s+[<>]=\s+(\S+)", log)
+    bound = None
+    if matches:
+        try:
+            bound = float(matches[-1][1])
+        except ValueError:
+            # 'tree is empty', the search finished
+            bound = None
+    return {
+        "bound": bound,
+        "timed_out": "TIME LIMIT EXCEEDED" in log
+    }
+
+
+def _solve_gurobi(problem, time_limit, gap, threads, warm_start, msg):
+    params = {}
+    if threads is not None:
+        params["Threads"] = threads
+    problem.solve(pulp.GUROBI(msg=msg, timeLimit=time_limit, gapRel=gap, warmStart=warm_start, **params))
+    model = problem.solverModel
+    try:
+        bound = model.ObjBound
+    except AttributeError:
+        bound = None
+    return {
+        "bound": bound,
+        "timed_out": model.Status == 9  # GRB.TIME_LIMIT
+    }
+
+
+def solve_model(problem, solver="glpk", time_limit=None, gap=None, threads=None, mip_start=None, msg=False):
+    """
+    Solves a problem (generally created by the covering module) with the same limits on any of the supported solvers
+    The best solution found (incumbent) is kept on the problem even when the time limit is reached
+
+    :param problem: (Pulp problem) The problem to solve
+    :param solver: (string) ['glpk', 'cbc', 'gurobi', 'highs'] The solver to use
+    :param time_limit: (float) The maximum wall clock time (seconds) to spend solving
+    :param gap: (float) The relative MIP gap to stop at (0.01 = 1%)
+    :param threads: (int) The number of threads the solver can use (ignored by GLPK)
+    :param mip_start: (dictionary) Starting values keyed on variable name (see get_mip_start, ignored by GLPK)
+    :param msg: (bool) Should the solver output be shown
+    :return: (dictionary) The status, objective (incumbent) value, best bound, relative gap, solve time and
+        whether the time limit was reached
+    """
+    if solver not in SOLVERS:
+        raise ValueError("'{}' is not a supported solver, expected one of {}".format(solver, SOLVERS))
+    if time_limit is not None and time_limit <= 0:
+        raise ValueError("time_limit must be greater than 0")
+    if gap is not None and gap < 0:
+        raise ValueError("gap must be greater than or equal to 0")
+    if mip_start:
+        for var in problem.variables():
+            if var.name in mip_start:
+                var.setInitialValue(mip_start[var.name])
+    logging.getLogger().info("Solving {} with {}...".format(problem.name, solver))
+    start = time.time()
+    if solver == "highs":
+        info = highs_solver.run_highs(problem, time_limit, gap, threads, msg, mip_start)
+    elif solver == "cbc":
+        info = _solve_cbc(problem, time_limit, gap, threads, bool(mip_start), msg)
+    elif solver == "gurobi":
+        info = _solve_gurobi(problem, time_limit, gap, threads, bool(mip_start), msg)
+    else:
+        info = _solve_glpk(problem, time_limit, gap, threads, bool(mip_start), msg)
+    elapsed = time.time() - start
+    sol_status = getattr(problem, "sol_status", None)
+    has_solution = problem.status == pulp.LpStatusOptimal or sol_status in (1, 2)
+    objective = pulp.value(problem.objective) if has_solution else None
+    bound = info.get("bound")
+    if bound is None and has_solution and not info["timed_out"]:
+        # Solved to optimality (within the gap) without reporting a bound
+        bound = objective
+    relative_gap = info.get("gap")
+    if relative_gap is None and objective is not None and bound is not None:
+        relative_gap = abs(bound - objective) / max(abs(objective), 1e-10)
+    result = {
+        "status": pulp.LpStatus[problem.status],
+        "optimal": has_solution and sol_status in (None, 1) and not info["timed_out"],
+        "objective": objective,
+        "bound": bound,
+        "gap": relative_gap,
+        "time": elapsed,
+        "timed_out": info["timed_out"]
+    }
+    logging.getLogger().info("Solved in {:.2f} seconds: objective {} bound {} gap {}".format(
+        elapsed, objective, bound, relative_gap))
+    return result
@@ -13,6 +13,47 @@ def get_ids(problem, variable_name, threshold=1.0, delineator="$"):
     ids = []
     for var in problem.variables():
         if var.name.split(delineator)[0] == variable_name:
-            if var.varValue >= threshold:
+            if var.varValue is not None and var.varValue >= threshold:
                 ids.append(var.name.split("$")[1])
     return ids
+
+
+def get_covered_demand(coverage_dict, ids, use_serviceable_demand=False):
+    """
+    Finds the demand covered by a set of facilities from the coverage itself (no geometry is needed)
+    Binary coverage: a demand unit is covered when any of the facilities covers it
+    Partial coverage: the demand covered by each facility is summed and capped at the demand (as in the MCLPCC model)
+    :param coverage_dict: (dictionary) A binary or partial coverage
+    :param ids: (dictionary) The facility ids (see get_ids) keyed on facility type
+    :param use_serviceable_demand: (bool) Should we use the serviceable demand rather than demand
+    :return: (dictionary) The total covered demand ('total') and the demand covered for each demand id ('demand')
+    """
+    if use_serviceable_demand:
+        demand_var = "serviceableDemand"
+    else:
+        demand_var = "demand"
+    coverage_type = coverage_dict["type"]["type"]
+    if coverage_type not in ["binary", "partial"]:
+        raise ValueError("Expected types: '{}' got type '{}'".format(["binary", "partial"], coverage_type))
+    chosen = {facility_type: set(str(facility_id) for facility_id in facility_ids)
+              for facility_type, facility_ids in ids.items()}
+    output = {
+        "total": 0.0,
+        "demand": {}
+    }
+    for demand_id, demand_obj in coverage_dict["demand"].items():
+        covered = 0.0
+        for facility_type, facilities in demand_obj["coverage"].items():
+            if facility_type not in chosen:
+                continue
+            if coverage_type == "binary":
+                if not chosen[facility_type].isdisjoint(facilities):
+                    covered = demand_obj[demand_var]
+                    break
+            else:
+                for facility_id in chosen[facility_type].intersection(facilities):
+                    covered += facilities[facility_id]
+        covered = min(covered, demand_obj[demand_var])
+        output["demand"][demand_id] = covered
+        output["total"] += covered
+    return output
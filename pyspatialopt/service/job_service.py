@@ -0,0 +1,478 @@
+# -*- coding: UTF-8 -*-
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+
+from pyspatialopt.models import covering, solving, utilities
+
+MODEL_BUILDERS = {
+    "mclp": covering.create_mclp_model,
+    "mclp_cc": covering.create_mclp_cc_model,
+    "threshold": covering.create_threshold_model,
+    "cc_threshold": covering.create_cc_threshold_model,
+    "backup": covering.create_backup_model,
+    "lscp": covering.create_lscp_model,
+    "traumah": covering.create_traumah_model,
+    "bclpcc": covering.create_bclpcc_model,
+}
+
+FINISHED_STATUSES = ("finished", "failed", "timeout", "cancelled")
+
+
+class Job(object):
+    """
+    A model build & solve request tracked by the job service
+    """
+
+    def __init__(self, job_id, coverage, model, params, solver, timeout, delineator, solver_options=None):
+        """
+        :param job_id: (string) The unique id of the job
+        :param coverage: (string) The path of the coverage (json) file to use
+        :param model: (string) The name of the model to build (key of MODEL_BUILDERS)
+        :param params: (dictionary) The keyword arguments to pass to the model builder
+        :param solver: (string) The name of the solver to use (see solve_worker)
+        :param timeout: (float) The maximum time (seconds) the job can run for
+        :param delineator: (string) The character/symbol used to delineate facility and ids
+        :param solver_options: (dictionary) Keyword arguments for solving.solve_model (time_limit, gap, threads)
+        """
+        self.job_id = job_id
+        self.coverage = coverage
+        self.model = model
+        self.params = params
+        self.solver = solver
+        self.timeout = timeout
+        self.delineator = delineator
+        self.solver_options = solver_options or {}
+        self.status = "queued"
+        self.error = None
+        self.result = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.events = []
+        self.subscribers = []
+        self.process = None
+        self.cancel_requested = False
+
+    def summary(self):
+        """
+        :return: (dictionary) A json serializable summary of the job
+        """
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "coverage": self.coverage,
+            "model": self.model,
+            "solver": self.solver,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+            "error": self.error,
+            "result": self.result
+        }
+
+
+class JobService(object):
+    """
+    Local asynchronous job service that builds and solves covering models
+
+    Jobs are queued and run with bounded concurrency. Models are built in a thread so the event loop
+    is never blocked and solved in a separate process (solve_worker) so the solver log can be streamed and
+    the solver killed on timeout or cancellation. Coverages are loaded once and reused across jobs.
+
+    Clients talk to the service with newline delimited json messages over tcp or a unix socket:
+    {"action": "submit", "coverage": path, "model": "mclp", "params": {"num_fac": {"total": 5}}, "solver": "cbc",
+    "timeout": 60, "solver_options": {"time_limit": 30, "gap": 0.01}}, {"action": "status", "job_id": id}, {"action": "watch", "job_id": id},
+    {"action": "cancel", "job_id": id} and {"action": "list"}
+    """
+
+    def __init__(self, concurrency=2, default_solver="cbc", default_timeout=None, work_dir=None):
+        """
+        :param concurrency: (int) The maximum number of jobs to run at once
+        :param default_solver: (string) The solver to use when a job does not specify one
+        :param default_timeout: (float) The timeout (seconds) to use when a job does not specify one
+        :param work_dir: (string) The directory to write model and result files to (a temporary directory if None)
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self.concurrency = concurrency
+        self.default_solver = default_solver
+        self.default_timeout = default_timeout
+        self.work_dir = work_dir
+        self.jobs = {}
+        self.coverages = {}
+        self._owns_work_dir = False
+        self._ids = itertools.count(1)
+        self._queue = None
+        self._workers = []
+        self._coverage_locks = {}
+        self._server = None
+
+    async def start(self, host="127.0.0.1", port=8765, path=None):
+        """
+        Starts the workers and listens for clients
+        :param host: (string) The host to listen on
+        :param port: (int) The port to listen on (0 picks a free port)
+        :param path: (string) The unix socket to listen on instead of tcp
+        :return: (asyncio.Server) The server
+        """
+        if self.work_dir is None:
+            self.work_dir = tempfile.mkdtemp(prefix="pyspatialopt_jobs_")
+            self._owns_work_dir = True
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.ensure_future(self._worker()) for _ in range(self.concurrency)]
+        if path:
+            self._server = await asyncio.start_unix_server(self._handle_client, path=path)
+        else:
+            self._server = await asyncio.start_server(self._handle_client, host=host, port=port)
+        logging.getLogger().info("Job service listening on {}".format(
+            path or self._server.sockets[0].getsockname()))
+        return self._server
+
+    async def stop(self):
+        """
+        Stops listening, kills any running solvers and stops the workers
+        :return:
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for job in self.jobs.values():
+            if job.status not in FINISHED_STATUSES:
+                self.cancel(job.job_id)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        if self._owns_work_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def submit(self, coverage, model, params=None, solver=None, timeout=None, delineator="$", solver_options=None):
+        """
+        Queues a job
+        :param coverage: (string) The path of the coverage (json) file to use
+        :param model: (string) The name of the model to build (key of MODEL_BUILDERS)
+        :param params: (dictionary) The keyword arguments to pass to the model builder (num_fac, psi...)
+        :param solver: (string) The name of the solver to use
+        :param timeout: (float) The maximum time (seconds) the job can run for
+        :param delineator: (string) The character/symbol used to delineate facility and ids
+        :param solver_options: (dictionary) Keyword arguments for solving.solve_model (time_limit, gap, threads)
+        :return: (Job) The queued job
+        """
+        if model not in MODEL_BUILDERS:
+            raise ValueError("'{}' is not a valid model".format(model))
+        if (solver or self.default_solver) not in solving.SOLVERS:
+            raise ValueError("'{}' is not a supported solver".format(solver or self.default_solver))
+        if not os.path.isfile(coverage):
+            raise ValueError("Coverage '{}' not found".format(coverage))
+        job = Job(str(next(self._ids)), os.path.abspath(coverage), model, params or {},
+                  solver or self.default_solver, timeout if timeout is not None else self.default_timeout,
+                  delineator, solver_options)
+        self.jobs[job.job_id] = job
+        self._queue.put_nowait(job)
+        self._publish(job, {"event": "status", "status": job.status})
+        return job
+
+    def cancel(self, job_id):
+        """
+        Cancels a job. Queued jobs are dropped and running jobs have their solver killed
+        :param job_id: (string) The id of the job to cancel
+        :return: (Job) The job
+        """
+        job = self.jobs[job_id]
+        if job.status in FINISHED_STATUSES:
+            return job
+        job.cancel_requested = True
+        if job.status == "queued":
+            self._finish(job, "cancelled")
+        else:
+            self._kill(job)
+        return job
+
+    def subscribe(self, job):
+        """
+        Subscribes to the events of a job. Events already published are replayed
+        :param job: (Job) The job to subscribe to
+        :return: (asyncio.Queue) The queue the events are put on
+        """
+        queue = asyncio.Queue()
+        for event in job.events:
+            queue.put_nowait(event)
+        job.subscribers.append(queue)
+        return queue
+
+    async def load_coverage(self, path):
+        """
+        Loads a coverage, reusing the coverage already loaded if the file has not changed
+        :param path: (string) The path of the coverage (json) file
+        :return: (dictionary) The coverage
+        """
+        lock = self._coverage_locks.setdefault(path, asyncio.Lock())
+        async with lock:
+            mtime = os.path.getmtime(path)
+            if path in self.coverages and self.coverages[path][0] == mtime:
+                return self.coverages[path][1]
+            loop = asyncio.get_event_loop()
+            coverage = await loop.run_in_executor(None, _read_json, path)
+            self.coverages[path] = (mtime, coverage)
+            return coverage
+
+    def _publish(self, job, event):
+        event["job_id"] = job.job_id
+        job.events.append(event)
+        for queue in job.subscribers:
+            queue.put_nowait(event)
+
+    def _finish(self, job, status, error=None):
+        job.status = status
+        job.error = error
+        job.finished = time.time()
+        self._publish(job, {"event": "done", "job": job.summary()})
+
+    def _kill(self, job):
+        if job.process is None or job.process.returncode is not None:
+            return
+        try:
+            if hasattr(os, "killpg"):
+                # Kill the worker and the solver it started
+                os.killpg(job.process.pid, signal.SIGKILL)
+            else:
+                job.process.kill()
+        except ProcessLookupError:
+            pass
+
+    def _kill_started(self, job, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        job.process = future.result()
+        self._kill(job)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.status == "queued":
+                    await self._run(job)
+            except Exception as e:
+                logging.getLogger().exception("Job {} failed".format(job.job_id))
+                self._finish(job, "failed", str(e))
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job):
+        job.status = "running"
+        job.started = time.time()
+        self._publish(job, {"event": "status", "status": job.status})
+        model_file = os.path.join(self.work_dir, "{}.mps".format(job.job_id))
+        result_file = os.path.join(self.work_dir, "{}.json".format(job.job_id))
+        try:
+            # The timeout covers the whole job (loading the coverage, building and solving the model)
+            await asyncio.wait_for(self._execute(job, model_file, result_file), job.timeout)
+        except asyncio.TimeoutError:
+            self._kill(job)
+            if job.process is not None:
+                await job.process.wait()
+            self._finish(job, "timeout", "Job exceeded timeout of {} seconds".format(job.timeout))
+        finally:
+            _remove(model_file)
+            _remove(result_file)
+
+    async def _execute(self, job, model_file, result_file):
+        loop = asyncio.get_event_loop()
+        coverage = await self.load_coverage(job.coverage)
+        self._publish(job, {"event": "log", "message": "Building {} model...".format(job.model)})
+        build = loop.run_in_executor(None, _build_model, coverage, job, model_file)
+        try:
+            prob = await asyncio.shield(build)
+        except asyncio.CancelledError:
+            # The build can't be stopped, remove the model file once it has been written
+            build.add_done_callback(lambda _: _remove(model_file))
+            raise
+        if job.cancel_requested:
+            self._finish(job, "cancelled")
+            return
+        self._publish(job, {"event": "log", "message": "Solving with {}...".format(job.solver)})
+        start = asyncio.ensure_future(asyncio.create_subprocess_exec(
+            sys.executable, "-m", "pyspatialopt.service.solve_worker", model_file, result_file, str(prob.sense),
+            job.solver, json.dumps(job.solver_options), stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+            start_new_session=hasattr(os, "killpg")))
+        try:
+            job.process = await asyncio.shield(start)
+        except asyncio.CancelledError:
+            # Timed out while the solver was starting, kill it once it has started so it isn't orphaned
+            start.add_done_callback(lambda future: self._kill_started(job, future))
+            raise
+        if job.cancel_requested:
+            # Cancelled while the solver was starting
+            self._kill(job)
+        await self._stream_log(job)
+        if job.cancel_requested:
+            self._finish(job, "cancelled")
+        elif job.process.returncode != 0 or not os.path.exists(result_file):
+            self._finish(job, "failed", "Solver exited with code {}".format(job.process.returncode))
+        else:
+            result = await loop.run_in_executor(None, _read_json, result_file)
+            job.result = await loop.run_in_executor(None, _get_result, prob, coverage, result, job.delineator)
+            self._finish(job, "finished")
+
+    async def _stream_log(self, job):
+        while True:
+            line = await job.process.stdout.readline()
+            if not line:
+                break
+            self._publish(job, {"event": "log", "message": line.decode(errors="replace").rstrip()})
+        await job.process.wait()
+
+    async def _handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line.decode())
+                    await self._handle_message(message, writer)
+                except Exception as e:
+                    await _send(writer, {"error": str(e)})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_message(self, message, writer):
+        action = message.get("action")
+        if action == "submit":
+            job = self.submit(message["coverage"], message["model"], message.get("params"), message.get("solver"),
+                              message.get("timeout"), message.get("delineator", "$"), message.get("solver_options"))
+            await _send(writer, job.summary())
+        elif action == "status":
+            await _send(writer, self.jobs[message["job_id"]].summary())
+        elif action == "cancel":
+            await _send(writer, self.cancel(message["job_id"]).summary())
+        elif action == "list":
+            await _send(writer, {"jobs": [job.summary() for job in self.jobs.values()]})
+        elif action == "watch":
+            job = self.jobs[message["job_id"]]
+            queue = self.subscribe(job)
+            try:
+                while True:
+                    event = await queue.get()
+                    await _send(writer, event)
+                    if event["event"] == "done":
+                        break
+            finally:
+                job.subscribers.remove(queue)
+        else:
+            raise ValueError("'{}' is not a valid action".format(action))
+
+
+def _read_json(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _remove(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _build_model(coverage, job, model_file):
+    prob = MODEL_BUILDERS[job.model](coverage, delineator=job.delineator, **job.params)
+    prob.writeMPS(model_file)
+    return prob
+
+
+def _get_result(prob, coverage, result, delineator):
+    variables = prob.variablesDict()
+    for var in variables.values():
+        var.varValue = 0
+    for name, value in result["values"].items():
+        if name in variables:
+            variables[name].varValue = value
+    ids = {}
+    for facility_type in coverage["facilities"]:
+        ids[facility_type] = utilities.get_ids(prob, facility_type, delineator=delineator)
+    return {
+        "status": result["status"],
+        "objective": result["objective"],
+        "bound": result["bound"],
+        "gap": result["gap"],
+        "ids": ids
+    }
+
+
+async def _send(writer, message):
+    writer.write((json.dumps(message) + "\n").encode())
+    await writer.drain()
+
+
+async def request(message, host="127.0.0.1", port=8765, path=None):
+    """
+    Sends a message to a job service and yields the responses ('watch' yields events until the job is done)
+    :param message: (dictionary) The message to send
+    :param host: (string) The host of the service
+    :param port: (int) The port of the service
+    :param path: (string) The unix socket of the service
+    :return: (async generator) The responses
+    """
+    if path:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    try:
+        await _send(writer, message)
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            response = json.loads(line.decode())
+            yield response
+            if message.get("action") != "watch" or response.get("event") == "done" or "error" in response:
+                break
+    finally:
+        writer.close()
+
+
+def run_service(host="127.0.0.1", port=8765, path=None, concurrency=2, default_solver="cbc", default_timeout=None):
+    """
+    Runs a job service until interrupted
+    :param host: (string) The host to listen on
+    :param port: (int) The port to listen on
+    :param path: (string) The unix socket to listen on instead of tcp
+    :param concurrency: (int) The maximum number of jobs to run at once
+    :param default_solver: (string) The solver to use when a job does not specify one
+    :param default_timeout: (float) The timeout (seconds) to use when a job does not specify one
+    :return:
+    """
+    async def serve():
+        service = JobService(concurrency, default_solver, default_timeout)
+        server = await service.start(host, port, path)
+        try:
+            await server.serve_forever()
+        finally:
+            await service.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local pyspatialopt job service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--path", help="Unix socket to listen on instead of tcp")
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--solver", default="cbc")
+    parser.add_argument("--timeout", type=float)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    run_service(args.host, args.port, args.path, args.concurrency, args.solver, args.timeout)
@@ -0,0 +1,32 @@
+# -*- coding: UTF-8 -*-
+import json
+import sys
+
+import pulp
+
+from pyspatialopt.models import solving
+
+
+def solve_model_file(mps_file, result_file, sense, solver, solver_options=None):
+    """
+    Reads an .mps model, solves it and writes the variable values to a json file
+    Run as a separate process by the job service so the solver log can be streamed and the solver killed
+    :param mps_file: (string) The path of the .mps file to solve
+    :param result_file: (string) The path of the json file to write the results to
+    :param sense: (int) The sense of the objective (pulp.LpMaximize or pulp.LpMinimize)
+    :param solver: (string) ['glpk', 'cbc', 'gurobi', 'highs'] The solver to use
+    :param solver_options: (dictionary) Keyword arguments for solving.solve_model (time_limit, gap, threads)
+    :return: (dictionary) The results that were written
+    """
+    variables, prob = pulp.LpProblem.fromMPS(mps_file, sense=sense)
+    result = solving.solve_model(prob, solver, msg=True, **(solver_options or {}))
+    result["values"] = {name: var.varValue for name, var in variables.items() if var.varValue}
+    with open(result_file, "w") as f:
+        json.dump(result, f)
+    return result
+
+
+if __name__ == "__main__":
+    # python -m pyspatialopt.service.solve_worker <mps file> <result file> <sense> <solver> [<solver options json>]
+    solve_model_file(sys.argv[1], sys.argv[2], int(sys.argv[3]), sys.argv[4],
+                     json.loads(sys.argv[5]) if len(sys.argv) > 5 else None)
@@ -1,4 +1,11 @@
-from distutils.core import setup
+import sys
+
+from setuptools import setup
+
+packages = ['pyspatialopt', 'pyspatialopt.models', 'pyspatialopt.analysis']
+# The job service uses asyncio (async/await) so it is only installed on Python 3
+if sys.version_info[0] >= 3:
+    packages.append('pyspatialopt.service')
 
 setup(name='PySpatialOpt',
     version='0.0.1',
@@ -6,12 +13,20 @@ setup(name='PySpatialOpt',
     author='Aaron Pulver',
     author_email='apulverizer@gmail.com',
     url='https://github.com/apulverizer/pyspatialopt',
-    packages=['pyspatialopt', 'pyspatialopt.models',
-              'pyspatialopt/analysis'],
+    packages=packages,
     license='MIT',
-    install_requires=['pulp>=1.6.1'],
+    install_requires=['pulp>=2.4', 'futures; python_version < "3"'],
+    extras_require={
+        'raster': ['numpy'],
+        'distance': ['numpy', 'scipy'],
+        'network': ['numpy', 'scipy'],
+        'parquet': ['numpy', 'pyarrow'],
+        'highs': ['numpy', 'highspy'],
+        'all': ['numpy', 'scipy', 'pyarrow', 'highspy']
+    },
     classifiers=[
       'Intended Audience :: Developers/Researchers',
-      'Programming Language :: Python :: 2.7'
+      'Programming Language :: Python :: 2.7',
+      'Programming Language :: Python :: 3'
     ]
  )
@@ -101,6 +101,55 @@ class ArcpyCoverageTest(unittest.TestCase):
                                                                     tc_layer_id_field="ID", ad_layer_id_field="ID")
         self.assertEqual(self.traumah_coverage, traumah_coverage)
 
+    def test_layer_tables(self):
+        # Layers read once can be used by all of the generators
+        demand_polygon = arcpy_analysis.LayerTable(self.demand_polygon_fl)
+        demand_point = arcpy_analysis.LayerTable(self.demand_point_fl)
+        facility_service_areas = arcpy_analysis.LayerTable(self.facility_service_areas_fl)
+        facility2_service_areas = arcpy_analysis.LayerTable(self.facility2_service_areas_fl)
+        self.assertEqual("Polygon", demand_polygon.shape_type)
+        self.assertIn("GEOID10", demand_polygon.field_names)
+        self.assertEqual(self.partial_coverage,
+                         arcpy_analysis.generate_partial_coverage(demand_polygon, facility_service_areas,
+                                                                  "Population", "GEOID10", "ORIG_ID"))
+        self.assertEqual(self.binary_coverage_polygon,
+                         arcpy_analysis.generate_binary_coverage(demand_polygon, facility_service_areas,
+                                                                 "Population", "GEOID10", "ORIG_ID"))
+        self.assertEqual(self.binary_coverage_point2,
+                         arcpy_analysis.generate_binary_coverage(demand_point, facility2_service_areas,
+                                                                 "Population", "GEOID10", "ORIG_ID"))
+        self.assertEqual(self.serviceable_demand_polygon,
+                         arcpy_analysis.generate_serviceable_demand(demand_polygon, "Population", "GEOID10",
+                                                                    facility2_service_areas, facility_service_areas))
+        self.assertEqual(len(demand_polygon.geometries), len(demand_polygon.columns["GEOID10"]))
+
+    def test_layer_table_selection(self):
+        # A table read under a selection is read again (fields and geometries) when the selection changes
+        table = arcpy_analysis.LayerTable(self.facility_service_areas_fl)
+        arcpy.SelectLayerByAttribute_management(self.facility_service_areas_fl, "NEW_SELECTION", "ORIG_ID IN (1, 4)")
+        table.read(["ORIG_ID"])
+        self.assertEqual(["1", "4"], sorted(table.ids("ORIG_ID")))
+        arcpy_analysis.reset_layers(self.facility_service_areas_fl)
+        table.read(["ORIG_ID", "SHAPE@AREA"])
+        self.assertEqual(len(table.geometries), len(table.columns["ORIG_ID"]))
+        self.assertEqual(len(table.geometries), len(table.columns["SHAPE@AREA"]))
+        self.assertGreater(len(table.geometries), 2)
+
+    def test_write_results(self):
+        facility_results = arcpy.CopyFeatures_management(self.facility_service_areas_fl,
+                                                         "in_memory/facility_results").getOutput(0)
+        demand_results = arcpy.CopyFeatures_management(self.demand_polygon_fl, "in_memory/demand_results").getOutput(0)
+        self.assertEqual(2, arcpy_analysis.write_selected_facilities(facility_results, "ORIG_ID", ["1", "4"]))
+        with arcpy.da.SearchCursor(facility_results, ["ORIG_ID", "SELECTED"]) as cursor:
+            selected = {str(row[0]): row[1] for row in cursor}
+        self.assertEqual({"1": 1, "4": 1}, {k: v for k, v in selected.items() if v})
+        covered = {demand_id: demand_obj["serviceableDemand"]
+                   for demand_id, demand_obj in self.binary_coverage_polygon["demand"].items()}
+        self.assertEqual(len(covered), arcpy_analysis.write_covered_demand(demand_results, "GEOID10", covered))
+        with arcpy.da.SearchCursor(demand_results, ["GEOID10", "COVERED"]) as cursor:
+            for row in cursor:
+                self.assertEqual(covered[str(row[0])], row[1])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,58 @@
+# -*- coding: UTF-8 -*-
+import unittest
+
+from benchmarks import instances, run_benchmarks
+from pyspatialopt.models import binary_mclp_distance_matrix, covering
+
+
+class BenchmarksTest(unittest.TestCase):
+    def setUp(self):
+        self.instance = instances.Instance(400, seed=1)
+
+    def test_instance_is_seeded(self):
+        other = instances.Instance(400, seed=1)
+        self.assertEqual(self.instance.facilities, other.facilities)
+        self.assertEqual(self.instance.binary_coverage(), other.binary_coverage())
+        self.assertNotEqual(self.instance.facilities, instances.Instance(400, seed=2).facilities)
+
+    def test_coverages(self):
+        binary = self.instance.binary_coverage()
+        partial = self.instance.partial_coverage()
+        traumah = self.instance.traumah_coverage()
+        self.assertEqual(400, len(binary["demand"]))
+        self.assertEqual(10, len(binary["facilities"]["facility"]))
+        self.assertGreater(binary["totalServiceableDemand"], 0)
+        self.assertLessEqual(binary["totalServiceableDemand"], binary["totalDemand"])
+        self.assertLessEqual(partial["totalServiceableDemand"], partial["totalDemand"])
+        for demand_id, demand_obj in partial["demand"].items():
+            # Partially covered demand polygons are a superset of the covered centroids
+            self.assertTrue(set(binary["demand"][demand_id]["coverage"]["facility"]).issubset(
+                demand_obj["coverage"]["facility"]))
+        covering.create_mclp_model(binary, {"total": 2})
+        covering.create_mclp_cc_model(partial, {"total": 2})
+        covering.create_traumah_model(traumah, 2, 5)
+
+    def test_distance_matrix(self):
+        # The OD matrix gives the same coverage as the instance (only demand within the matrix is included)
+        coverage = binary_mclp_distance_matrix.generate_binary_coverage_from_dist_matrix(
+            self.instance.distance_matrix(), self.instance.radius)
+        binary = self.instance.binary_coverage()
+        for demand_id, demand_obj in coverage["demand"].items():
+            self.assertEqual(binary["demand"][demand_id]["coverage"], demand_obj["coverage"])
+        self.assertEqual(binary["totalServiceableDemand"], coverage["totalServiceableDemand"])
+
+    def test_compare(self):
+        results = run_benchmarks.run_benchmarks([100])
+        self.assertIn("create_bclpcc_model", results["results"]["100"])
+        self.assertIn("peak_memory", results["results"]["100"]["writeLP"])
+        comparisons = run_benchmarks.compare(results, results)
+        self.assertTrue(comparisons)
+        self.assertFalse(any(comparison["regression"] for comparison in comparisons))
+        slower = {"results": {"100": {"writeLP": {"time": results["results"]["100"]["writeLP"]["time"] * 2}}}}
+        comparisons = run_benchmarks.compare(results, slower)
+        self.assertEqual(1, len(comparisons))
+        self.assertTrue(comparisons[0]["regression"])
+
+
+if __name__ == '__main__':
+    unittest.main()
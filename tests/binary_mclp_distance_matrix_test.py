@@ -1,5 +1,9 @@
 # -*- coding: UTF-8 -*-
 from pyspatialopt.models import binary_mclp_distance_matrix
+import csv
+import os
+import shutil
+import tempfile
 import unittest
 
 
@@ -25,6 +29,50 @@ class MyTest(unittest.TestCase):
             print("A coverage of {0} is obtained with {1} facilities".format(res_coverag["percent_demand_coverage"], num_facility))
             self.assertAlmostEquals(res_coverag["percent_demand_coverage"], percent_coverage, places=5)
 
+    def test_columnar_files(self):
+        try:
+            import numpy
+            import pyarrow
+            import pyarrow.feather
+            import pyarrow.parquet
+        except ImportError:
+            self.skipTest("pyarrow is not installed")
+        workspace_path = tempfile.mkdtemp()
+        try:
+            with open("../sample_data/service_area_demand_point_distance_matrix.csv") as csvfile:
+                rows = list(csv.DictReader(csvfile))
+            expected = binary_mclp_distance_matrix.generate_binary_coverage_from_dist_matrix(rows, 5000)
+            # Dictionary encoded ids in small row groups so the threshold is pushed down to several batches
+            table = pyarrow.table({
+                "demand_id": pyarrow.array([row["demand_id"] for row in rows]).dictionary_encode(),
+                "demand": [float(row["demand"]) for row in rows],
+                "facility_id": [int(row["facility_id"]) for row in rows],
+                "distance": [float(row["distance"]) for row in rows]
+            })
+            pyarrow.parquet.write_table(table, os.path.join(workspace_path, "matrix.parquet"), row_group_size=100)
+            pyarrow.feather.write_feather(table, os.path.join(workspace_path, "matrix.feather"))
+            numpy.save(os.path.join(workspace_path, "matrix.npy"), numpy.array(
+                [(int(row["demand_id"]), float(row["demand"]), int(row["facility_id"]), float(row["distance"]))
+                 for row in rows],
+                dtype=[("demand_id", "i8"), ("demand", "f8"), ("facility_id", "i8"), ("distance", "f8")]))
+            for file_name in ["matrix.parquet", "matrix.feather", "matrix.npy"]:
+                coverage = binary_mclp_distance_matrix.generate_binary_coverage_from_dist_file(
+                    os.path.join(workspace_path, file_name), 5000)
+                self.assertEqual(sorted(expected["facilities"]["facility"]), coverage["facilities"]["facility"])
+                self.assertEqual(list(expected["demand"].items()), list(coverage["demand"].items()))
+                self.assertEqual(expected["totalServiceableDemand"], coverage["totalServiceableDemand"])
+                res_coverag = binary_mclp_distance_matrix.binary_mclp_distance_matrix(
+                    file_name, 5000, 5, workspace_path=workspace_path, solver="cbc")
+                self.assertAlmostEqual(52.797393302, res_coverag["percent_demand_coverage"], places=5)
+            with self.assertRaises(ValueError):
+                binary_mclp_distance_matrix.generate_binary_coverage_from_dist_file(
+                    os.path.join(workspace_path, "matrix.parquet"), 5000, distance_field="minutes")
+            with self.assertRaises(ValueError):
+                binary_mclp_distance_matrix.binary_mclp_distance_matrix(
+                    "matrix.npy", 5000, 5, list_field_req=["demand_id", "zone"], workspace_path=workspace_path)
+        finally:
+            shutil.rmtree(workspace_path)
+
 
 if __name__ == "__main__":
     # test case 1: simple case
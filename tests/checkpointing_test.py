@@ -0,0 +1,92 @@
+# -*- coding: UTF-8 -*-
+import os
+import shutil
+import tempfile
+import collections
+import unittest
+
+from pyspatialopt.analysis import checkpointing, geometry_processing
+
+
+class CheckpointingTest(unittest.TestCase):
+    def setUp(self):
+        self.workspace = tempfile.mkdtemp()
+        self.path = os.path.join(self.workspace, "coverage.checkpoint")
+        self.key = {"type": "partial", "facilities": "facility"}
+        self.demand = {str(i): {"area": 100, "demand": i, "serviceableDemand": i, "coverage": {"facility": {"1": i}}}
+                       for i in range(25)}
+
+    def tearDown(self):
+        shutil.rmtree(self.workspace)
+
+    def test_resume(self):
+        checkpoint = checkpointing.CoverageCheckpoint(self.path, self.key, interval=10)
+        self.assertEqual({}, checkpoint.load())
+        for demand_id in sorted(self.demand)[:15]:
+            checkpoint.add(demand_id, self.demand[demand_id])
+        # Killed before the last 5 were written, and part way through writing a line
+        with open(self.path, "a") as f:
+            f.write('["99", {"area"')
+        checkpoint = checkpointing.CoverageCheckpoint(self.path, self.key, interval=10)
+        completed = checkpoint.load()
+        self.assertEqual({demand_id: self.demand[demand_id] for demand_id in sorted(self.demand)[:10]}, completed)
+        with checkpoint:
+            for demand_id in sorted(self.demand)[10:]:
+                checkpoint.add(demand_id, self.demand[demand_id])
+        self.assertEqual(self.demand, checkpointing.CoverageCheckpoint(self.path, self.key).load())
+        with self.assertRaises(ValueError):
+            checkpointing.CoverageCheckpoint(self.path, {"type": "partial", "facilities": "other"}).load()
+
+    def test_resume_stats(self):
+        # The slivers and relations of the demand units restored from a checkpoint are counted again
+        sliver_filter = geometry_processing.SliverFilter(min_area=10)
+        relations = collections.Counter()
+        checkpoint = checkpointing.CoverageCheckpoint(self.path, self.key)
+        checkpoint.load()
+        with checkpoint:
+            for demand_id, covered_area in [("1", 5), ("2", 50), ("3", 2)]:
+                start = checkpointing.get_stats(sliver_filter, relations)
+                relations[geometry_processing.BOUNDARY] += 1
+                sliver_filter.is_sliver(covered_area, 100, covered_area)
+                checkpoint.add(demand_id, self.demand[demand_id],
+                               checkpointing.get_stats(sliver_filter, relations, start))
+        resumed_filter = geometry_processing.SliverFilter(min_area=10)
+        resumed_relations = collections.Counter()
+        checkpoint = checkpointing.CoverageCheckpoint(self.path, self.key)
+        for demand_id in checkpoint.load():
+            checkpointing.add_stats(checkpoint.stats.get(demand_id), resumed_filter, resumed_relations)
+        self.assertEqual(sliver_filter.get_report(), resumed_filter.get_report())
+        self.assertEqual({"slivers": 2, "discardedDemand": 7}, {k: resumed_filter.get_report()[k]
+                                                                 for k in ["slivers", "discardedDemand"]})
+        self.assertEqual(relations, resumed_relations)
+
+    def test_missing_header(self):
+        # Killed while the file was being created
+        for header in ["", '{"key": {"ty']:
+            with open(self.path, "w") as f:
+                f.write(header)
+            checkpoint = checkpointing.CoverageCheckpoint(self.path, self.key)
+            self.assertEqual({}, checkpoint.load())
+            with checkpoint:
+                checkpoint.add("1", self.demand["1"])
+            self.assertEqual({"1": self.demand["1"]}, checkpointing.CoverageCheckpoint(self.path, self.key).load())
+
+    def test_get_ids_hash(self):
+        self.assertEqual(checkpointing.get_ids_hash(["1", "2", "3"]), checkpointing.get_ids_hash([3, 1, 2, 2]))
+        self.assertNotEqual(checkpointing.get_ids_hash(["1", "2", "3"]), checkpointing.get_ids_hash(["1", "2"]))
+
+    def test_progress(self):
+        reports = []
+        progress = checkpointing.ProgressReporter(10, reports.append, seconds=0, completed=4)
+        for _ in range(6):
+            progress.update()
+        self.assertEqual(6, len(reports))
+        self.assertEqual(10, reports[-1]["completed"])
+        self.assertEqual(5, reports[0]["completed"])
+        # Nothing is left once all are completed (the eta is unknown until some time has passed)
+        self.assertIn(reports[-1]["eta"], [None, 0])
+        self.assertGreaterEqual(reports[-1]["rate"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
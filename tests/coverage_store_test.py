@@ -0,0 +1,130 @@
+# -*- coding: UTF-8 -*-
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyspatialopt.models import coverage_store, covering
+
+
+class CoverageStoreTest(unittest.TestCase):
+    def setUp(self):
+        with open("valid_coverages/binary_coverage_polygon1.json", "r") as f:
+            self.binary_coverage_polygon = json.load(f)
+        with open("valid_coverages/partial_coverage1.json", "r") as f:
+            self.partial_coverage = json.load(f)
+        with open("valid_coverages/traumah_coverage.json", "r") as f:
+            self.traumah_coverage = json.load(f)
+        self.workspace = tempfile.mkdtemp()
+        # Place the demand units on a line so they can be selected by bounding box
+        self.locations = {demand_id: (float(i), 0.0) for i, demand_id in
+                          enumerate(sorted(self.binary_coverage_polygon["demand"]))}
+
+    def tearDown(self):
+        shutil.rmtree(self.workspace)
+
+    def test_round_trip(self):
+        path = os.path.join(self.workspace, "coverage.db")
+        with coverage_store.CoverageStore(path) as store:
+            store.write_coverage(self.binary_coverage_polygon, self.locations)
+        with coverage_store.CoverageStore(path) as store:
+            coverage = store.load_coverage()
+        self.assertEqual(self.binary_coverage_polygon["demand"], coverage["demand"])
+        self.assertEqual(self.binary_coverage_polygon["facilities"], coverage["facilities"])
+        self.assertEqual(self.binary_coverage_polygon["type"], coverage["type"])
+        self.assertAlmostEqual(self.binary_coverage_polygon["totalDemand"], coverage["totalDemand"])
+        with coverage_store.CoverageStore(":memory:") as store:
+            store.write_coverage(self.partial_coverage)
+            self.assertEqual(self.partial_coverage["demand"], store.load_coverage()["demand"])
+
+    def test_queries(self):
+        with coverage_store.CoverageStore(":memory:") as store:
+            store.write_coverage(self.binary_coverage_polygon, self.locations)
+            for demand_id, demand_obj in self.binary_coverage_polygon["demand"].items():
+                self.assertEqual({k: v for k, v in demand_obj["coverage"].items() if v},
+                                 store.get_facilities_covering(demand_id))
+            covered = {demand_id: demand_obj["coverage"]["facility_service_areas"]["3"] for demand_id, demand_obj in
+                       self.binary_coverage_polygon["demand"].items()
+                       if "3" in demand_obj["coverage"]["facility_service_areas"]}
+            self.assertEqual(covered, store.get_demand_covered_by("facility_service_areas", "3"))
+            self.assertEqual(sum(self.binary_coverage_polygon["demand"][demand_id]["demand"] for demand_id in covered),
+                             store.get_reachable_demand("facility_service_areas", "3"))
+            self.assertEqual(0, store.get_reachable_demand("facility_service_areas", "missing"))
+            self.assertEqual(sorted(self.binary_coverage_polygon["demand"]), list(store.iter_demand_ids()))
+
+    def test_interleaved_selections(self):
+        ids = sorted(self.binary_coverage_polygon["demand"])
+        with coverage_store.CoverageStore(":memory:") as store:
+            store.write_coverage(self.binary_coverage_polygon, self.locations)
+            first = store.iter_demand(ids[:10])
+            self.assertEqual(ids[0], next(first)[0])
+            second = store.iter_demand(ids[5:20])
+            self.assertEqual(ids[5], next(second)[0])
+            self.assertEqual(ids[10:20], sorted(store.load_coverage(ids[10:20])["demand"]))
+            self.assertEqual(ids[1:10], [demand_id for demand_id, _ in first])
+            self.assertEqual(ids[6:20], [demand_id for demand_id, _ in second])
+            closed = store.iter_demand(ids[:3])
+            next(closed)
+            closed.close()
+            self.assertEqual([], store.connection.execute("SELECT name FROM sqlite_temp_master").fetchall())
+
+    def test_partial_load(self):
+        with coverage_store.CoverageStore(":memory:") as store:
+            store.write_coverage(self.binary_coverage_polygon, self.locations)
+            ids = list(store.iter_demand_ids(bbox=(10, -1, 59, 1)))
+            self.assertEqual(50, len(ids))
+            coverage = store.load_coverage(bbox=(10, -1, 59, 1))
+            self.assertEqual(set(ids), set(coverage["demand"]))
+            for demand_id, demand_obj in coverage["demand"].items():
+                self.assertEqual(self.binary_coverage_polygon["demand"][demand_id], demand_obj)
+                for facility_id in demand_obj["coverage"]["facility_service_areas"]:
+                    self.assertIn(facility_id, coverage["facilities"]["facility_service_areas"])
+            covering.create_mclp_model(coverage, {"total": 2})
+            coverage = store.load_coverage(demand_ids=ids[:5], bbox=(10, -1, 59, 1))
+            self.assertEqual(set(ids[:5]), set(coverage["demand"]))
+            coverage = store.load_coverage(facility_ids={"facility_service_areas": ["1", "2"]})
+            self.assertEqual(["1", "2"], coverage["facilities"]["facility_service_areas"])
+            self.assertEqual(len(self.binary_coverage_polygon["demand"]), len(coverage["demand"]))
+            for demand_obj in coverage["demand"].values():
+                self.assertTrue(set(demand_obj["coverage"].get("facility_service_areas", {})).issubset({"1", "2"}))
+
+    def test_append(self):
+        # Write the coverage in tiles of demand units, as the tiled generators do
+        demand_ids = sorted(self.partial_coverage["demand"])
+        with coverage_store.CoverageStore(":memory:") as store:
+            store.write_coverage(self.binary_coverage_polygon)
+            store.clear()
+            store.add_facilities(self.partial_coverage["facilities"])
+            for start in range(0, len(demand_ids), 30):
+                tile = {
+                    "version": self.partial_coverage["version"],
+                    "type": self.partial_coverage["type"],
+                    "demand": {demand_id: self.partial_coverage["demand"][demand_id]
+                               for demand_id in demand_ids[start:start + 30]},
+                    "facilities": {facility_type: [] for facility_type in self.partial_coverage["facilities"]}
+                }
+                tile["totalDemand"] = sum(demand_obj["demand"] for demand_obj in tile["demand"].values())
+                tile["totalServiceableDemand"] = sum(demand_obj["serviceableDemand"]
+                                                     for demand_obj in tile["demand"].values())
+                store.append_coverage(tile)
+            store.create_indexes()
+            coverage = store.load_coverage()
+            self.assertEqual(self.partial_coverage["demand"], coverage["demand"])
+            self.assertEqual(self.partial_coverage["facilities"], coverage["facilities"])
+            self.assertAlmostEqual(self.partial_coverage["totalDemand"], coverage["totalDemand"])
+            self.assertAlmostEqual(self.partial_coverage["totalServiceableDemand"],
+                                   coverage["totalServiceableDemand"])
+            with self.assertRaises(ValueError):
+                store.append_coverage(self.binary_coverage_polygon)
+
+    def test_invalid(self):
+        with coverage_store.CoverageStore(":memory:") as store:
+            with self.assertRaises(ValueError):
+                store.write_coverage(self.traumah_coverage)
+            with self.assertRaises(KeyError):
+                store.load_coverage()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+# -*- coding: UTF-8 -*-
+import json
+import unittest
+
+from pyspatialopt.models import covering
+
+
+class CoveringTest(unittest.TestCase):
+    def setUp(self):
+        # Read the coverages
+        with open("valid_coverages/binary_coverage_point1.json", "r") as f:
+            self.binary_coverage_point = json.load(f)
+        with open("valid_coverages/binary_coverage_point2.json", "r") as f:
+            self.binary_coverage_point2 = json.load(f)
+        with open("valid_coverages/partial_coverage1.json", "r") as f:
+            self.partial_coverage = json.load(f)
+        with open("valid_coverages/serviceable_demand_point.json", "r") as f:
+            self.serviceable_demand_point = json.load(f)
+
+    def test_merge_coverages(self):
+        merged_dict = covering.merge_coverages([self.binary_coverage_point, self.binary_coverage_point2])
+        self.assertEqual(["facility_service_areas", "facility2_service_areas"], sorted(merged_dict["facilities"],
+                                                                                        reverse=True))
+        for demand_id, demand_obj in merged_dict["demand"].items():
+            self.assertIs(self.binary_coverage_point["demand"][demand_id]["coverage"]["facility_service_areas"],
+                          demand_obj["coverage"]["facility_service_areas"])
+            self.assertIs(self.binary_coverage_point2["demand"][demand_id]["coverage"]["facility2_service_areas"],
+                          demand_obj["coverage"]["facility2_service_areas"])
+            if demand_obj["coverage"]["facility_service_areas"] or demand_obj["coverage"]["facility2_service_areas"]:
+                self.assertEqual(demand_obj["demand"], demand_obj["serviceableDemand"])
+        # The inputs should not be changed by the merge or by updates to the merged coverage
+        self.assertEqual(["facility_service_areas"], list(self.binary_coverage_point["facilities"].keys()))
+        covering.update_serviceable_demand(merged_dict, self.serviceable_demand_point)
+        self.assertEqual(565113.0, self.binary_coverage_point["totalServiceableDemand"])
+        for demand_obj in self.binary_coverage_point["demand"].values():
+            self.assertEqual(["facility_service_areas"], list(demand_obj["coverage"].keys()))
+
+    def test_merge_coverages_invalid(self):
+        with self.assertRaises(ValueError):
+            covering.merge_coverages([self.binary_coverage_point, self.binary_coverage_point])
+        with self.assertRaises(ValueError):
+            covering.merge_coverages([self.binary_coverage_point, self.partial_coverage])
+        del self.binary_coverage_point2["demand"]["49035100100"]
+        with self.assertRaises(ValueError):
+            covering.merge_coverages([self.binary_coverage_point, self.binary_coverage_point2])
+
+
+if __name__ == '__main__':
+    unittest.main()
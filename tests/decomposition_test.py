@@ -0,0 +1,61 @@
+# -*- coding: UTF-8 -*-
+import json
+import random
+import unittest
+
+from pyspatialopt.models import covering, decomposition, solving
+
+
+class DecompositionTest(unittest.TestCase):
+    def setUp(self):
+        with open("valid_coverages/binary_coverage_polygon1.json", "r") as f:
+            self.binary_coverage_polygon = json.load(f)
+        # Random demand and facility locations, demand is covered by facilities within a radius
+        rand = random.Random(3)
+        facilities = [(rand.random(), rand.random()) for _ in range(120)]
+        self.coverage = {
+            "type": {"mode": "coverage", "type": "binary"},
+            "demand": {},
+            "facilities": {"facility": [str(j) for j in range(len(facilities))]}
+        }
+        for i in range(2000):
+            x, y = rand.random(), rand.random()
+            self.coverage["demand"][str(i)] = {
+                "demand": rand.randint(1, 50),
+                "serviceableDemand": 0,
+                "coverage": {"facility": {str(j): 1 for j, (fx, fy) in enumerate(facilities)
+                                          if (fx - x) ** 2 + (fy - y) ** 2 <= 0.08 ** 2}}
+            }
+
+    def test_partition_coverage(self):
+        regions = decomposition.partition_coverage(self.coverage, max_region_facilities=30)
+        facilities = [facility for region in regions for facility in region]
+        self.assertEqual(120, len(facilities))
+        self.assertEqual(120, len(set(facilities)))
+        self.assertTrue(all(len(region) <= 30 for region in regions))
+        regions = decomposition.partition_coverage(self.coverage, num_regions=4)
+        self.assertGreaterEqual(len(regions), 4)
+        self.assertTrue(all(len(region) <= 30 for region in regions))
+
+    def test_solve_mclp_decomposed(self):
+        mclp = covering.create_mclp_model(self.coverage, {"total": 15})
+        optimal = solving.solve_model(mclp, "highs")["objective"]
+        for processes in [1, 2]:
+            result = decomposition.solve_mclp_decomposed(self.coverage, {"total": 15}, max_region_facilities=30,
+                                                         solver="highs", processes=processes)
+            self.assertEqual(15, sum(result["budgets"]))
+            self.assertEqual(15, len(result["ids"]["facility"]))
+            self.assertLessEqual(result["covered_demand"], optimal)
+            self.assertGreaterEqual(result["bound"], optimal)
+            self.assertLess(result["gap"], 0.1)
+
+    def test_single_region(self):
+        result = decomposition.solve_mclp_decomposed(self.binary_coverage_polygon, {"total": 5}, solver="highs")
+        self.assertEqual(['1', '4', '5', '6', '7'], result["ids"]["facility_service_areas"])
+        self.assertEqual(320453.0, result["covered_demand"])
+        with self.assertRaises(ValueError):
+            decomposition.solve_mclp_decomposed(self.binary_coverage_polygon, {"total": 5, "facility_service_areas": 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
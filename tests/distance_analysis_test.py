@@ -0,0 +1,61 @@
+# -*- coding: UTF-8 -*-
+import math
+import random
+import unittest
+
+from pyspatialopt.analysis import distance_analysis
+
+
+def haversine(point1, point2, earth_radius=distance_analysis.EARTH_RADIUS):
+    longitude1, latitude1 = map(math.radians, point1)
+    longitude2, latitude2 = map(math.radians, point2)
+    h = math.sin((latitude2 - latitude1) / 2) ** 2 + \
+        math.cos(latitude1) * math.cos(latitude2) * math.sin((longitude2 - longitude1) / 2) ** 2
+    return 2 * earth_radius * math.asin(math.sqrt(h))
+
+
+class DistanceAnalysisTest(unittest.TestCase):
+    def setUp(self):
+        rand = random.Random(1)
+        self.dl_points = [(rand.uniform(0, 1000), rand.uniform(0, 1000)) for _ in range(500)]
+        self.fl_points = [(rand.uniform(0, 1000), rand.uniform(0, 1000)) for _ in range(20)]
+        self.dl_ids = [str(i) for i in range(500)]
+        self.dl_demand = [rand.randint(1, 100) for _ in range(500)]
+        self.fl_ids = [str(j) for j in range(20)]
+
+    def test_radius_coverage(self):
+        coverage = distance_analysis.generate_radius_coverage(self.dl_ids, self.dl_demand, self.dl_points,
+                                                              self.fl_ids, self.fl_points, 150)
+        self.assertEqual("binary", coverage["type"]["type"])
+        self.assertEqual(self.fl_ids, coverage["facilities"]["facility"])
+        self.assertEqual(sum(self.dl_demand), coverage["totalDemand"])
+        for i, demand_id in enumerate(self.dl_ids):
+            expected = {str(j): 1 for j, point in enumerate(self.fl_points)
+                        if math.hypot(point[0] - self.dl_points[i][0], point[1] - self.dl_points[i][1]) <= 150}
+            self.assertEqual(expected, coverage["demand"][demand_id]["coverage"]["facility"])
+            self.assertEqual(self.dl_demand[i] if expected else 0, coverage["demand"][demand_id]["serviceableDemand"])
+
+    def test_multiple_radii(self):
+        coverages = distance_analysis.generate_radius_coverage(self.dl_ids, self.dl_demand, self.dl_points,
+                                                               self.fl_ids, self.fl_points, [50, 150])
+        self.assertEqual(2, len(coverages))
+        self.assertEqual(coverages[1], distance_analysis.generate_radius_coverage(
+            self.dl_ids, self.dl_demand, self.dl_points, self.fl_ids, self.fl_points, 150))
+        self.assertEqual(coverages[0], distance_analysis.generate_radius_coverage(
+            self.dl_ids, self.dl_demand, self.dl_points, self.fl_ids, self.fl_points, 50))
+        self.assertLess(coverages[0]["totalServiceableDemand"], coverages[1]["totalServiceableDemand"])
+
+    def test_geographic(self):
+        # Longitude/latitude around New York, a radius of 1.5 miles in meters
+        dl_points = [(-74.5 + x / 1000.0, 40.5 + y / 1000.0) for x, y in self.dl_points]
+        fl_points = [(-74.5 + x / 1000.0, 40.5 + y / 1000.0) for x, y in self.fl_points]
+        fl_indexes, dl_indexes, distances = distance_analysis.get_pairs_within(dl_points, fl_points, 2414.0, True)
+        expected = set((j, i) for j, fl_point in enumerate(fl_points) for i, dl_point in enumerate(dl_points)
+                       if haversine(fl_point, dl_point) <= 2414.0)
+        self.assertEqual(expected, set(zip(fl_indexes.tolist(), dl_indexes.tolist())))
+        for j, i, distance in zip(fl_indexes, dl_indexes, distances):
+            self.assertAlmostEqual(haversine(fl_points[j], dl_points[i]), distance, places=3)
+
+
+if __name__ == '__main__':
+    unittest.main()
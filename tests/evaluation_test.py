@@ -0,0 +1,105 @@
+# -*- coding: UTF-8 -*-
+import json
+import random
+import unittest
+
+import numpy
+
+from pyspatialopt.models import covering, evaluation, solving, utilities
+
+
+class EvaluationTest(unittest.TestCase):
+    def setUp(self):
+        with open("valid_coverages/binary_coverage_polygon1.json", "r") as f:
+            self.binary_coverage_polygon = json.load(f)
+        with open("valid_coverages/partial_coverage1.json", "r") as f:
+            self.partial_coverage = json.load(f)
+        with open("valid_coverages/traumah_coverage.json", "r") as f:
+            self.traumah_coverage = json.load(f)
+        rand = random.Random(0)
+        facilities = self.binary_coverage_polygon["facilities"]["facility_service_areas"]
+        self.candidates = [{"facility_service_areas": rand.sample(facilities, rand.randint(0, len(facilities)))}
+                           for _ in range(200)]
+
+    def test_evaluate_binary(self):
+        evaluator = evaluation.CoverageEvaluator(self.binary_coverage_polygon)
+        scores = evaluator.evaluate(self.candidates, psi=50)
+        for i, candidate in enumerate(self.candidates):
+            covered_demand = utilities.get_covered_demand(self.binary_coverage_polygon, candidate)
+            self.assertAlmostEqual(covered_demand["total"], scores["covered_demand"][i])
+            self.assertEqual(len(candidate["facility_service_areas"]), scores["num_facilities"][i])
+            chosen = set(candidate["facility_service_areas"])
+            backup_demand = sum(demand_obj["demand"] for demand_obj in self.binary_coverage_polygon["demand"].values()
+                                if len(chosen.intersection(demand_obj["coverage"]["facility_service_areas"])) > 1)
+            self.assertAlmostEqual(backup_demand, scores["backup_demand"][i])
+            self.assertEqual(scores["percent_covered"][i] >= 50, scores["threshold_met"][i])
+        # Small chunks give the same result
+        evaluator.max_chunk_size = 1
+        self.assertTrue(numpy.allclose(scores["covered_demand"], evaluator.evaluate(self.candidates)["covered_demand"]))
+
+    def test_evaluate_partial(self):
+        evaluator = evaluation.CoverageEvaluator(self.partial_coverage)
+        scores = evaluator.evaluate(self.candidates)
+        for i, candidate in enumerate(self.candidates):
+            self.assertAlmostEqual(utilities.get_covered_demand(self.partial_coverage, candidate)["total"],
+                                   scores["covered_demand"][i])
+        matrix = evaluator.get_candidate_matrix(self.candidates)
+        self.assertTrue(numpy.array_equal(scores["covered_count"], evaluator.evaluate(matrix)["covered_count"]))
+
+    def test_validate_solution(self):
+        mclp = covering.create_mclp_model(self.binary_coverage_polygon, {"total": 5})
+        result = solving.solve_model(mclp, "cbc")
+        evaluator = evaluation.CoverageEvaluator(self.binary_coverage_polygon)
+        candidate = evaluator.get_candidate_from_problem(mclp)
+        self.assertEqual(5, len(candidate["facility_service_areas"]))
+        self.assertAlmostEqual(result["objective"], evaluator.evaluate([candidate])["covered_demand"][0])
+
+    def _check_session(self, session, coverage, evaluator):
+        candidate = session.get_open_facilities()
+        scores = evaluator.evaluate([candidate])
+        summary = session.get_summary()
+        for key in ["covered_demand", "covered_count", "backup_demand", "backup_count", "num_facilities"]:
+            self.assertAlmostEqual(scores[key][0], summary[key])
+        # The marginal value of each facility is the change in covered demand if it is toggled
+        for facility_id in coverage["facilities"]["facility_service_areas"]:
+            toggled = set(candidate.get("facility_service_areas", [])) ^ {facility_id}
+            other = evaluator.evaluate([{"facility_service_areas": list(toggled)}])["covered_demand"][0]
+            self.assertAlmostEqual(abs(other - scores["covered_demand"][0]),
+                                   session.get_marginal("facility_service_areas", facility_id))
+
+    def test_what_if_session(self):
+        for coverage in [self.binary_coverage_polygon, self.partial_coverage]:
+            evaluator = evaluation.CoverageEvaluator(coverage)
+            session = evaluation.WhatIfSession(coverage, {"facility_service_areas": ["1", "2"]})
+            self._check_session(session, coverage, evaluator)
+            rand = random.Random(1)
+            summaries = [session.get_summary()]
+            for _ in range(20):
+                summaries.append(session.toggle("facility_service_areas",
+                                                rand.choice(coverage["facilities"]["facility_service_areas"])))
+                self._check_session(session, coverage, evaluator)
+            # Undo goes back through the same states
+            for summary in reversed(summaries[:-1]):
+                undone = session.undo()
+                for key in summary:
+                    self.assertAlmostEqual(summary[key], undone[key])
+            self._check_session(session, coverage, evaluator)
+            with self.assertRaises(IndexError):
+                session.undo()
+            session.open_facility("facility_service_areas", "1")
+            self.assertEqual({"facility_service_areas": ["1", "2"]}, session.get_open_facilities())
+            session.close_facility("facility_service_areas", "1")
+            self.assertEqual({"facility_service_areas": ["2"]}, session.get_open_facilities())
+            with self.assertRaises(ValueError):
+                session.toggle("facility_service_areas", "missing")
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            evaluation.CoverageEvaluator(self.traumah_coverage)
+        evaluator = evaluation.CoverageEvaluator(self.binary_coverage_polygon)
+        with self.assertRaises(ValueError):
+            evaluator.evaluate([{"facility_service_areas": ["missing"]}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+# -*- coding: UTF-8 -*-
+import math
+import random
+import unittest
+
+from pyspatialopt.analysis import geometry_processing, raster_analysis
+
+
+def star(x, y, radius, count, rand):
+    # A detailed ring (counter clockwise) with small concave notches, like a network service area
+    return [(x + radius * rand.uniform(0.98, 1.0) * math.cos(2 * math.pi * i / count),
+             y + radius * rand.uniform(0.98, 1.0) * math.sin(2 * math.pi * i / count)) for i in range(count)]
+
+
+class GeometryProcessingTest(unittest.TestCase):
+    def setUp(self):
+        rand = random.Random(1)
+        self.ring = star(500, 500, 400, 500, rand)
+        self.area = geometry_processing.get_ring_area(self.ring)
+
+    def test_get_ring_area(self):
+        square = [(0, 0), (10, 0), (10, 10), (0, 10), (0, 0)]
+        self.assertEqual(100, geometry_processing.get_ring_area(square))
+        self.assertEqual(-100, geometry_processing.get_ring_area(list(reversed(square))))
+
+    def test_simplify_ring(self):
+        simplified = geometry_processing.simplify_ring(self.ring, 5000)
+        self.assertLess(len(simplified), len(self.ring) / 2)
+        self.assertLessEqual(abs(geometry_processing.get_ring_area(simplified) - self.area), 5000)
+        self.assertEqual(3, len(geometry_processing.simplify_ring(self.ring, float("inf"))))
+        self.assertEqual(len(self.ring), len(geometry_processing.simplify_ring(self.ring, 0)))
+
+    def test_snap_ring(self):
+        ring = [(0.1, 0.1), (0.2, 0.1), (10.1, 0.2), (10.2, 9.9), (0.1, 10.1)]
+        self.assertEqual([(0, 0), (10, 0), (10, 10), (0, 10)], geometry_processing.snap_ring(ring, 1))
+        self.assertEqual([], geometry_processing.snap_ring(ring, 100))
+
+    def test_clip_ring(self):
+        # A U shape clipped across both arms becomes a ring for each arm
+        ring = [(0, 0), (30, 0), (30, 30), (20, 30), (20, 10), (10, 10), (10, 30), (0, 30)]
+        clipped = geometry_processing.clip_ring(ring, (-5, 15, 35, 35))
+        self.assertEqual(2, len(clipped))
+        self.assertEqual([150, 150], [geometry_processing.get_ring_area(piece) for piece in clipped])
+        self.assertEqual([[(0, 15), (0, 30), (10, 15), (10, 30)], [(20, 15), (20, 30), (30, 15), (30, 30)]],
+                         sorted(sorted(piece) for piece in clipped))
+        # Holes (clockwise rings) are split the same way
+        self.assertEqual([-150, -150], sorted(geometry_processing.get_ring_area(piece) for piece in
+                                              geometry_processing.clip_ring(ring[::-1], (-5, 15, 35, 35))))
+        self.assertEqual([ring], geometry_processing.clip_ring(ring, (-1, -1, 31, 31)))
+        self.assertEqual([], geometry_processing.clip_ring(ring, (40, 40, 50, 50)))
+        # Every piece of every tile keeps the orientation of the ring and the pieces add up to the ring
+        tiles = geometry_processing.get_tiles([self.ring], 20)
+        pieces = [piece for tile in tiles for piece in geometry_processing.clip_ring(self.ring, tile)]
+        self.assertTrue(all(geometry_processing.get_ring_area(piece) > 0 for piece in pieces))
+        self.assertAlmostEqual(geometry_processing.get_ring_area(self.ring),
+                               sum(geometry_processing.get_ring_area(piece) for piece in pieces))
+
+    def test_get_tiles(self):
+        tiles = geometry_processing.get_tiles([self.ring], 50)
+        self.assertGreater(len(tiles), 1)
+        for xmin, ymin, xmax, ymax in tiles:
+            inside = [point for point in self.ring if xmin <= point[0] <= xmax and ymin <= point[1] <= ymax]
+            self.assertLessEqual(len(inside), 52)
+
+    def test_get_polygon_parts(self):
+        exterior = [(0, 0), (10, 0), (10, 10), (0, 10)]
+        hole = [(2, 2), (2, 4), (4, 4), (4, 2)]
+        other = [(20, 0), (30, 0), (30, 10), (20, 10)]
+        self.assertEqual([[exterior, hole], [other]],
+                         geometry_processing.get_polygon_parts([exterior, other, hole]))
+        # An island in a lake with a pond of its own, the pond is a hole of the island
+        lake = [(1, 1), (1, 9), (9, 9), (9, 1)]
+        island = [(3, 3), (7, 3), (7, 7), (3, 7)]
+        pond = [(4, 4), (4, 6), (6, 6), (6, 4)]
+        self.assertEqual([[exterior, lake], [island, pond]],
+                         geometry_processing.get_polygon_parts([exterior, pond, island, lake]))
+        # A hole clipped along the same edge as its exterior
+        self.assertEqual([[[(0, 0), (5, 0), (5, 5), (0, 5)], [(0, 2), (0, 3), (2, 3), (2, 2)]]],
+                         geometry_processing.get_polygon_parts([[(0, 0), (5, 0), (5, 5), (0, 5)],
+                                                                [(0, 2), (0, 3), (2, 3), (2, 2)]]))
+
+    def test_classify_bounds(self):
+        service_area = (0, 0, 100, 100)
+        self.assertEqual(geometry_processing.DISJOINT, geometry_processing.classify_bounds((110, 0, 120, 10),
+                                                                                         service_area))
+        self.assertEqual(geometry_processing.INSIDE, geometry_processing.classify_bounds((10, 10, 20, 20),
+                                                                                       service_area))
+        self.assertEqual(geometry_processing.INSIDE, geometry_processing.classify_bounds(service_area, service_area))
+        self.assertEqual(geometry_processing.BOUNDARY, geometry_processing.classify_bounds((90, 90, 120, 120),
+                                                                                         service_area))
+
+    def test_sliver_filter(self):
+        sliver_filter = geometry_processing.SliverFilter(min_area=10, min_share=0.01, min_demand=5)
+        self.assertFalse(sliver_filter.is_sliver(50, 1000, 20))
+        self.assertTrue(sliver_filter.is_sliver(5, 1000, 20))
+        self.assertTrue(sliver_filter.is_sliver(50, 10000, 20))
+        self.assertTrue(sliver_filter.is_sliver(50, 1000, 2))
+        self.assertEqual({"minArea": 10, "minShare": 0.01, "minDemand": 5, "slivers": 3, "discardedDemand": 42},
+                         sliver_filter.get_report())
+        self.assertFalse(geometry_processing.SliverFilter().is_active())
+        self.assertFalse(geometry_processing.SliverFilter().is_sliver(0.001, 1000, 0))
+
+    def test_preprocess_polygons(self):
+        hole = [(450, 450), (450, 550), (550, 550), (550, 450)]
+        piece_ids, pieces = geometry_processing.preprocess_polygons(["a", "b"], [[self.ring, hole], [self.ring]],
+                                                                    area_tolerance=100, max_vertices=40)
+        self.assertEqual({"a", "b"}, set(piece_ids))
+        for polygon_id, expected in [("a", self.area - 10000), ("b", self.area)]:
+            area = sum(geometry_processing.get_ring_area(ring) for piece_id, rings in zip(piece_ids, pieces)
+                       for ring in rings if piece_id == polygon_id)
+            self.assertLessEqual(abs(area - expected), 200)
+        for rings in pieces:
+            self.assertLessEqual(sum(len(ring) for ring in rings), 80)
+
+    def test_partial_coverage_of_pieces(self):
+        # The coverage of the pieces is summed back to the facility
+        dl_ids = [str(i) for i in range(4)]
+        dl_polygons = [[[(x, y), (x + 500, y), (x + 500, y + 500), (x, y + 500)]] for x in [0, 500] for y in [0, 500]]
+        dl_demand = [1000] * 4
+        piece_ids, pieces = geometry_processing.preprocess_polygons(["0"], [[self.ring]], max_vertices=40)
+        whole = raster_analysis.generate_partial_coverage(dl_ids, dl_demand, dl_polygons, ["0"], [[self.ring]], 5)
+        subdivided = raster_analysis.generate_partial_coverage(dl_ids, dl_demand, dl_polygons, piece_ids, pieces, 5)
+        self.assertEqual(["0"], subdivided["facilities"]["facility"])
+        for demand_id in dl_ids:
+            self.assertAlmostEqual(whole["demand"][demand_id]["coverage"]["facility"]["0"],
+                                   subdivided["demand"][demand_id]["coverage"]["facility"]["0"], delta=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+# -*- coding: UTF-8 -*-
+import random
+import unittest
+
+from pyspatialopt.models import covering, hierarchical, solving
+
+
+class HierarchicalTest(unittest.TestCase):
+    def setUp(self):
+        # Random demand (blocks) in a 20 x 20 grid of tracts, demand is covered by facilities within a radius
+        rand = random.Random(5)
+        facilities = [(rand.random(), rand.random()) for _ in range(150)]
+        self.coverage = {
+            "type": {"mode": "coverage", "type": "binary"},
+            "demand": {},
+            "facilities": {"facility": [str(j) for j in range(len(facilities))]}
+        }
+        self.locations = {}
+        self.parent_ids = {}
+        for i in range(1500):
+            x, y = rand.random(), rand.random()
+            self.locations[str(i)] = (x, y)
+            self.parent_ids[str(i)] = "{}_{}".format(int(x * 20), int(y * 20))
+            self.coverage["demand"][str(i)] = {
+                "demand": rand.randint(1, 50),
+                "serviceableDemand": 0,
+                "coverage": {"facility": {str(j): 1 for j, (fx, fy) in enumerate(facilities)
+                                          if (fx - x) ** 2 + (fy - y) ** 2 <= 0.15 ** 2}}
+            }
+
+    def test_aggregate_coverage(self):
+        coarse = hierarchical.aggregate_coverage(self.coverage, self.parent_ids)
+        self.assertEqual(len(set(self.parent_ids.values())), len(coarse["demand"]))
+        self.assertEqual(sum(demand_obj["demand"] for demand_obj in self.coverage["demand"].values()),
+                         sum(demand_obj["demand"] for demand_obj in coarse["demand"].values()))
+        for demand_id, demand_obj in self.coverage["demand"].items():
+            self.assertLessEqual(set(demand_obj["coverage"]["facility"]),
+                                 set(coarse["demand"][self.parent_ids[demand_id]]["coverage"]["facility"]))
+        with self.assertRaises(ValueError):
+            hierarchical.aggregate_coverage(self.coverage, {"0": "0_0"})
+
+    def test_get_neighbourhood(self):
+        ids = {"facility": ["0"]}
+        self.assertEqual({("facility", "0")}, hierarchical.get_neighbourhood(self.coverage, ids, 0))
+        first = hierarchical.get_neighbourhood(self.coverage, ids, 1)
+        second = hierarchical.get_neighbourhood(self.coverage, ids, 2)
+        self.assertIn(("facility", "0"), first)
+        self.assertLess(first, second)
+
+    def test_solve_mclp(self):
+        optimal = solving.solve_model(covering.create_mclp_model(self.coverage, {"total": 6}), "highs")["objective"]
+        result = hierarchical.solve_hierarchical(self.coverage, "mclp", {"total": 6}, parent_ids=self.parent_ids,
+                                                 solver="highs")
+        self.assertEqual(6, len(result["ids"]["facility"]))
+        self.assertEqual(len(set(self.parent_ids.values())), result["coarse_demand"])
+        self.assertLess(result["candidates"], 150)
+        self.assertLessEqual(result["objective"], optimal)
+        self.assertGreaterEqual(result["bound"], optimal)
+        self.assertAlmostEqual((result["bound"] - result["objective"]) / result["objective"], result["gap"])
+        self.assertGreater(result["objective"], 0.9 * optimal)
+
+    def test_solve_lscp(self):
+        optimal = solving.solve_model(covering.create_lscp_model(self.coverage), "highs")["objective"]
+        result = hierarchical.solve_hierarchical(self.coverage, "lscp", locations=self.locations, num_clusters=50,
+                                                 solver="highs")
+        self.assertEqual(50, result["coarse_demand"])
+        self.assertGreaterEqual(result["objective"], optimal)
+        self.assertLessEqual(result["bound"], optimal)
+        self.assertEqual(result["objective"], len(result["ids"]["facility"]))
+        covered = set(result["ids"]["facility"])
+        for demand_obj in self.coverage["demand"].values():
+            self.assertTrue(covered & set(demand_obj["coverage"]["facility"]))
+        with self.assertRaises(ValueError):
+            hierarchical.solve_hierarchical(self.coverage, "lscp", solver="highs")
+
+
+if __name__ == '__main__':
+    unittest.main()
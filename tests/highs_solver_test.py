@@ -0,0 +1,99 @@
+# -*- coding: UTF-8 -*-
+import json
+import pulp
+import unittest
+
+from pyspatialopt.models import covering, highs_solver, utilities
+
+
+class HiGHSSolverTest(unittest.TestCase):
+    def setUp(self):
+        # Read the coverages
+        with open("valid_coverages/partial_coverage1.json", "r") as f:
+            self.partial_coverage = json.load(f)
+        with open("valid_coverages/binary_coverage_polygon1.json", "r") as f:
+            self.binary_coverage_polygon = json.load(f)
+        with open("valid_coverages/binary_coverage_point1.json", "r") as f:
+            self.binary_coverage_point = json.load(f)
+
+        with open("valid_coverages/partial_coverage2.json", "r") as f:
+            self.partial_coverage2 = json.load(f)
+        with open("valid_coverages/binary_coverage_point2.json", "r") as f:
+            self.binary_coverage_point2 = json.load(f)
+
+        with open("valid_coverages/serviceable_demand_polygon.json", "r") as f:
+            self.serviceable_demand_polygon = json.load(f)
+        with open("valid_coverages/serviceable_demand_point.json", "r") as f:
+            self.serviceable_demand_point = json.load(f)
+
+        with open("valid_coverages/traumah_coverage.json", "r") as f:
+            self.traumah_coverage = json.load(f)
+
+    def test_mclp(self):
+        mclp = covering.create_mclp_model(self.binary_coverage_polygon, {"total": 5})
+        highs_solver.solve_highs(mclp)
+        ids = utilities.get_ids(mclp, "facility_service_areas")
+        self.assertEqual(['1', '4', '5', '6', '7'], ids)
+        self.assertEqual(320453.0, pulp.value(mclp.objective))
+
+    def test_mclpcc(self):
+        mclpcc = covering.create_mclp_cc_model(self.partial_coverage, {"total": 5})
+        highs_solver.solve_highs(mclpcc)
+        ids = utilities.get_ids(mclpcc, "facility_service_areas")
+        self.assertEqual(['1', '4', '5', '6', '7'], ids)
+
+    def test_threshold(self):
+        threshold = covering.create_threshold_model(self.binary_coverage_point2, 30)
+        threshold_i = covering.create_threshold_model(self.binary_coverage_point2, 100)
+        highs_solver.solve_highs(threshold)
+        highs_solver.solve_highs(threshold_i)
+        self.assertEqual(3, len(utilities.get_ids(threshold, "facility2_service_areas")))
+        self.assertEqual(threshold_i.status, pulp.constants.LpStatusInfeasible)
+
+    def test_cc_threshold(self):
+        ccthreshold = covering.create_cc_threshold_model(self.partial_coverage2, 80)
+        ccthreshold_i = covering.create_cc_threshold_model(self.partial_coverage2, 100)
+        highs_solver.solve_highs(ccthreshold)
+        highs_solver.solve_highs(ccthreshold_i)
+        self.assertEqual(14, len(utilities.get_ids(ccthreshold, "facility2_service_areas")))
+        self.assertEqual(ccthreshold_i.status, pulp.constants.LpStatusInfeasible)
+
+    def test_backup(self):
+        merged_dict = covering.merge_coverages([self.binary_coverage_point, self.binary_coverage_point2])
+        merged_dict = covering.update_serviceable_demand(merged_dict, self.serviceable_demand_point)
+        bclp = covering.create_backup_model(merged_dict, {"total": 30})
+        highs_solver.solve_highs(bclp)
+        self.assertEqual(867716.0, pulp.value(bclp.objective))
+
+    def test_lscp(self):
+        merged_dict = covering.merge_coverages([self.binary_coverage_point, self.binary_coverage_point2])
+        lscp = covering.create_lscp_model(merged_dict)
+        lscp_i = covering.create_lscp_model(self.binary_coverage_point2)
+        highs_solver.solve_highs(lscp)
+        highs_solver.solve_highs(lscp_i)
+        self.assertEqual(24.0, pulp.value(lscp.objective))
+        self.assertEqual(lscp_i.status, pulp.constants.LpStatusInfeasible)
+
+    def test_traumah(self):
+        traumah = covering.create_traumah_model(self.traumah_coverage, 5, 10)
+        traumah_i = covering.create_traumah_model(self.traumah_coverage, 100, 100)
+        highs_solver.solve_highs(traumah)
+        highs_solver.solve_highs(traumah_i)
+        tc_ids = utilities.get_ids(traumah, "TraumaCenter")
+        self.assertEqual(['10', '12', '15', '16', '18', '19', '21', '22', '7', '9'], tc_ids)
+        self.assertEqual(72831.0, pulp.value(traumah.objective))
+        self.assertEqual(traumah_i.status, pulp.constants.LpStatusInfeasible)
+
+    def test_bclpcc(self):
+        merged_dict = covering.merge_coverages([self.partial_coverage, self.partial_coverage2])
+        merged_dict = covering.update_serviceable_demand(merged_dict, self.serviceable_demand_polygon)
+        bclpcc = covering.create_bclpcc_model(merged_dict, {"total": 3}, 0.2)
+        highs_solver.solve_highs(bclpcc)
+        ids = utilities.get_ids(bclpcc, "facility_service_areas")
+        ids2 = utilities.get_ids(bclpcc, "facility2_service_areas")
+        self.assertEqual(['4'], ids)
+        self.assertEqual(['10'], ids2)
+
+
+if __name__ == '__main__':
+    unittest.main()
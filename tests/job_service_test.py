@@ -0,0 +1,128 @@
+# -*- coding: UTF-8 -*-
+import asyncio
+import os
+import sys
+import unittest
+from unittest import mock
+
+from pyspatialopt.service import job_service
+
+
+class JobServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.coverage = "valid_coverages/binary_coverage_polygon1.json"
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_with_service(self, test, concurrency=1):
+        async def run():
+            service = job_service.JobService(concurrency=concurrency)
+            server = await service.start(port=0)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                return await test(service, port)
+            finally:
+                await service.stop()
+
+        return self.loop.run_until_complete(run())
+
+    def test_submit_and_watch(self):
+        async def test(service, port):
+            responses = []
+            for params in [{"num_fac": {"total": 5}}, {"num_fac": {"total": 1}}]:
+                async for response in job_service.request({"action": "submit", "coverage": self.coverage,
+                                                           "model": "mclp", "params": params}, port=port):
+                    responses.append(response)
+            events = []
+            for response in responses:
+                async for event in job_service.request({"action": "watch", "job_id": response["job_id"]},
+                                                       port=port):
+                    events.append(event)
+            return service, events
+
+        service, events = self.run_with_service(test)
+        done = [event["job"] for event in events if event["event"] == "done"]
+        self.assertEqual(["finished", "finished"], [job["status"] for job in done])
+        self.assertEqual(['1', '4', '5', '6', '7'], done[0]["result"]["ids"]["facility_service_areas"])
+        self.assertEqual(1, len(done[1]["result"]["ids"]["facility_service_areas"]))
+        self.assertTrue(any(event["event"] == "log" for event in events))
+        # The coverage is only loaded once
+        self.assertEqual(1, len(service.coverages))
+
+    def test_cancel_and_timeout(self):
+        async def test(service, port):
+            running = service.submit(self.coverage, "mclp", {"num_fac": {"total": 5}}, timeout=0.01)
+            queued = service.submit(self.coverage, "mclp", {"num_fac": {"total": 5}})
+            async for response in job_service.request({"action": "cancel", "job_id": queued.job_id}, port=port):
+                self.assertEqual("cancelled", response["status"])
+            events = service.subscribe(running)
+            while (await events.get())["event"] != "done":
+                pass
+            return running, queued
+
+        running, queued = self.run_with_service(test)
+        self.assertEqual("timeout", running.status)
+        self.assertEqual("cancelled", queued.status)
+        self.assertIsNone(queued.started)
+
+    def test_cancel_running(self):
+        async def test(service, port):
+            job = service.submit(self.coverage, "mclp", {"num_fac": {"total": 5}})
+            events = service.subscribe(job)
+            while (await events.get())["event"] != "log":
+                pass
+            # Cancelled while the model is being built or the solver is starting
+            service.cancel(job.job_id)
+            while (await events.get())["event"] != "done":
+                pass
+            return job, os.listdir(service.work_dir)
+
+        job, files = self.run_with_service(test)
+        self.assertEqual("cancelled", job.status)
+        self.assertEqual([], files)
+
+    def test_timeout_while_starting(self):
+        started = []
+        create_subprocess_exec = asyncio.create_subprocess_exec
+
+        async def slow_start(*args, **kwargs):
+            # A solver that takes a while to start and runs for a long time
+            process = await create_subprocess_exec(sys.executable, "-c", "import time; time.sleep(30)", **kwargs)
+            started.append(process)
+            await asyncio.sleep(1)
+            return process
+
+        async def test(service, port):
+            job = service.submit(self.coverage, "mclp", {"num_fac": {"total": 5}}, timeout=0.5)
+            events = service.subscribe(job)
+            while (await events.get())["event"] != "done":
+                pass
+            # The solver is killed once it has started rather than left running
+            try:
+                return job, await asyncio.wait_for(started[0].wait(), 5)
+            finally:
+                if started[0].returncode is None:
+                    started[0].kill()
+
+        with mock.patch.object(job_service.asyncio, "create_subprocess_exec", slow_start):
+            job, returncode = self.run_with_service(test)
+        self.assertEqual("timeout", job.status)
+        self.assertLess(returncode, 0)
+
+    def test_invalid_request(self):
+        async def test(service, port):
+            return [response async for response in job_service.request({"action": "submit",
+                                                                         "coverage": self.coverage,
+                                                                         "model": "unknown"}, port=port)]
+
+        responses = self.run_with_service(test)
+        self.assertIn("error", responses[0])
+        service = job_service.JobService(default_solver="unknown")
+        with self.assertRaisesRegex(ValueError, "'unknown' is not a supported solver"):
+            service.submit(self.coverage, "mclp", {"num_fac": {"total": 5}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+# -*- coding: UTF-8 -*-
+import subprocess
+import sys
+import unittest
+
+
+def get_loaded_modules(statement):
+    """
+    Runs a statement in a new interpreter and gets the modules that were loaded
+    """
+    output = subprocess.check_output([sys.executable, "-c",
+                                      "import sys\n{}\nprint(' '.join(sys.modules))".format(statement)])
+    return set(output.decode().split())
+
+
+class LazyImportTest(unittest.TestCase):
+    def test_import_package(self):
+        modules = get_loaded_modules("import pyspatialopt, pyspatialopt.analysis, pyspatialopt.models")
+        self.assertFalse({"arcpy", "qgis", "pulp", "highspy", "numpy"} & modules)
+
+    def test_import_analysis(self):
+        # The backends are only imported when a function needs them
+        modules = get_loaded_modules("from pyspatialopt.analysis import arcpy_analysis, pyqgis_analysis\n"
+                                     "arcpy_analysis.generate_query(['1'], 'FID')\n"
+                                     "pyqgis_analysis.generate_query(['1'], 'FID')")
+        self.assertFalse({"arcpy", "qgis"} & modules)
+        modules = get_loaded_modules("import pyspatialopt.analysis\n"
+                                     "pyspatialopt.analysis.arcpy_analysis.generate_query(['1'], 'FID')")
+        self.assertIn("pyspatialopt.analysis.arcpy_analysis", modules)
+        self.assertNotIn("arcpy", modules)
+
+    def test_import_models(self):
+        modules = get_loaded_modules("from pyspatialopt.models import covering, solving, utilities")
+        self.assertFalse({"arcpy", "qgis"} & modules)
+        modules = get_loaded_modules("from pyspatialopt.models import utilities")
+        self.assertNotIn("pulp", modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
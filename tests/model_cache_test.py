@@ -0,0 +1,82 @@
+# -*- coding: UTF-8 -*-
+import collections
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import pulp
+
+from pyspatialopt.models import model_cache
+
+
+class ModelCacheTest(unittest.TestCase):
+    def setUp(self):
+        with open("valid_coverages/binary_coverage_polygon1.json", "r") as f:
+            self.binary_coverage_polygon = json.load(f)
+        with open("valid_coverages/partial_coverage1.json", "r") as f:
+            self.partial_coverage = json.load(f)
+        self.workspace = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.workspace)
+
+    def _get_files(self, extension):
+        return [name for name in os.listdir(self.workspace) if name.endswith(extension)]
+
+    def test_coverage_hash(self):
+        # The order of the keys doesn't change the hash, the content does
+        reordered = collections.OrderedDict(reversed(list(self.binary_coverage_polygon.items())))
+        self.assertEqual(model_cache.get_coverage_hash(self.binary_coverage_polygon),
+                         model_cache.get_coverage_hash(reordered))
+        reordered["totalDemand"] += 1
+        self.assertNotEqual(model_cache.get_coverage_hash(self.binary_coverage_polygon),
+                            model_cache.get_coverage_hash(reordered))
+
+    def test_solve(self):
+        cache = model_cache.ModelCache(self.workspace)
+        result = cache.solve("mclp", self.binary_coverage_polygon, "cbc", num_fac={"total": 5})
+        self.assertFalse(result["cached"])
+        self.assertEqual(320453.0, result["objective"])
+        self.assertEqual({"facility_service_areas": ['1', '4', '5', '6', '7']}, result["ids"])
+        cached = cache.solve("mclp", self.binary_coverage_polygon, "cbc", num_fac={"total": 5})
+        self.assertTrue(cached["cached"])
+        result["cached"] = True
+        self.assertEqual(result, cached)
+        # Other solver settings reuse the model file, other parameters build a new model
+        result = cache.solve("mclp", self.binary_coverage_polygon, "highs", {"gap": 0.0}, num_fac={"total": 5})
+        self.assertFalse(result["cached"])
+        self.assertEqual(320453.0, result["objective"])
+        self.assertEqual(1, len(self._get_files(".mps")))
+        self.assertEqual(2, len(self._get_files(".json")))
+        cache.solve("mclp", self.binary_coverage_polygon, "cbc", num_fac={"total": 4})
+        self.assertEqual(2, len(self._get_files(".mps")))
+        with self.assertRaises(ValueError):
+            cache.solve("unknown", self.binary_coverage_polygon, "cbc", num_fac={"total": 5})
+
+    def test_create_model(self):
+        cache = model_cache.ModelCache(self.workspace)
+        model = cache.create_model("mclp_cc", self.partial_coverage, num_fac={"total": 5})
+        cached = cache.create_model("mclp_cc", self.partial_coverage, num_fac={"total": 5})
+        self.assertEqual(pulp.LpMaximize, cached.sense)
+        self.assertEqual(sorted(var.name for var in model.variables()), sorted(var.name for var in cached.variables()))
+        self.assertEqual(len(model.constraints), len(cached.constraints))
+
+    def test_evict(self):
+        cache = model_cache.ModelCache(self.workspace, max_size=0)
+        result = cache.solve("mclp", self.binary_coverage_polygon, "cbc", num_fac={"total": 5})
+        self.assertEqual(320453.0, result["objective"])
+        self.assertEqual([], os.listdir(self.workspace))
+        cache = model_cache.ModelCache(self.workspace)
+        cache.solve("mclp", self.binary_coverage_polygon, "cbc", num_fac={"total": 5})
+        cache.solve("mclp", self.binary_coverage_polygon, "cbc", num_fac={"total": 4})
+        # Only the most recently used model fits
+        size = os.path.getsize(os.path.join(self.workspace, self._get_files(".mps")[0]))
+        cache.max_size = size + 1024
+        cache.evict()
+        self.assertLessEqual(len(self._get_files(".mps")), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
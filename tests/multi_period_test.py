@@ -0,0 +1,85 @@
+# -*- coding: UTF-8 -*-
+import copy
+import json
+import random
+import unittest
+
+from pyspatialopt.models import covering, multi_period, solving, utilities
+
+
+class MultiPeriodTest(unittest.TestCase):
+    def setUp(self):
+        # Read the coverages
+        with open("valid_coverages/binary_coverage_polygon1.json", "r") as f:
+            self.binary_coverage_polygon = json.load(f)
+        with open("valid_coverages/partial_coverage1.json", "r") as f:
+            self.partial_coverage = json.load(f)
+        # Random demand for each period, including a unit with no demand
+        rand = random.Random(1)
+        self.binary_periods = []
+        self.partial_periods = []
+        for period in range(3):
+            demand = {demand_id: rand.randint(0, 5000) for demand_id in self.binary_coverage_polygon["demand"]}
+            demand[sorted(demand)[period]] = 0
+            self.binary_periods.append(demand)
+            self.partial_periods.append({demand_id: rand.randint(0, 5000)
+                                         for demand_id in self.partial_coverage["demand"]})
+
+    @staticmethod
+    def _reweight(coverage, demand):
+        """
+        Builds the coverage the multi period model is equivalent to for a period
+        """
+        coverage = copy.deepcopy(coverage)
+        for demand_id, demand_obj in coverage["demand"].items():
+            ratio = float(demand[demand_id]) / demand_obj["demand"] if demand_obj["demand"] else 0.0
+            demand_obj["demand"] = demand[demand_id]
+            demand_obj["serviceableDemand"] *= ratio
+            if coverage["type"]["type"] == "partial":
+                for facility_type in demand_obj["coverage"]:
+                    for facility_id in demand_obj["coverage"][facility_type]:
+                        demand_obj["coverage"][facility_type][facility_id] *= ratio
+        return coverage
+
+    def test_mclp(self):
+        results = multi_period.solve_periods(self.binary_coverage_polygon, {"total": 5}, self.binary_periods,
+                                             solver="cbc")
+        self.assertEqual([0, 1, 2], [result["period"] for result in results])
+        for demand, result in zip(self.binary_periods, results):
+            mclp = covering.create_mclp_model(self._reweight(self.binary_coverage_polygon, demand), {"total": 5})
+            expected = solving.solve_model(mclp, "cbc")
+            self.assertAlmostEqual(expected["objective"], result["objective"], places=4)
+            self.assertEqual(5, len(result["ids"]["facility_service_areas"]))
+
+    def test_mclp_cc(self):
+        for use_serviceable_demand in [False, True]:
+            model = multi_period.MultiPeriodModel(self.partial_coverage, {"total": 5}, "mclp_cc",
+                                                  use_serviceable_demand)
+            for demand in self.partial_periods:
+                # Lists are in the order of the coverage demand
+                result = model.solve_period([demand[demand_id] for demand_id in model.demand_ids], "cbc")
+                mclp_cc = covering.create_mclp_cc_model(self._reweight(self.partial_coverage, demand), {"total": 5},
+                                                        use_serviceable_demand=use_serviceable_demand)
+                expected = solving.solve_model(mclp_cc, "cbc")
+                self.assertAlmostEqual(expected["objective"], result["objective"], places=2)
+                self.assertEqual(5, len(utilities.get_ids(model.problem, "facility_service_areas")))
+
+    def test_processes(self):
+        serial = multi_period.solve_periods(self.partial_coverage, {"total": 5}, self.partial_periods, "mclp_cc",
+                                            solver="cbc")
+        parallel = multi_period.solve_periods(self.partial_coverage, {"total": 5}, self.partial_periods, "mclp_cc",
+                                              solver="cbc", processes=2)
+        self.assertEqual([0, 1, 2], [result["period"] for result in parallel])
+        for expected, result in zip(serial, parallel):
+            self.assertAlmostEqual(expected["objective"], result["objective"], places=2)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            multi_period.MultiPeriodModel(self.binary_coverage_polygon, {"total": 5}, "lscp")
+        model = multi_period.MultiPeriodModel(self.binary_coverage_polygon, {"total": 5})
+        with self.assertRaises(ValueError):
+            model.set_demand([1, 2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
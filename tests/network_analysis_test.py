@@ -0,0 +1,89 @@
+# -*- coding: UTF-8 -*-
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from pyspatialopt.analysis import network_analysis
+
+
+class NetworkAnalysisTest(unittest.TestCase):
+    def setUp(self):
+        self.workspace = tempfile.mkdtemp()
+        # A road along the x axis with nodes every 100 and a one way spur north of node 2
+        self.nodes_file = os.path.join(self.workspace, "nodes.csv")
+        with open(self.nodes_file, "w") as f:
+            f.write("node_id,x,y\n")
+            for i in range(6):
+                f.write("{},{},0\n".format(i, i * 100))
+            f.write("6,200,100\n")
+        self.edges_file = os.path.join(self.workspace, "edges.csv")
+        with open(self.edges_file, "w") as f:
+            f.write("from_node,to_node,length\n")
+            for i in range(5):
+                f.write("{},{},100\n".format(i, i + 1))
+            f.write("2,6,100\n")
+            # A longer parallel edge is ignored
+            f.write("0,1,150\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.workspace)
+
+    def test_read_road_network(self):
+        network = network_analysis.read_road_network(self.edges_file, self.nodes_file)
+        self.assertEqual(7, len(network.node_ids))
+        self.assertEqual(6, network.graph.nnz)
+        nodes, distances = network.snap([(10, 5), (210, 90)])
+        self.assertEqual(["0", "6"], [network.node_ids[node] for node in nodes])
+        self.assertAlmostEqual(125 ** 0.5, distances[0])
+        self.assertEqual([0, 100, 200, 300, 400, 500, 300], network.get_distances([0], 1000)[0].tolist())
+        with self.assertRaises(ValueError):
+            network_analysis.read_road_network(self.edges_file, self.nodes_file, length_field="minutes")
+        with self.assertRaises(ValueError):
+            network_analysis.RoadNetwork(["1"], [(0, 0)], [("1", "2", 1)])
+
+    def test_binary_coverage(self):
+        network = network_analysis.read_road_network(self.edges_file, self.nodes_file)
+        dl_points = [(0, 0), (100, 0), (300, 10), (500, 0), (200, 100)]
+        coverage = network_analysis.generate_binary_coverage(network, ["a", "b", "c", "d", "e"], [10, 20, 30, 40, 50],
+                                                             dl_points, ["f1", "f2"], [(0, 0), (500, 0)], 200)
+        self.assertEqual("binary", coverage["type"]["type"])
+        self.assertEqual({"facility": ["f1", "f2"]}, coverage["facilities"])
+        self.assertEqual({"f1": 1}, coverage["demand"]["a"]["coverage"]["facility"])
+        self.assertEqual({"f1": 1}, coverage["demand"]["b"]["coverage"]["facility"])
+        # 200 along the network plus 10 to snap is too far
+        self.assertEqual({}, coverage["demand"]["c"]["coverage"]["facility"])
+        self.assertEqual({}, coverage["demand"]["e"]["coverage"]["facility"])
+        self.assertEqual(150, coverage["totalDemand"])
+        self.assertEqual(70, coverage["totalServiceableDemand"])
+        coverage = network_analysis.generate_binary_coverage(network, ["a", "b", "c", "d", "e"], [10, 20, 30, 40, 50],
+                                                             dl_points, ["f1", "f2"], [(0, 0), (500, 0)], 200,
+                                                             include_snap_distance=False)
+        self.assertEqual({"f2": 1}, coverage["demand"]["c"]["coverage"]["facility"])
+        # The spur is one way so the facility at its end can't reach the road
+        network = network_analysis.read_road_network(self.edges_file, self.nodes_file, directed=True)
+        coverage = network_analysis.generate_binary_coverage(network, ["a", "e"], [10, 50], [(200, 0), (200, 100)],
+                                                             ["f1", "f2"], [(100, 0), (200, 100)], 200)
+        self.assertEqual({"f1": 1}, coverage["demand"]["a"]["coverage"]["facility"])
+        self.assertEqual({"f1": 1, "f2": 1}, coverage["demand"]["e"]["coverage"]["facility"])
+
+    def test_batches(self):
+        # A grid network, the coverage doesn't depend on how the facilities are batched
+        rand = random.Random(1)
+        node_ids = [str(i) for i in range(400)]
+        node_points = [(i % 20 * 100.0, i // 20 * 100.0) for i in range(400)]
+        edges = [(str(i), str(i + 1), rand.uniform(100, 200)) for i in range(400) if i % 20 != 19] + \
+                [(str(i), str(i + 20), rand.uniform(100, 200)) for i in range(380)]
+        network = network_analysis.RoadNetwork(node_ids, node_points, edges)
+        dl_points = [(rand.uniform(0, 1900), rand.uniform(0, 1900)) for _ in range(300)]
+        fl_points = [(rand.uniform(0, 1900), rand.uniform(0, 1900)) for _ in range(30)]
+        args = (network, range(300), [1] * 300, dl_points, range(30), fl_points, 500)
+        coverage = network_analysis.generate_binary_coverage(*args)
+        self.assertEqual(coverage, network_analysis.generate_binary_coverage(*args, batch_size=4))
+        self.assertEqual(coverage, network_analysis.generate_binary_coverage(*args, batch_size=4, processes=2))
+        self.assertGreater(coverage["totalServiceableDemand"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
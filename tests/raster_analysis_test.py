@@ -0,0 +1,124 @@
+# -*- coding: UTF-8 -*-
+import random
+import unittest
+
+from pyspatialopt.analysis import raster_analysis
+
+
+def rectangle(xmin, ymin, xmax, ymax):
+    return [(xmin, ymin), (xmin, ymax), (xmax, ymax), (xmax, ymin)]
+
+
+class RasterAnalysisTest(unittest.TestCase):
+    def setUp(self):
+        # A 10x10 grid of 100x100 demand squares and rectangular service areas, so the exact coverage is known
+        rand = random.Random(1)
+        self.dl_ids = []
+        self.dl_demand = []
+        self.dl_polygons = []
+        for row in range(10):
+            for column in range(10):
+                self.dl_ids.append(str(row * 10 + column))
+                self.dl_demand.append(rand.randint(1, 1000))
+                self.dl_polygons.append([rectangle(column * 100, row * 100, (column + 1) * 100, (row + 1) * 100)])
+        self.fl_ids = [str(j) for j in range(8)]
+        self.fl_bounds = []
+        for j in range(8):
+            x = rand.uniform(-100, 900)
+            y = rand.uniform(-100, 900)
+            self.fl_bounds.append((x, y, x + rand.uniform(50, 400), y + rand.uniform(50, 400)))
+        self.fl_polygons = [[rectangle(*bounds)] for bounds in self.fl_bounds]
+
+    def _get_exact(self, demand_index, facility_index):
+        (xmin, ymin), _, (xmax, ymax), _ = self.dl_polygons[demand_index][0]
+        fxmin, fymin, fxmax, fymax = self.fl_bounds[facility_index]
+        area = max(0.0, min(xmax, fxmax) - max(xmin, fxmin)) * max(0.0, min(ymax, fymax) - max(ymin, fymin))
+        return area / 10000.0 * self.dl_demand[demand_index]
+
+    def test_rasterize(self):
+        grid = raster_analysis.RasterGrid((0, 0, 100, 100), 10)
+        self.assertEqual(100, grid.size)
+        # A square with a square hole covers 64 - 16 cell centers
+        cells = grid.rasterize([rectangle(10, 10, 90, 90), rectangle(30, 30, 70, 70)[::-1]])
+        self.assertEqual(48, len(cells))
+        self.assertNotIn(grid.get_cell(50, 50), cells)
+        self.assertIn(grid.get_cell(15, 15), cells)
+        self.assertEqual(6400 - 1600, raster_analysis.get_rings_area([rectangle(10, 10, 90, 90),
+                                                                       rectangle(30, 30, 70, 70)[::-1]]))
+        # The edges of the square pass through (or touch) these cells
+        boundary = grid.rasterize_boundary([rectangle(15, 15, 85, 85)])
+        self.assertEqual(28, len(boundary))
+        self.assertNotIn(grid.get_cell(50, 50), boundary)
+        self.assertEqual((20, 50, 30, 60), grid.get_cell_bounds(grid.get_cell(25, 55)))
+        with self.assertRaises(ValueError):
+            raster_analysis.RasterGrid((0, 0, 100, 100), 0)
+
+    def test_partial_coverage(self):
+        errors = []
+        for resolution in [10.0, 2.5]:
+            coverage = raster_analysis.generate_partial_coverage(self.dl_ids, self.dl_demand, self.dl_polygons,
+                                                                 self.fl_ids, self.fl_polygons, resolution)
+            self.assertEqual("partial", coverage["type"]["type"])
+            self.assertEqual(self.fl_ids, coverage["facilities"]["facility"])
+            self.assertEqual(sum(self.dl_demand), coverage["totalDemand"])
+            self.assertEqual(resolution, coverage["approximation"]["resolution"])
+            max_error = coverage["approximation"]["maxError"]
+            for i, demand_id in enumerate(self.dl_ids):
+                demand_obj = coverage["demand"][demand_id]
+                self.assertEqual(10000, demand_obj["area"])
+                self.assertLessEqual(demand_obj["serviceableDemand"], demand_obj["demand"])
+                for j, facility_id in enumerate(self.fl_ids):
+                    covered = demand_obj["coverage"]["facility"].get(facility_id, 0)
+                    # Covered demand is rounded up
+                    self.assertLessEqual(abs(covered - self._get_exact(i, j)), max_error + 1)
+            errors.append(max_error)
+        # Finer cells give a smaller error
+        self.assertLess(errors[1], errors[0])
+
+    def test_max_error_off_grid(self):
+        # A service area inside one large demand area, with edges that don't fall on the grid lines
+        rand = random.Random(2)
+        fl_bounds = [(103, 103, 155.4, 194)]
+        for _ in range(20):
+            x, y = rand.uniform(0, 800), rand.uniform(0, 800)
+            fl_bounds.append((x, y, x + rand.uniform(5, 200), y + rand.uniform(5, 200)))
+        for xmin, ymin, xmax, ymax in fl_bounds:
+            coverage = raster_analysis.generate_partial_coverage(["1"], [1000000], [[rectangle(0, 0, 1000, 1000)]],
+                                                                 ["1"], [[rectangle(xmin, ymin, xmax, ymax)]], 10)
+            covered = coverage["demand"]["1"]["coverage"]["facility"].get("1", 0)
+            # Covered demand is rounded up
+            self.assertLessEqual(abs(covered - (xmax - xmin) * (ymax - ymin)),
+                                 coverage["approximation"]["maxError"] + 1)
+
+    def test_sliver_filter(self):
+        coverage = raster_analysis.generate_partial_coverage(self.dl_ids, self.dl_demand, self.dl_polygons,
+                                                             self.fl_ids, self.fl_polygons, 2.5)
+        filtered = raster_analysis.generate_partial_coverage(self.dl_ids, self.dl_demand, self.dl_polygons,
+                                                             self.fl_ids, self.fl_polygons, 2.5, min_share=0.1)
+        self.assertNotIn("sliverFilter", coverage)
+        discarded = 0
+        slivers = 0
+        for demand_id in self.dl_ids:
+            covered = coverage["demand"][demand_id]["coverage"]["facility"]
+            kept = filtered["demand"][demand_id]["coverage"]["facility"]
+            for facility_id, demand in covered.items():
+                if facility_id in kept:
+                    self.assertEqual(demand, kept[facility_id])
+                else:
+                    discarded += demand
+                    slivers += 1
+        self.assertGreater(slivers, 0)
+        self.assertEqual(slivers, filtered["sliverFilter"]["slivers"])
+        self.assertEqual(discarded, filtered["sliverFilter"]["discardedDemand"])
+        self.assertEqual(coverage["totalServiceableDemand"], filtered["totalServiceableDemand"])
+
+    def test_small_polygons(self):
+        # Demand areas smaller than a cell still get coverage
+        coverage = raster_analysis.generate_partial_coverage(["1"], [100], [[rectangle(1, 1, 2, 2)]], ["1"],
+                                                             [[rectangle(0, 0, 50, 50)]], 10)
+        self.assertEqual({"1": 100}, coverage["demand"]["1"]["coverage"]["facility"])
+        self.assertEqual(100, coverage["approximation"]["maxError"])
+
+
+if __name__ == '__main__':
+    unittest.main()
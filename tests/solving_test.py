@@ -0,0 +1,65 @@
+# -*- coding: UTF-8 -*-
+import json
+import random
+import unittest
+
+from pyspatialopt.models import covering, solving, utilities
+
+
+class SolvingTest(unittest.TestCase):
+    def setUp(self):
+        # Read the coverages
+        with open("valid_coverages/binary_coverage_polygon1.json", "r") as f:
+            self.binary_coverage_polygon = json.load(f)
+        # Larger random coverage that can't be solved instantly
+        rand = random.Random(1)
+        self.random_coverage = {
+            "type": {"mode": "coverage", "type": "binary"},
+            "demand": {},
+            "facilities": {"facility": [str(j) for j in range(400)]}
+        }
+        for i in range(3000):
+            self.random_coverage["demand"][str(i)] = {
+                "demand": rand.randint(1, 100),
+                "serviceableDemand": 0,
+                "coverage": {"facility": {str(j): 1 for j in rand.sample(range(400), 6)}}
+            }
+
+    def test_solve_model(self):
+        for solver in ["cbc", "highs"]:
+            mclp = covering.create_mclp_model(self.binary_coverage_polygon, {"total": 5})
+            result = solving.solve_model(mclp, solver)
+            self.assertEqual("Optimal", result["status"])
+            self.assertTrue(result["optimal"])
+            self.assertEqual(320453.0, result["objective"])
+            self.assertAlmostEqual(0.0, result["gap"])
+            self.assertEqual(['1', '4', '5', '6', '7'], utilities.get_ids(mclp, "facility_service_areas"))
+
+    def test_time_limit(self):
+        for solver in ["cbc", "highs"]:
+            mclp = covering.create_mclp_model(self.random_coverage, {"total": 20})
+            result = solving.solve_model(mclp, solver, time_limit=1, threads=1)
+            self.assertIsNotNone(result["objective"])
+            self.assertGreaterEqual(result["bound"], result["objective"] - 1e-6)
+            self.assertTrue(result["optimal"] or result["timed_out"])
+            self.assertEqual(20, len(utilities.get_ids(mclp, "facility")))
+
+    def test_mip_start(self):
+        mclp = covering.create_mclp_model(self.binary_coverage_polygon, {"total": 5})
+        solving.solve_model(mclp, "highs")
+        mip_start = solving.get_mip_start(mclp)
+        mclp2 = covering.create_mclp_model(self.binary_coverage_polygon, {"total": 5})
+        for solver in ["cbc", "highs"]:
+            result = solving.solve_model(mclp2, solver, mip_start=mip_start, gap=0.05)
+            self.assertEqual(320453.0, result["objective"])
+
+    def test_invalid(self):
+        mclp = covering.create_mclp_model(self.binary_coverage_polygon, {"total": 5})
+        with self.assertRaises(ValueError):
+            solving.solve_model(mclp, "unknown")
+        with self.assertRaises(ValueError):
+            solving.solve_model(mclp, "cbc", time_limit=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+# -*- coding: UTF-8 -*-
+import json
+import unittest
+
+from pyspatialopt.models import utilities
+
+
+class UtilitiesTest(unittest.TestCase):
+    def setUp(self):
+        with open("valid_coverages/binary_coverage_polygon1.json", "r") as f:
+            self.binary_coverage_polygon = json.load(f)
+        with open("valid_coverages/partial_coverage1.json", "r") as f:
+            self.partial_coverage = json.load(f)
+        with open("valid_coverages/traumah_coverage.json", "r") as f:
+            self.traumah_coverage = json.load(f)
+
+    def test_get_covered_demand_binary(self):
+        ids = {"facility_service_areas": ["1", "4"]}
+        covered_demand = utilities.get_covered_demand(self.binary_coverage_polygon, ids)
+        expected = 0.0
+        for demand_id, demand_obj in self.binary_coverage_polygon["demand"].items():
+            coverage = demand_obj["coverage"]["facility_service_areas"]
+            if "1" in coverage or "4" in coverage:
+                expected += demand_obj["demand"]
+                self.assertEqual(demand_obj["demand"], covered_demand["demand"][demand_id])
+            else:
+                self.assertEqual(0, covered_demand["demand"][demand_id])
+        self.assertEqual(expected, covered_demand["total"])
+        self.assertGreater(expected, 0)
+        # All facilities cover all of the serviceable demand
+        all_ids = {"facility_service_areas": self.binary_coverage_polygon["facilities"]["facility_service_areas"]}
+        self.assertEqual(self.binary_coverage_polygon["totalServiceableDemand"],
+                         utilities.get_covered_demand(self.binary_coverage_polygon, all_ids)["total"])
+        self.assertEqual(0, utilities.get_covered_demand(self.binary_coverage_polygon, {})["total"])
+
+    def test_get_covered_demand_partial(self):
+        all_ids = {"facility_service_areas": self.partial_coverage["facilities"]["facility_service_areas"]}
+        covered_demand = utilities.get_covered_demand(self.partial_coverage, all_ids)
+        for demand_id, demand_obj in self.partial_coverage["demand"].items():
+            self.assertLessEqual(covered_demand["demand"][demand_id], demand_obj["demand"])
+            self.assertEqual(min(demand_obj["demand"], sum(demand_obj["coverage"]["facility_service_areas"].values())),
+                             covered_demand["demand"][demand_id])
+        self.assertGreater(covered_demand["total"], 0)
+        self.assertLessEqual(covered_demand["total"], self.partial_coverage["totalDemand"])
+        one = utilities.get_covered_demand(self.partial_coverage, {"facility_service_areas": ["2"]})
+        self.assertLess(one["total"], covered_demand["total"])
+
+    def test_get_covered_demand_invalid(self):
+        with self.assertRaises(ValueError):
+            utilities.get_covered_demand(self.traumah_coverage, {"TraumaCenter": ["1"]})
+
+
+if __name__ == '__main__':
+    unittest.main()